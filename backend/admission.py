@@ -0,0 +1,224 @@
+import os
+import math
+import time
+import asyncio
+import contextvars
+from collections import OrderedDict, deque
+
+# Concurrent LLM calls allowed per healthy Groq key
+LLM_CONCURRENCY_PER_KEY = int(os.getenv("LLM_CONCURRENCY_PER_KEY", "3"))
+# Queued LLM calls beyond which new research requests are turned away with a 429
+LLM_MAX_QUEUE_DEPTH = int(os.getenv("LLM_MAX_QUEUE_DEPTH", "40"))
+# A call queued this long is served next regardless of its priority class (seconds)
+LLM_PRIORITY_AGING_SECONDS = float(os.getenv("LLM_PRIORITY_AGING_SECONDS", "30"))
+# Slots background work (suggestion backfill, knowledge base refresh) may hold at once
+LLM_BACKGROUND_SLOTS = int(os.getenv("LLM_BACKGROUND_SLOTS", "1"))
+
+# Served strictly in this order (subject to aging)
+PRIORITY_CLASSES = ("interactive", "standard", "long", "background")
+
+# Short calls go ahead of long writer generations
+NODE_PRIORITY = {
+    "gatekeeper": "interactive",
+    "reviewer": "interactive",
+    "suggester": "interactive",
+    "researcher": "standard",
+    "analyst": "standard",
+    "writer": "long",
+    "backfill": "background",
+}
+
+# Who the current LLM calls are made for; set per request so users share capacity fairly
+current_requester = contextvars.ContextVar("current_requester", default="anonymous")
+# Forces every LLM call in the current context into one class (background refreshes use "background")
+priority_override = contextvars.ContextVar("priority_override", default=None)
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: float, queue_depth: int):
+        super().__init__(f"LLM queue is full ({queue_depth} calls waiting)")
+        self.retry_after = retry_after
+        self.queue_depth = queue_depth
+
+class AdmissionScheduler:
+    """
+    Replaces a single FIFO semaphore in front of the LLM.
+    Waiting calls are grouped by priority class and, within a class, by
+    requester; requesters are served round-robin so one long research run
+    cannot starve everyone else. Capacity follows the number of healthy keys.
+    Background calls only run on spare capacity: they never age ahead of
+    user traffic and hold at most `background_slots` slots.
+    """
+    def __init__(self, per_key=LLM_CONCURRENCY_PER_KEY, max_queue_depth=LLM_MAX_QUEUE_DEPTH, aging_seconds=LLM_PRIORITY_AGING_SECONDS,
+                 background_slots=LLM_BACKGROUND_SLOTS):
+        self.per_key = per_key
+        self.background_slots = background_slots
+        self.active_background = 0
+        self.max_queue_depth = max_queue_depth
+        self.aging_seconds = aging_seconds
+        # Returns the number of healthy keys; wired up by research_chain
+        self.healthy_keys = lambda: 1
+        self.active = 0
+        # priority class -> requester -> deque of (future, enqueued_at)
+        self.queues = {cls: OrderedDict() for cls in PRIORITY_CLASSES}
+        self.admitted = {cls: 0 for cls in PRIORITY_CLASSES}
+        self.waits = {cls: deque(maxlen=200) for cls in PRIORITY_CLASSES}
+        self.rejected = 0
+        # Smoothed seconds an admitted call holds its slot, used for wait estimates
+        self.avg_service_seconds = 10.0
+
+    def capacity(self) -> int:
+        return self.per_key * max(1, self.healthy_keys())
+
+    def queue_depth(self) -> int:
+        return sum(len(waiters) for users in self.queues.values() for waiters in users.values())
+
+    def estimated_wait(self) -> float:
+        """Seconds a newly queued call would wait at the current depth and service time."""
+        return math.ceil((self.queue_depth() + 1) / self.capacity()) * self.avg_service_seconds
+
+    def check(self):
+        """Raises AdmissionRejected if the queue is too deep to take on another research run."""
+        depth = self.queue_depth()
+        if depth >= self.max_queue_depth:
+            self.rejected += 1
+            raise AdmissionRejected(self.estimated_wait(), depth)
+
+    def is_busy(self) -> bool:
+        """True when calls are queued or more than half the slots are taken."""
+        return self.queue_depth() > 0 or self.active * 2 >= self.capacity()
+
+    def _background_full(self, priority) -> bool:
+        return priority == "background" and self.active_background >= self.background_slots
+
+    async def acquire(self, priority: str = "standard", requester: str = None) -> str:
+        """Waits for a slot; returns the class it was admitted under (pass it to release)."""
+        priority = priority_override.get() or priority
+        priority = priority if priority in self.queues else "standard"
+        requester = requester or current_requester.get()
+        enqueued_at = time.monotonic()
+
+        if self.active < self.capacity() and self.queue_depth() == 0 and not self._background_full(priority):
+            self.active += 1
+            if priority == "background":
+                self.active_background += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.queues[priority].setdefault(requester, deque()).append((future, enqueued_at))
+            # Slots may be free while only capped background work is waiting
+            self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Granted a slot just as we were cancelled; hand it on
+                    self.release(priority=priority)
+                else:
+                    self._discard(priority, requester, future)
+                raise
+
+        self.admitted[priority] += 1
+        self.waits[priority].append(time.monotonic() - enqueued_at)
+        return priority
+
+    def try_acquire(self) -> bool:
+        """Takes a slot only if one is free and nobody is waiting (used for optional extra calls)."""
+        if self.active < self.capacity() and self.queue_depth() == 0:
+            self.active += 1
+            return True
+        return False
+
+    def release(self, held_seconds: float = None, priority: str = None):
+        self.active = max(0, self.active - 1)
+        if priority == "background":
+            self.active_background = max(0, self.active_background - 1)
+        if held_seconds is not None:
+            self.avg_service_seconds = 0.9 * self.avg_service_seconds + 0.1 * held_seconds
+        self._dispatch()
+
+    def slot(self, priority: str = "standard"):
+        return _Slot(self, priority)
+
+    def _discard(self, priority, requester, future):
+        waiters = self.queues[priority].get(requester)
+        if not waiters:
+            return
+        for item in list(waiters):
+            if item[0] is future:
+                waiters.remove(item)
+        if not waiters:
+            del self.queues[priority][requester]
+
+    def _next_class(self) -> str:
+        now = time.monotonic()
+        heads = []
+        for cls in PRIORITY_CLASSES:
+            users = self.queues[cls]
+            if users and not self._background_full(cls):
+                heads.append((cls, min(waiters[0][1] for waiters in users.values())))
+        if not heads:
+            return None
+        # Anything that has waited too long goes first, oldest first (background work never jumps the queue)
+        aged = [(enqueued_at, cls) for cls, enqueued_at in heads
+                if cls != "background" and now - enqueued_at >= self.aging_seconds]
+        if aged:
+            return min(aged)[1]
+        return heads[0][0]
+
+    def _dispatch(self):
+        while self.active < self.capacity():
+            cls = self._next_class()
+            if cls is None:
+                return
+            users = self.queues[cls]
+            requester, waiters = next(iter(users.items()))
+            future, _ = waiters.popleft()
+            # Round-robin: this requester goes to the back of its class
+            if waiters:
+                users.move_to_end(requester)
+            else:
+                del users[requester]
+            if not future.done():
+                self.active += 1
+                if cls == "background":
+                    self.active_background += 1
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        def summary(waits):
+            ordered = sorted(waits)
+            return {
+                "avg_wait_seconds": round(sum(ordered) / len(ordered), 2) if ordered else 0.0,
+                "p95_wait_seconds": round(ordered[int(0.95 * (len(ordered) - 1))], 2) if ordered else 0.0,
+            }
+        return {
+            "capacity": self.capacity(),
+            "active": self.active,
+            "active_background": self.active_background,
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "estimated_wait_seconds": round(self.estimated_wait(), 1),
+            "avg_service_seconds": round(self.avg_service_seconds, 1),
+            "rejected": self.rejected,
+            "classes": {
+                cls: {
+                    "queued": sum(len(w) for w in self.queues[cls].values()),
+                    "requesters_waiting": len(self.queues[cls]),
+                    "admitted": self.admitted[cls],
+                    **summary(self.waits[cls]),
+                } for cls in PRIORITY_CLASSES
+            },
+        }
+
+class _Slot:
+    def __init__(self, scheduler, priority):
+        self.scheduler = scheduler
+        self.priority = priority
+
+    async def __aenter__(self):
+        self.admitted_as = await self.scheduler.acquire(self.priority)
+        self.started = time.monotonic()
+
+    async def __aexit__(self, *exc):
+        self.scheduler.release(time.monotonic() - self.started, self.admitted_as)
+
+admission = AdmissionScheduler()
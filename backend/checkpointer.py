@@ -0,0 +1,378 @@
+import os
+import uuid
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+from .cache import TTLCache
+from .database import Base, SessionLocal, GraphCheckpoint, GraphCheckpointWrite
+
+# A thread with no new checkpoint for this long is deleted (seconds)
+CHECKPOINT_THREAD_TTL = int(os.getenv("CHECKPOINT_THREAD_TTL_SECONDS", str(24 * 3600)))
+# Anonymous threads are deleted after their run; this only catches runs that crashed
+CHECKPOINT_ANON_TTL = int(os.getenv("CHECKPOINT_ANON_TTL_SECONDS", "900"))
+# Newest checkpoints kept per thread; older ones are only needed for time travel
+CHECKPOINTS_PER_THREAD = int(os.getenv("CHECKPOINTS_PER_THREAD", "10"))
+# Threads whose latest checkpoint stays deserializable without a database read
+CHECKPOINT_HOT_THREADS = int(os.getenv("CHECKPOINT_HOT_THREADS", "64"))
+# Expire stale threads every N checkpoints instead of on each one
+PRUNE_EVERY = 100
+
+ANON_THREAD_PREFIX = "anon-"
+
+def new_anonymous_thread_id() -> str:
+    """Isolated, short-lived thread for requests that did not send a thread_id."""
+    return f"{ANON_THREAD_PREFIX}{uuid.uuid4().hex}"
+
+class BoundedCheckpointSaver(BaseCheckpointSaver[int]):
+    """
+    LangGraph checkpointer stored in the primary database (SQLite locally,
+    Postgres in production) instead of process memory.
+    Each thread keeps at most `max_per_thread` checkpoints and is deleted
+    once idle for `thread_ttl`. The latest checkpoint of recently used
+    threads is also kept in a per-worker LRU so resuming a thread or reading
+    its final state does not deserialize rows again. Other workers may write
+    to the same thread, so a cached entry is only used after a cheap check
+    that it is still the latest one in the database.
+    """
+    def __init__(self, session_factory=SessionLocal, thread_ttl=CHECKPOINT_THREAD_TTL, anon_ttl=CHECKPOINT_ANON_TTL,
+                 max_per_thread=CHECKPOINTS_PER_THREAD, hot_threads=CHECKPOINT_HOT_THREADS, serde=None):
+        super().__init__(serde=serde)
+        self.session_factory = session_factory
+        self.thread_ttl = thread_ttl
+        self.anon_ttl = anon_ttl
+        self.max_per_thread = max_per_thread
+        # thread_id -> {checkpoint_ns: latest entry}
+        self.hot = TTLCache(max_entries=hot_threads, ttl=thread_ttl)
+        self._lock = threading.Lock()
+        self._tables_ready = False
+        self.hot_hits = 0
+        self.hot_stale = 0
+        self.db_reads = 0
+        self.writes = 0
+        self.trimmed = 0
+        self.expired_threads = 0
+
+    def _session(self):
+        db = self.session_factory()
+        if not self._tables_ready:
+            # The graph is built lazily, possibly before init_db has run
+            Base.metadata.create_all(bind=db.get_bind(), tables=[GraphCheckpoint.__table__, GraphCheckpointWrite.__table__])
+            self._tables_ready = True
+        return db
+
+    # --- in-memory tier ---
+
+    def _hot_entry(self, thread_id: str, checkpoint_ns: str):
+        with self._lock:
+            entries = self.hot.get(thread_id)
+            entry = entries.get(checkpoint_ns) if entries else None
+            # Copy so put_writes can keep appending while the caller deserializes
+            return {**entry, "writes": dict(entry["writes"])} if entry else None
+
+    def _remember(self, thread_id: str, checkpoint_ns: str, entry: dict):
+        with self._lock:
+            entries = self.hot.get(thread_id) or {}
+            entries[checkpoint_ns] = entry
+            self.hot.set(thread_id, entries)
+
+    # --- row conversion ---
+
+    @staticmethod
+    def _entry(row, write_rows) -> dict:
+        return {
+            "checkpoint_id": row.checkpoint_id,
+            "parent_checkpoint_id": row.parent_checkpoint_id,
+            "checkpoint": (row.checkpoint_type, row.checkpoint),
+            "metadata": (row.metadata_type, row.metadata_blob),
+            "writes": {
+                (w.task_id, w.idx): (w.task_id, w.channel, (w.value_type, w.value), w.task_path or "", w.idx)
+                for w in write_rows
+            },
+        }
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, entry: dict) -> CheckpointTuple:
+        writes = sorted(entry["writes"].values(), key=lambda w: writes_sort_key(w[3], w[0], w[4]))
+        parent = entry["parent_checkpoint_id"]
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": entry["checkpoint_id"]}},
+            checkpoint=self.serde.loads_typed(entry["checkpoint"]),
+            metadata=self.serde.loads_typed(entry["metadata"]),
+            parent_config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent}} if parent else None,
+            pending_writes=[(task_id, channel, self.serde.loads_typed(value)) for task_id, channel, value, _, _ in writes],
+        )
+
+    @staticmethod
+    def _is_current(db, thread_id: str, checkpoint_ns: str, entry: dict) -> bool:
+        """Whether a cached entry is still the newest checkpoint of its thread, with all its writes."""
+        latest = db.query(func.max(GraphCheckpoint.checkpoint_id)).filter(
+            GraphCheckpoint.thread_id == thread_id,
+            GraphCheckpoint.checkpoint_ns == checkpoint_ns
+        ).scalar()
+        if latest != entry["checkpoint_id"]:
+            return False
+        writes = db.query(func.count(GraphCheckpointWrite.idx)).filter(
+            GraphCheckpointWrite.thread_id == thread_id,
+            GraphCheckpointWrite.checkpoint_ns == checkpoint_ns,
+            GraphCheckpointWrite.checkpoint_id == latest
+        ).scalar()
+        return writes == len(entry["writes"])
+
+    def _load_writes(self, db, thread_id: str, checkpoint_ns: str, checkpoint_id: str):
+        return db.query(GraphCheckpointWrite).filter(
+            GraphCheckpointWrite.thread_id == thread_id,
+            GraphCheckpointWrite.checkpoint_ns == checkpoint_ns,
+            GraphCheckpointWrite.checkpoint_id == checkpoint_id
+        ).all()
+
+    # --- BaseCheckpointSaver interface ---
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        entry = self._hot_entry(thread_id, checkpoint_ns)
+        if entry is not None and checkpoint_id and entry["checkpoint_id"] != checkpoint_id:
+            entry = None
+
+        db = self._session()
+        try:
+            if entry is not None:
+                if self._is_current(db, thread_id, checkpoint_ns, entry):
+                    self.hot_hits += 1
+                    return self._to_tuple(thread_id, checkpoint_ns, entry)
+                # Another worker moved the thread on since we cached it
+                self.hot_stale += 1
+            query = db.query(GraphCheckpoint).filter(
+                GraphCheckpoint.thread_id == thread_id,
+                GraphCheckpoint.checkpoint_ns == checkpoint_ns
+            )
+            if checkpoint_id:
+                query = query.filter(GraphCheckpoint.checkpoint_id == checkpoint_id)
+            row = query.order_by(GraphCheckpoint.checkpoint_id.desc()).first()
+            if row is None:
+                return None
+            entry = self._entry(row, self._load_writes(db, thread_id, checkpoint_ns, row.checkpoint_id))
+            self.db_reads += 1
+        finally:
+            db.close()
+
+        if not checkpoint_id:
+            self._remember(thread_id, checkpoint_ns, entry)
+        return self._to_tuple(thread_id, checkpoint_ns, entry)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        db = self._session()
+        try:
+            query = db.query(GraphCheckpoint)
+            if config:
+                query = query.filter(GraphCheckpoint.thread_id == config["configurable"]["thread_id"])
+                if "checkpoint_ns" in config["configurable"]:
+                    query = query.filter(GraphCheckpoint.checkpoint_ns == config["configurable"]["checkpoint_ns"])
+                if checkpoint_id := get_checkpoint_id(config):
+                    query = query.filter(GraphCheckpoint.checkpoint_id == checkpoint_id)
+            if before and (before_id := get_checkpoint_id(before)):
+                query = query.filter(GraphCheckpoint.checkpoint_id < before_id)
+            rows = query.order_by(GraphCheckpoint.checkpoint_id.desc()).all()
+
+            tuples = []
+            for row in rows:
+                entry = self._entry(row, self._load_writes(db, row.thread_id, row.checkpoint_ns, row.checkpoint_id))
+                item = self._to_tuple(row.thread_id, row.checkpoint_ns, entry)
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                tuples.append(item)
+                if limit is not None and len(tuples) >= limit:
+                    break
+        finally:
+            db.close()
+        yield from tuples
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        entry = {
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "checkpoint": self.serde.dumps_typed(checkpoint),
+            "metadata": self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+            "writes": {},
+        }
+
+        db = self._session()
+        try:
+            db.merge(GraphCheckpoint(
+                thread_id=thread_id,
+                checkpoint_ns=checkpoint_ns,
+                checkpoint_id=entry["checkpoint_id"],
+                parent_checkpoint_id=entry["parent_checkpoint_id"],
+                checkpoint_type=entry["checkpoint"][0],
+                checkpoint=entry["checkpoint"][1],
+                metadata_type=entry["metadata"][0],
+                metadata_blob=entry["metadata"][1],
+                created_at=datetime.utcnow()
+            ))
+            db.commit()
+            self._trim(db, thread_id, checkpoint_ns)
+            self.writes += 1
+            if self.writes % PRUNE_EVERY == 0:
+                self.prune_expired(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        self._remember(thread_id, checkpoint_ns, entry)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        saved = []
+        db = self._session()
+        try:
+            existing = {idx for (idx,) in db.query(GraphCheckpointWrite.idx).filter(
+                GraphCheckpointWrite.thread_id == thread_id,
+                GraphCheckpointWrite.checkpoint_ns == checkpoint_ns,
+                GraphCheckpointWrite.checkpoint_id == checkpoint_id,
+                GraphCheckpointWrite.task_id == task_id
+            )}
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                # Regular writes are idempotent; special ones (errors, interrupts) overwrite
+                if idx >= 0 and idx in existing:
+                    continue
+                value_type, blob = self.serde.dumps_typed(value)
+                db.merge(GraphCheckpointWrite(
+                    thread_id=thread_id,
+                    checkpoint_ns=checkpoint_ns,
+                    checkpoint_id=checkpoint_id,
+                    task_id=task_id,
+                    idx=idx,
+                    channel=channel,
+                    value_type=value_type,
+                    value=blob,
+                    task_path=task_path
+                ))
+                saved.append((task_id, channel, (value_type, blob), task_path, idx))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            entries = self.hot.get(thread_id)
+            entry = entries.get(checkpoint_ns) if entries else None
+            if entry is not None and entry["checkpoint_id"] == checkpoint_id:
+                for write in saved:
+                    entry["writes"][(write[0], write[4])] = write
+
+    def delete_thread(self, thread_id: str):
+        db = self._session()
+        try:
+            self._delete_rows(db, [thread_id])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.hot.pop(thread_id)
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # --- bounds ---
+
+    @staticmethod
+    def _delete_rows(db, thread_ids: list):
+        db.query(GraphCheckpointWrite).filter(GraphCheckpointWrite.thread_id.in_(thread_ids)).delete(synchronize_session=False)
+        db.query(GraphCheckpoint).filter(GraphCheckpoint.thread_id.in_(thread_ids)).delete(synchronize_session=False)
+
+    def _trim(self, db, thread_id: str, checkpoint_ns: str):
+        """Drops the thread's checkpoints (and their writes) beyond the newest `max_per_thread`."""
+        old = [checkpoint_id for (checkpoint_id,) in db.query(GraphCheckpoint.checkpoint_id).filter(
+            GraphCheckpoint.thread_id == thread_id,
+            GraphCheckpoint.checkpoint_ns == checkpoint_ns
+        ).order_by(GraphCheckpoint.checkpoint_id.desc()).offset(self.max_per_thread).all()]
+        if not old:
+            return
+        for model in (GraphCheckpointWrite, GraphCheckpoint):
+            db.query(model).filter(
+                model.thread_id == thread_id,
+                model.checkpoint_ns == checkpoint_ns,
+                model.checkpoint_id.in_(old)
+            ).delete(synchronize_session=False)
+        db.commit()
+        self.trimmed += len(old)
+
+    def prune_expired(self, db=None):
+        """Deletes threads idle past their TTL (anonymous threads use the shorter one)."""
+        own_session = db is None
+        db = db or self._session()
+        try:
+            now = datetime.utcnow()
+            latest = func.max(GraphCheckpoint.created_at)
+            stale = {t for (t,) in db.query(GraphCheckpoint.thread_id)
+                     .group_by(GraphCheckpoint.thread_id)
+                     .having(latest < now - timedelta(seconds=self.thread_ttl))}
+            stale |= {t for (t,) in db.query(GraphCheckpoint.thread_id)
+                      .filter(GraphCheckpoint.thread_id.like(f"{ANON_THREAD_PREFIX}%"))
+                      .group_by(GraphCheckpoint.thread_id)
+                      .having(latest < now - timedelta(seconds=self.anon_ttl))}
+            if stale:
+                self._delete_rows(db, list(stale))
+                db.commit()
+                for thread_id in stale:
+                    self.hot.pop(thread_id)
+                self.expired_threads += len(stale)
+                print(f"DEBUG: Expired {len(stale)} idle graph threads")
+        except Exception as e:
+            db.rollback()
+            print(f"WARNING: Checkpoint pruning failed: {e}")
+        finally:
+            if own_session:
+                db.close()
+
+    def stats(self) -> dict:
+        return {
+            "hot_threads": len(self.hot),
+            "hot_hits": self.hot_hits,
+            "hot_stale": self.hot_stale,
+            "db_reads": self.db_reads,
+            "checkpoints_written": self.writes,
+            "checkpoints_trimmed": self.trimmed,
+            "threads_expired": self.expired_threads,
+            "max_per_thread": self.max_per_thread,
+            "thread_ttl_seconds": self.thread_ttl,
+        }
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text, text
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text, LargeBinary, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -75,7 +75,86 @@ class KnowledgeBase(Base):
     query = Column(String, unique=True, index=True)
     slug = Column(String, index=True)
     content = Column(Text)
+    suggestions = Column(Text, nullable=True) # JSON list of follow-up questions
     timestamp = Column(DateTime, default=datetime.utcnow)
+    refreshed_at = Column(DateTime, nullable=True) # When the content was last (re)generated
+    ttl_seconds = Column(Integer, nullable=True) # Freshness lifetime from the topic, see kb_refresh.ttl_for
+
+class SearchCacheEntry(Base):
+    __tablename__ = "search_cache"
+    
+    key = Column(String, primary_key=True)
+    query = Column(Text)
+    params = Column(Text)
+    results = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class GatekeeperVerdict(Base):
+    __tablename__ = "gatekeeper_verdicts"
+    
+    key = Column(String, primary_key=True) # normalized query
+    query = Column(Text)
+    is_relevant = Column(Integer) # 0 for False, 1 for True
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class ResearchLock(Base):
+    __tablename__ = "research_locks"
+    
+    key = Column(String, primary_key=True)
+    owner = Column(String)
+    expires_at = Column(DateTime, index=True)
+
+class RateLimitCounter(Base):
+    __tablename__ = "rate_limit_counters"
+    
+    key = Column(String, primary_key=True) # route:scope:id:window
+    count = Column(Integer, default=0)
+    expires_at = Column(DateTime, index=True)
+
+class ResearchJob(Base):
+    __tablename__ = "research_jobs"
+    
+    id = Column(String, primary_key=True)
+    query = Column(Text)
+    thread_id = Column(String, nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    requester = Column(String) # fairness key for the LLM admission queue
+    status = Column(String, default="queued", index=True) # queued, running, done, failed
+    progress = Column(Text, nullable=True) # JSON list of recent progress events
+    result = Column(Text, nullable=True) # JSON ResearchResponse
+    error = Column(Text, nullable=True)
+    worker = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class GraphCheckpoint(Base):
+    __tablename__ = "graph_checkpoints"
+    
+    thread_id = Column(String, primary_key=True)
+    checkpoint_ns = Column(String, primary_key=True, default="")
+    checkpoint_id = Column(String, primary_key=True)
+    parent_checkpoint_id = Column(String, nullable=True)
+    checkpoint_type = Column(String)
+    checkpoint = Column(LargeBinary)
+    metadata_type = Column(String)
+    metadata_blob = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class GraphCheckpointWrite(Base):
+    __tablename__ = "graph_checkpoint_writes"
+    
+    thread_id = Column(String, primary_key=True)
+    checkpoint_ns = Column(String, primary_key=True, default="")
+    checkpoint_id = Column(String, primary_key=True)
+    task_id = Column(String, primary_key=True)
+    idx = Column(Integer, primary_key=True)
+    channel = Column(String)
+    value_type = Column(String)
+    value = Column(LargeBinary)
+    task_path = Column(String, default="")
 
 def init_db():
     Base.metadata.create_all(bind=engine)
@@ -89,11 +168,17 @@ def init_db():
         "ALTER TABLE users ADD COLUMN IF NOT EXISTS reset_token_expires TIMESTAMP",
         "ALTER TABLE users ADD COLUMN IF NOT EXISTS failed_login_attempts INTEGER DEFAULT 0",
         "ALTER TABLE users ADD COLUMN IF NOT EXISTS lockout_until TIMESTAMP",
+        "ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS suggestions TEXT",
+        "ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS refreshed_at TIMESTAMP",
+        "ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS ttl_seconds INTEGER",
     ]
 
+    # The local backup is always SQLite and needs the same columns for sync_to_local
+    sqlite_engines = [backup_engine] + ([engine] if is_sqlite else [])
+
     # SQLite does NOT support IF NOT EXISTS for ALTER TABLE, use try/except instead
-    if is_sqlite:
-        with engine.connect() as conn:
+    for sqlite_engine in sqlite_engines:
+        with sqlite_engine.connect() as conn:
             for sql in migrations:
                 # Convert to SQLite-compatible syntax (remove IF NOT EXISTS)
                 sqlite_sql = sql.replace(" IF NOT EXISTS", "")
@@ -102,7 +187,8 @@ def init_db():
                     conn.commit()
                 except Exception:
                     conn.rollback()
-    else:
+
+    if not is_sqlite:
         # PostgreSQL - IF NOT EXISTS works perfectly
         with engine.connect() as conn:
             for sql in migrations:
@@ -0,0 +1,244 @@
+import os
+import time
+import zlib
+import threading
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from .cache import TTLCache
+from .database import SessionLocal, GatekeeperVerdict, ChatHistory, KnowledgeBase
+from .semantic_cache import tokenize
+from .text_utils import normalize_query
+
+# "on" answers confident queries locally, "shadow" only compares with the LLM verdict, "off" always asks the LLM
+GATEKEEPER_CLASSIFIER_MODE = os.getenv("GATEKEEPER_CLASSIFIER_MODE", "on").lower()
+# Probability above which a query is accepted without the LLM, and below (1 - x) at which it is refused.
+# Refusing is stricter: turning away an energy question costs more than researching an odd one, so a
+# refusal also needs zero energy-lexicon hits. Off-domain queries with only seed data land around 0.02-0.03,
+# anything borderline (economics, mining, other industries) around 0.04-0.06 and goes to the LLM.
+GATEKEEPER_ACCEPT_CONFIDENCE = float(os.getenv("GATEKEEPER_ACCEPT_CONFIDENCE", "0.85"))
+GATEKEEPER_REJECT_CONFIDENCE = float(os.getenv("GATEKEEPER_REJECT_CONFIDENCE", "0.97"))
+# Retrain after this many new LLM verdicts, or this long after the last training (seconds)
+GATEKEEPER_RETRAIN_VERDICTS = int(os.getenv("GATEKEEPER_RETRAIN_VERDICTS", "50"))
+GATEKEEPER_RETRAIN_SECONDS = float(os.getenv("GATEKEEPER_RETRAIN_SECONDS", "3600"))
+# Most recent rows per source used for training
+GATEKEEPER_TRAINING_ROWS = int(os.getenv("GATEKEEPER_TRAINING_ROWS", "2000"))
+
+# What the gatekeeper answers off-topic queries with (also how refusals are found in ChatHistory)
+REFUSAL_MESSAGE = "I specialize in the Energy industry. Please ask a question related to energy, power, sustainability, or climate technology."
+
+FEATURE_DIM = 2048
+LEXICON_WEIGHT = 2.0
+
+# Stemmed tokens (see semantic_cache.tokenize) that on their own mark a query as energy-related
+ENERGY_TERMS = {
+    "energy", "solar", "photovoltaic", "wind", "turbine", "battery", "batterie", "hydrogen", "electrolyzer",
+    "electrolyser", "grid", "electricity", "electric", "renewable", "nuclear", "reactor", "fusion", "uranium",
+    "oil", "petroleum", "crude", "refinery", "opec", "gas", "lng", "liquefied", "coal", "fuel", "biofuel",
+    "biomass", "biogas", "geothermal", "hydropower", "hydroelectric", "hydro", "tidal", "emission", "decarbonization",
+    "decarbonisation", "carbon", "methane", "climate", "sustainability", "utility", "utilitie", "transmission",
+    "megawatt", "gigawatt", "kwh", "mwh", "gwh", "charging", "inverter", "microgrid", "pipeline", "shale",
+    "drilling", "upstream", "downstream", "levelized", "storage", "efficiency", "heat", "pump", "thermal", "power",
+}
+
+# Labelled examples the model always starts from; real traffic is added on top
+SEED_QUERIES = [
+    ("solar panel efficiency trends", True), ("offshore wind capacity in europe", True),
+    ("lithium ion battery price outlook", True), ("green hydrogen production costs", True),
+    ("opec oil price forecast", True), ("us lng export growth", True),
+    ("small modular reactors deployment", True), ("ev charging infrastructure in india", True),
+    ("grid scale energy storage projects", True), ("carbon capture and storage economics", True),
+    ("heat pump adoption in germany", True), ("coal plant retirements in the us", True),
+    ("geothermal potential in kenya", True), ("power purchase agreements for data centers", True),
+    ("electricity market reform in the uk", True), ("eu emissions trading system prices", True),
+    ("sustainable aviation fuel supply", True), ("demand response and smart meters", True),
+    ("transmission line permitting delays", True), ("building energy efficiency retrofits", True),
+    ("ira tax credits for clean energy", True), ("solid state battery progress", True),
+    ("drought impact on hydropower output", True), ("refinery margins this quarter", True),
+    ("methane leaks from gas pipelines", True), ("recycling of electric vehicle batteries", True),
+    ("rooftop pv net metering policy", True), ("microgrids for remote villages", True),
+    ("fusion energy startups funding", True), ("wind turbine supply chain bottlenecks", True),
+    ("best pizza recipe", False), ("who won the world cup", False),
+    ("how do i learn python programming", False), ("write a poem about love", False),
+    ("history of the roman empire", False), ("how to lose weight fast", False),
+    ("best movies of the year", False), ("how do vaccines work", False),
+    ("plan a weekend trip to paris", False), ("what is the capital of australia", False),
+    ("translate hello into spanish", False), ("fix my javascript error", False),
+    ("football transfer news", False), ("how to train a puppy", False),
+    ("celebrity gossip this week", False), ("write a cover letter for a job", False),
+    ("chess opening strategies", False), ("taylor swift tour dates", False),
+    ("how to bake sourdough bread", False), ("what is the meaning of life", False),
+    ("cheap car insurance quotes", False), ("best smartphone to buy", False),
+    ("symptoms of the flu", False), ("learn guitar chords", False),
+    ("solve this algebra equation", False), ("tell me a joke", False),
+    ("who is the president of france", False), ("how to knit a scarf", False),
+    ("summarize the plot of hamlet", False), ("tips for a job interview", False),
+]
+
+def lexicon_hits(tokens) -> int:
+    return sum(1 for token in tokens if token in ENERGY_TERMS)
+
+def featurize(query: str) -> np.ndarray:
+    """Hashed words, word pairs and character trigrams, plus the energy-lexicon hit count."""
+    vec = np.zeros(FEATURE_DIM + 1, dtype=np.float32)
+    tokens = tokenize(query)
+    for token in tokens:
+        vec[zlib.crc32(("w:" + token).encode("utf-8")) % FEATURE_DIM] += 1.0
+        padded = f"#{token}#"
+        for i in range(len(padded) - 2):
+            vec[zlib.crc32(("c:" + padded[i:i + 3]).encode("utf-8")) % FEATURE_DIM] += 0.3
+    for first, second in zip(tokens, tokens[1:]):
+        vec[zlib.crc32(f"b:{first}_{second}".encode("utf-8")) % FEATURE_DIM] += 1.0
+    np.log1p(vec, out=vec)
+    vec[FEATURE_DIM] = LEXICON_WEIGHT * min(lexicon_hits(tokens), 3)
+    return vec
+
+def train_logistic_regression(X: np.ndarray, y: np.ndarray, epochs: int = 300, lr: float = 0.5, l2: float = 1e-3):
+    """Class-balanced logistic regression by full-batch gradient descent. Returns (weights, bias)."""
+    positives = max(1, int(y.sum()))
+    negatives = max(1, len(y) - positives)
+    sample_weight = np.where(y == 1, len(y) / (2 * positives), len(y) / (2 * negatives)).astype(np.float32)
+    w = np.zeros(X.shape[1], dtype=np.float32)
+    b = 0.0
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(X @ w + b)))
+        error = (p - y) * sample_weight
+        w -= lr * (X.T @ error / len(y) + l2 * w)
+        b -= lr * float(error.mean())
+    return w, b
+
+class DomainClassifier:
+    """
+    Local fast path for the gatekeeper node.
+    Verdicts are memoized by normalized query (in memory, and in the
+    gatekeeper_verdicts table for LLM verdicts). Unseen queries go through
+    a small logistic regression over hashed text features plus an energy
+    lexicon, trained on the seed examples, past LLM verdicts, KnowledgeBase
+    queries that name an energy term and ChatHistory refusals. Only queries it is unsure about
+    still need the LLM.
+    """
+    def __init__(self, session_factory=SessionLocal, mode=GATEKEEPER_CLASSIFIER_MODE,
+                 accept=GATEKEEPER_ACCEPT_CONFIDENCE, reject=GATEKEEPER_REJECT_CONFIDENCE):
+        self.session_factory = session_factory
+        self.mode = mode
+        self.accept = accept
+        self.reject = reject
+        self.memo = TTLCache(max_entries=4096, ttl=7 * 24 * 3600)
+        self.weights = None
+        self.bias = 0.0
+        self.trained_at = 0.0
+        self.training_rows = 0
+        self.new_verdicts = 0
+        self._lock = threading.Lock()
+        self.decisions = {"memo": 0, "accepted": 0, "refused": 0, "uncertain": 0}
+        self.shadow = {"agree": 0, "disagree": 0}
+
+    def _training_data(self):
+        queries = list(SEED_QUERIES)
+        db = self.session_factory()
+        try:
+            verdicts = db.query(GatekeeperVerdict.query, GatekeeperVerdict.is_relevant).order_by(
+                GatekeeperVerdict.created_at.desc()).limit(GATEKEEPER_TRAINING_ROWS).all()
+            queries += [(q, bool(relevant)) for q, relevant in verdicts]
+            # Older reports were stored without a relevance check, so only those naming an energy term count
+            reports = db.query(KnowledgeBase.query).order_by(KnowledgeBase.timestamp.desc()).limit(GATEKEEPER_TRAINING_ROWS).all()
+            queries += [(q, True) for (q,) in reports if q and lexicon_hits(tokenize(q)) > 0]
+            chats = db.query(ChatHistory.query, ChatHistory.response).order_by(ChatHistory.timestamp.desc()).limit(GATEKEEPER_TRAINING_ROWS).all()
+            queries += [(q, response != REFUSAL_MESSAGE) for q, response in chats if q]
+        except Exception as e:
+            print(f"WARNING: Gatekeeper training data unavailable, using seed examples only: {e}")
+        finally:
+            db.close()
+        return queries
+
+    def train(self):
+        queries = self._training_data()
+        X = np.stack([featurize(q) for q, _ in queries])
+        y = np.array([1.0 if relevant else 0.0 for _, relevant in queries], dtype=np.float32)
+        self.weights, self.bias = train_logistic_regression(X, y)
+        self.trained_at = time.monotonic()
+        self.training_rows = len(queries)
+        self.new_verdicts = 0
+        print(f"DEBUG: Gatekeeper classifier trained on {len(queries)} queries")
+
+    def _ensure_trained(self):
+        stale = (self.weights is None
+                 or self.new_verdicts >= GATEKEEPER_RETRAIN_VERDICTS
+                 or time.monotonic() - self.trained_at > GATEKEEPER_RETRAIN_SECONDS)
+        if stale:
+            with self._lock:
+                if self.weights is None or self.new_verdicts >= GATEKEEPER_RETRAIN_VERDICTS \
+                        or time.monotonic() - self.trained_at > GATEKEEPER_RETRAIN_SECONDS:
+                    self.train()
+
+    def probability(self, query: str) -> float:
+        self._ensure_trained()
+        return float(1.0 / (1.0 + np.exp(-(featurize(query) @ self.weights + self.bias))))
+
+    def _stored_verdict(self, key: str):
+        db = self.session_factory()
+        try:
+            row = db.query(GatekeeperVerdict).filter(GatekeeperVerdict.key == key).first()
+            return bool(row.is_relevant) if row else None
+        except Exception as e:
+            print(f"WARNING: Gatekeeper verdict lookup failed: {e}")
+            return None
+        finally:
+            db.close()
+
+    def classify(self, query: str) -> Optional[bool]:
+        """True/False when the verdict is known or confident, None when the LLM should decide."""
+        key = normalize_query(query)
+        verdict = self.memo.get(key)
+        if verdict is None:
+            verdict = self._stored_verdict(key)
+            if verdict is not None:
+                self.memo.set(key, verdict)
+        if verdict is not None:
+            self.decisions["memo"] += 1
+            return verdict
+
+        probability = self.probability(query)
+        if probability >= self.accept:
+            verdict = True
+        elif probability <= 1 - self.reject and lexicon_hits(tokenize(query)) == 0:
+            verdict = False
+        else:
+            self.decisions["uncertain"] += 1
+            return None
+
+        self.decisions["accepted" if verdict else "refused"] += 1
+        self.memo.set(key, verdict)
+        return verdict
+
+    def record(self, query: str, is_relevant: bool):
+        """Stores an LLM verdict: memoized for repeats and kept as a training label."""
+        key = normalize_query(query)
+        self.memo.set(key, is_relevant)
+        db = self.session_factory()
+        try:
+            db.merge(GatekeeperVerdict(key=key, query=query, is_relevant=int(is_relevant), created_at=datetime.utcnow()))
+            db.commit()
+            self.new_verdicts += 1
+        except Exception as e:
+            db.rollback()
+            print(f"WARNING: Gatekeeper verdict write failed: {e}")
+        finally:
+            db.close()
+
+    def record_shadow(self, local_verdict: Optional[bool], llm_verdict: bool):
+        if local_verdict is not None:
+            self.shadow["agree" if local_verdict == llm_verdict else "disagree"] += 1
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "decisions": self.decisions,
+            "shadow": self.shadow,
+            "training_rows": self.training_rows,
+            "memo": self.memo.stats(),
+        }
+
+domain_classifier = DomainClassifier()
@@ -0,0 +1,94 @@
+import os
+import asyncio
+import weakref
+import httpx
+from langchain_groq import ChatGroq
+
+# Connections each Groq key may hold open at once, and how many idle ones are kept alive
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "10"))
+GROQ_KEEPALIVE_CONNECTIONS = int(os.getenv("GROQ_KEEPALIVE_CONNECTIONS", "5"))
+# Idle connections are closed after this long (seconds)
+GROQ_KEEPALIVE_SECONDS = float(os.getenv("GROQ_KEEPALIVE_SECONDS", "60"))
+# Writer calls can stream for minutes; only connecting is kept short
+GROQ_TIMEOUT_SECONDS = float(os.getenv("GROQ_TIMEOUT_SECONDS", "300"))
+GROQ_CONNECT_TIMEOUT_SECONDS = float(os.getenv("GROQ_CONNECT_TIMEOUT_SECONDS", "10"))
+
+class GroqClientPool:
+    """
+    Long-lived Groq clients, one keep-alive httpx.AsyncClient per API key.
+    httpx connections belong to the event loop that opened them, so clients
+    are kept per running loop (the API, each job worker and the test client
+    all run their own). ChatGroq instances are cached per key and model
+    settings on top of the shared HTTP client, so a call costs neither a new
+    TLS handshake nor a new SDK client.
+    """
+    def __init__(self, max_connections: int = GROQ_MAX_CONNECTIONS, max_keepalive: int = GROQ_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = GROQ_KEEPALIVE_SECONDS, timeout: float = GROQ_TIMEOUT_SECONDS,
+                 base_url: str = None):
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(timeout, connect=GROQ_CONNECT_TIMEOUT_SECONDS)
+        self.base_url = base_url
+        # Async httpx response hooks run on every Groq response (research_chain adds the key tracker)
+        self.response_hooks = []
+        self._loops = weakref.WeakKeyDictionary()  # loop -> {"clients": {key: client}, "models": {(key, settings): ChatGroq}}
+        self.clients_created = 0
+        self.models_created = 0
+        self.reused = 0
+
+    def _new_http_client(self) -> httpx.AsyncClient:
+        self.clients_created += 1
+        return httpx.AsyncClient(limits=self.limits, timeout=self.timeout,
+                                 event_hooks={"response": list(self.response_hooks)})
+
+    def _new_model(self, key: str, http_client: httpx.AsyncClient, settings: dict) -> ChatGroq:
+        self.models_created += 1
+        if self.base_url:
+            settings = {**settings, "base_url": self.base_url}
+        return ChatGroq(
+            groq_api_key=key,
+            # Retries are handled by invoke_chain_with_retry so a 429 moves on to another key
+            max_retries=0,
+            http_async_client=http_client,
+            **settings
+        )
+
+    def chat_model(self, key: str, **settings) -> ChatGroq:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Built outside any event loop (e.g. at import time): nothing to share it with
+            return self._new_model(key, self._new_http_client(), settings)
+
+        pool = self._loops.setdefault(loop, {"clients": {}, "models": {}})
+        cache_key = (key, tuple(sorted(settings.items())))
+        model = pool["models"].get(cache_key)
+        if model is not None:
+            self.reused += 1
+            return model
+
+        client = pool["clients"].get(key)
+        if client is None or client.is_closed:
+            client = pool["clients"][key] = self._new_http_client()
+        model = pool["models"][cache_key] = self._new_model(key, client, settings)
+        return model
+
+    async def aclose(self):
+        """Closes the clients opened on the running loop (call at shutdown)."""
+        pool = self._loops.pop(asyncio.get_running_loop(), None)
+        if not pool:
+            return
+        for client in pool["clients"].values():
+            await client.aclose()
+        print(f"DEBUG: Closed {len(pool['clients'])} pooled Groq client(s)")
+
+    def stats(self) -> dict:
+        return {
+            "open_clients": sum(len(pool["clients"]) for pool in list(self._loops.values())),
+            "clients_created": self.clients_created,
+            "models_created": self.models_created,
+            "reused": self.reused,
+            "max_connections_per_key": self.limits.max_connections,
+        }
+
+groq_pool = GroqClientPool()
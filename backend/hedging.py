@@ -0,0 +1,105 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+# Send a duplicate of slow LLM calls to a second key ("true" to enable)
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+# A call is hedged once it runs longer than this percentile of its node's recent latency
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# Latency samples a node needs before it is hedged at all
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Extra LLM calls hedging may add, as a fraction of calls in the last HEDGE_WINDOW_SECONDS
+HEDGE_MAX_EXTRA_LOAD = float(os.getenv("HEDGE_MAX_EXTRA_LOAD", "0.1"))
+HEDGE_WINDOW_SECONDS = float(os.getenv("HEDGE_WINDOW_SECONDS", "300"))
+# Writer tokens are streamed to clients from the first call only, so it is not hedged by default
+HEDGE_NODES = {n.strip() for n in os.getenv("HEDGE_NODES", "gatekeeper,researcher,analyst,reviewer,suggester").split(",") if n.strip()}
+
+class HedgePolicy:
+    """
+    Decides when an LLM call gets a duplicate: after the node's recent
+    HEDGE_PERCENTILE latency has passed, and only while hedges stay under
+    HEDGE_MAX_EXTRA_LOAD of recent calls.
+    """
+    def __init__(self, enabled=LLM_HEDGING, percentile=HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES,
+                 max_extra_load=HEDGE_MAX_EXTRA_LOAD, window=HEDGE_WINDOW_SECONDS, nodes=HEDGE_NODES):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_extra_load = max_extra_load
+        self.window = window
+        self.nodes = set(nodes)
+        self.latencies = {}  # node -> recent successful call durations
+        self.calls = deque()
+        self.hedges = deque()
+        self.counts = {}  # node -> {"fired", "won", "capped"}
+
+    def _trim(self, now):
+        for times in (self.calls, self.hedges):
+            while times and now - times[0] > self.window:
+                times.popleft()
+
+    def record_call(self):
+        self.calls.append(time.monotonic())
+
+    def record_latency(self, node, seconds: float):
+        self.latencies.setdefault(node or "other", deque(maxlen=200)).append(seconds)
+
+    def delay(self, node):
+        """Seconds after which a call of `node` should be hedged, None if it should not be."""
+        if not self.enabled or node not in self.nodes:
+            return None
+        samples = self.latencies.get(node)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+
+    def allow(self, node) -> bool:
+        """Whether another hedge fits under the extra-load cap (counted as capped if not)."""
+        self._trim(time.monotonic())
+        if len(self.hedges) + 1 > self.max_extra_load * len(self.calls):
+            self._counts(node)["capped"] += 1
+            return False
+        return True
+
+    def record_hedge(self, node):
+        self.hedges.append(time.monotonic())
+        self._counts(node)["fired"] += 1
+
+    def record_win(self, node):
+        self._counts(node)["won"] += 1
+
+    def _counts(self, node):
+        return self.counts.setdefault(node or "other", {"fired": 0, "won": 0, "capped": 0})
+
+    def stats(self) -> dict:
+        self._trim(time.monotonic())
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "nodes": sorted(self.nodes),
+            "recent_calls": len(self.calls),
+            "recent_hedges": len(self.hedges),
+            "hedge_after_seconds": {node: round(self.delay(node), 2) for node in self.latencies if self.delay(node) is not None},
+            "counts": self.counts,
+        }
+
+async def first_success(primary: asyncio.Task, hedge: asyncio.Task):
+    """
+    Returns (task, result) for whichever task succeeds first and cancels the
+    other. If both fail, the primary's error is raised.
+    """
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in (primary, hedge):
+                if task in done and not task.cancelled() and task.exception() is None:
+                    return task, task.result()
+        return primary, primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+hedge_policy = HedgePolicy()
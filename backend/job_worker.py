@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import signal
+import socket
+import asyncio
+import multiprocessing
+from datetime import datetime, timedelta
+
+from .database import SessionLocal, ResearchJob, User, init_db, engine, backup_engine
+from .admission import current_requester
+from .groq_pool import groq_pool
+from .single_flight import DatabaseLock
+
+# Worker processes started by `python -m backend.job_worker`, and jobs each one runs at a time
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", "2"))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+# How often an idle worker looks for queued jobs (seconds)
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+# A running job whose worker has not reported in this long is requeued (seconds)
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+# Queued jobs beyond which POST /research/jobs answers 429
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+# Finished jobs are kept this long for polling clients (hours)
+JOB_RETENTION_HOURS = int(os.getenv("JOB_RETENTION_HOURS", "24"))
+# Run the job loop inside the API process (for single-container deploys without a worker service).
+# Every API worker starts it, but only the one holding the lease row runs jobs.
+JOB_WORKER_EMBEDDED = os.getenv("JOB_WORKER_EMBEDDED", "false").lower() == "true"
+# How long the embedded worker's lease lasts without renewal (seconds); it is renewed every third of that
+JOB_WORKER_LEASE_SECONDS = int(os.getenv("JOB_WORKER_LEASE_SECONDS", "60"))
+EMBEDDED_WORKER_KEY = "job_worker:embedded"
+
+# Progress events kept on a job row, and how often a running job's heartbeat is written (seconds)
+PROGRESS_EVENTS_KEPT = 20
+HEARTBEAT_SECONDS = 10
+# Assumed job duration until some jobs have finished
+DEFAULT_JOB_SECONDS = 120
+
+# =========================
+# Queue (used by the API)
+# =========================
+def queued_count(db) -> int:
+    return db.query(ResearchJob).filter(ResearchJob.status == "queued").count()
+
+def active_jobs_for_user(db, user_id: int) -> int:
+    """Queued or running jobs of a user; each will count against the daily limit when it finishes."""
+    return db.query(ResearchJob).filter(
+        ResearchJob.user_id == user_id,
+        ResearchJob.status.in_(["queued", "running"])
+    ).count()
+
+def queue_position(job, db) -> int:
+    """1-based position of a queued job, None once it has been picked up."""
+    if job.status != "queued":
+        return None
+    return db.query(ResearchJob).filter(
+        ResearchJob.status == "queued",
+        ResearchJob.created_at <= job.created_at
+    ).count()
+
+def average_job_seconds(db) -> float:
+    recent = db.query(ResearchJob.started_at, ResearchJob.finished_at).filter(
+        ResearchJob.status == "done",
+        ResearchJob.started_at.isnot(None)
+    ).order_by(ResearchJob.finished_at.desc()).limit(20).all()
+    durations = [(finished - started).total_seconds() for started, finished in recent if finished]
+    return sum(durations) / len(durations) if durations else DEFAULT_JOB_SECONDS
+
+def estimated_wait(db, queued: int) -> float:
+    """Seconds until a job queued behind `queued` others would start, assuming the configured worker pool."""
+    processes = 1 if JOB_WORKER_EMBEDDED else JOB_WORKER_PROCESSES
+    slots = max(1, processes * JOB_WORKER_CONCURRENCY)
+    return (queued // slots + 1) * average_job_seconds(db)
+
+def job_payload(job, db) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "query": job.query,
+        "queue_position": queue_position(job, db),
+        "progress": json.loads(job.progress) if job.progress else [],
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+# =========================
+# Worker side
+# =========================
+def claim_next_job(worker_id: str):
+    """
+    Atomically moves the oldest queued job to "running" for this worker.
+    The conditional UPDATE makes concurrent claims safe on SQLite and Postgres.
+    """
+    db = SessionLocal()
+    try:
+        for _ in range(3):
+            candidate = db.query(ResearchJob.id).filter(ResearchJob.status == "queued").order_by(ResearchJob.created_at).first()
+            if not candidate:
+                return None
+            now = datetime.utcnow()
+            claimed = db.query(ResearchJob).filter(
+                ResearchJob.id == candidate.id,
+                ResearchJob.status == "queued"
+            ).update({
+                ResearchJob.status: "running",
+                ResearchJob.worker: worker_id,
+                ResearchJob.started_at: now,
+                ResearchJob.heartbeat_at: now,
+                ResearchJob.attempts: ResearchJob.attempts + 1,
+            }, synchronize_session=False)
+            db.commit()
+            if claimed:
+                return candidate.id
+        return None
+    finally:
+        db.close()
+
+def requeue_stale_jobs():
+    """Requeues jobs whose worker died mid-run (or fails them after JOB_MAX_ATTEMPTS) and drops old finished jobs."""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        stale = [ResearchJob.status == "running", ResearchJob.heartbeat_at < now - timedelta(seconds=JOB_STALE_SECONDS)]
+        failed = db.query(ResearchJob).filter(*stale, ResearchJob.attempts >= JOB_MAX_ATTEMPTS).update({
+            ResearchJob.status: "failed",
+            ResearchJob.error: "Worker stopped responding",
+            ResearchJob.finished_at: now,
+        }, synchronize_session=False)
+        requeued = db.query(ResearchJob).filter(*stale).update({
+            ResearchJob.status: "queued",
+            ResearchJob.worker: None,
+        }, synchronize_session=False)
+        db.query(ResearchJob).filter(
+            ResearchJob.status.in_(["done", "failed"]),
+            ResearchJob.finished_at < now - timedelta(hours=JOB_RETENTION_HOURS)
+        ).delete(synchronize_session=False)
+        db.commit()
+        if failed or requeued:
+            print(f"WARNING: Recovered stale research jobs ({requeued} requeued, {failed} failed)")
+    except Exception as e:
+        db.rollback()
+        print(f"ERROR: Stale job recovery failed: {e}")
+    finally:
+        db.close()
+
+def update_owned_job(db, job_id: str, worker_id: str, values: dict) -> bool:
+    """
+    Writes to a job only while this worker still owns the run. False means
+    requeue_stale_jobs handed it to another worker (or finished it) meanwhile.
+    """
+    updated = db.query(ResearchJob).filter(
+        ResearchJob.id == job_id,
+        ResearchJob.worker == worker_id,
+        ResearchJob.status == "running"
+    ).update(values, synchronize_session=False)
+    db.commit()
+    return bool(updated)
+
+def write_heartbeat(job_id: str, worker_id: str):
+    db = SessionLocal()
+    try:
+        update_owned_job(db, job_id, worker_id, {ResearchJob.heartbeat_at: datetime.utcnow()})
+    except Exception as e:
+        db.rollback()
+        print(f"WARNING: Heartbeat for research job {job_id} failed: {e}")
+    finally:
+        db.close()
+
+async def keep_alive(job_id: str, worker_id: str):
+    """Writes the job's heartbeat on a timer, so a long silent LLM call doesn't make a live job look dead."""
+    while True:
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        await asyncio.to_thread(write_heartbeat, job_id, worker_id)
+
+async def run_job(job_id: str, worker_id: str):
+    # Lazy load the API helpers (and through them the AI chain) only in workers
+    from .main import ResearchRequest, stream_research_once, build_research_response
+
+    db = SessionLocal()
+    job = None
+    heartbeat = asyncio.create_task(keep_alive(job_id, worker_id))
+    try:
+        job = db.query(ResearchJob).filter(ResearchJob.id == job_id).first()
+        user = db.query(User).filter(User.id == job.user_id).first() if job.user_id else None
+        current_requester.set(job.requester or "anonymous")
+        req = ResearchRequest(query=job.query, thread_id=job.thread_id)
+        print(f"--- 🧾 Job {job_id}: '{job.query}' (attempt {job.attempts}) ---")
+
+        progress = []
+        output = None
+        async for event, data in stream_research_once(req, db):
+            if event == "result":
+                output = data
+            elif event == "progress":
+                # Writer tokens are skipped: progress stays at node level
+                progress.append(data)
+                update_owned_job(db, job_id, worker_id, {ResearchJob.progress: json.dumps(progress[-PROGRESS_EVENTS_KEPT:])})
+
+        response = await build_research_response(req, output, user, db)
+        finished = update_owned_job(db, job_id, worker_id, {
+            ResearchJob.status: "done",
+            ResearchJob.result: response.model_dump_json(),
+            ResearchJob.finished_at: datetime.utcnow(),
+        })
+        if not finished:
+            print(f"WARNING: Research job {job_id} was taken over by another worker, discarding this result")
+    except Exception as e:
+        db.rollback()
+        print(f"ERROR: Research job {job_id} failed: {e}")
+        if job is not None:
+            update_owned_job(db, job_id, worker_id, {
+                ResearchJob.status: "failed",
+                ResearchJob.error: str(e),
+                ResearchJob.finished_at: datetime.utcnow(),
+            })
+    finally:
+        heartbeat.cancel()
+        db.close()
+
+async def worker_loop(worker_id: str, concurrency: int = JOB_WORKER_CONCURRENCY):
+    """Runs up to `concurrency` jobs at a time until cancelled."""
+    async def slot(index: int):
+        while True:
+            try:
+                job_id = await asyncio.to_thread(claim_next_job, worker_id)
+                if job_id:
+                    await run_job(job_id, worker_id)
+                    continue
+                if index == 0:
+                    await asyncio.to_thread(requeue_stale_jobs)
+            except Exception as e:
+                print(f"ERROR in job worker loop: {e}")
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+    await asyncio.gather(*(slot(i) for i in range(concurrency)))
+
+async def embedded_worker_loop(worker_id: str, lease: DatabaseLock = None):
+    """
+    Job loop for JOB_WORKER_EMBEDDED. Every gunicorn worker calls this, but
+    only the one holding the lease row runs worker_loop; the others stand by
+    and take over once the holder stops renewing it.
+    """
+    lease = lease or DatabaseLock(ttl=JOB_WORKER_LEASE_SECONDS)
+    interval = lease.ttl / 3
+    while True:
+        if not await asyncio.to_thread(lease.acquire, EMBEDDED_WORKER_KEY):
+            await asyncio.sleep(interval)
+            continue
+        print(f"DEBUG: {worker_id} is running the embedded research job worker")
+        worker = asyncio.create_task(worker_loop(worker_id))
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                if not await asyncio.to_thread(lease.renew, EMBEDDED_WORKER_KEY):
+                    print(f"WARNING: {worker_id} lost the embedded job worker lease, stopping its jobs")
+                    break
+        finally:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+            await asyncio.to_thread(lease.release, EMBEDDED_WORKER_KEY)
+
+def _worker_process(concurrency: int):
+    # The supervisor's handlers are inherited on fork; workers should just stop on terminate()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # Pooled connections opened by init_db() were inherited too; leave them to the parent
+    # (close=False) and open fresh ones here
+    engine.dispose(close=False)
+    backup_engine.dispose(close=False)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"DEBUG: Research job worker {worker_id} started ({concurrency} slots)")
+
+    async def run():
+        try:
+            await worker_loop(worker_id, concurrency)
+        finally:
+            await groq_pool.aclose()
+
+    asyncio.run(run())
+
+def main():
+    """Supervises JOB_WORKER_PROCESSES worker processes, restarting any that die."""
+    init_db()
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes = []
+    while not stopping:
+        processes = [p for p in processes if p.is_alive()]
+        for _ in range(JOB_WORKER_PROCESSES - len(processes)):
+            process = multiprocessing.Process(target=_worker_process, args=(JOB_WORKER_CONCURRENCY,))
+            process.start()
+            processes.append(process)
+        time.sleep(5)
+
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout=30)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import os
+import re
+import json
+import asyncio
+from datetime import datetime, timedelta
+
+from .database import SessionLocal, KnowledgeBase, sync_to_local
+from .admission import admission, current_requester, priority_override
+from .single_flight import single_flight, research_lock
+from .text_utils import slugify, normalize_query
+from . import metrics
+
+# How long a knowledge base report stays fresh, per topic (seconds). Override with
+# KB_TOPIC_TTLS='{"markets": 43200, "default": 604800}'. Keep these above
+# SEARCH_CACHE_TTL_SECONDS, or a refresh may re-read the same search results.
+KB_TOPIC_TTLS = {
+    "markets": 24 * 3600,
+    "news": 24 * 3600,
+    "policy": 7 * 24 * 3600,
+    "default": 30 * 24 * 3600,
+    **json.loads(os.getenv("KB_TOPIC_TTLS", "{}")),
+}
+# Set to "false" to serve knowledge base entries forever, as before
+KB_REFRESH_ENABLED = os.getenv("KB_REFRESH_ENABLED", "true").lower() == "true"
+# Refreshes running at once on this worker
+KB_REFRESH_CONCURRENCY = int(os.getenv("KB_REFRESH_CONCURRENCY", "1"))
+
+# First matching topic wins; anything else is "default"
+TOPIC_PATTERNS = [
+    ("news", re.compile(r"\b(latest|news|today|this (week|month|year)|recent(ly)?|update[sd]?|20[2-3]\d)\b")),
+    ("markets", re.compile(r"\b(prices?|pricing|costs?|tariffs?|markets?|stocks?|shares?|invest(ment|ing|ors?)?|funding|auctions?|ppas?)\b")),
+    ("policy", re.compile(r"\b(polic(y|ies)|regulations?|subsid(y|ies)|incentives?|laws?|mandates?|targets?|tax credits?|ira)\b")),
+]
+
+# Entries being refreshed right now, so a hot stale entry is only regenerated once
+_refreshing = set()
+_tasks = set()
+refresh_stats = {"stale_hits": 0, "started": 0, "refreshed": 0, "skipped_busy": 0, "not_relevant": 0, "failed": 0}
+
+def topic_for(query: str) -> str:
+    text = normalize_query(query)
+    for topic, pattern in TOPIC_PATTERNS:
+        if pattern.search(text):
+            return topic
+    return "default"
+
+def ttl_for(query: str) -> int:
+    return int(KB_TOPIC_TTLS.get(topic_for(query), KB_TOPIC_TTLS["default"]))
+
+def is_stale(entry, now: datetime = None) -> bool:
+    """Whether a KnowledgeBase row has outlived its TTL (rows from before freshness tracking use their timestamp)."""
+    if not KB_REFRESH_ENABLED:
+        return False
+    generated_at = entry.refreshed_at or entry.timestamp
+    if generated_at is None:
+        return True
+    ttl = entry.ttl_seconds or ttl_for(entry.query)
+    return (now or datetime.utcnow()) - generated_at > timedelta(seconds=ttl)
+
+async def _regenerate(query: str) -> dict:
+    # Every LLM call of the refresh queues in the background class, behind live requests
+    priority_override.set("background")
+    current_requester.set("kb-refresh")
+    # Lazy load heavy AI chain only when needed
+    from .research_chain import run_full_research
+    return await run_full_research(query)
+
+async def refresh_entry(entry_id: int, session_factory=SessionLocal):
+    """
+    Re-runs the research pipeline for a stale entry and swaps the new report
+    in with a single row update; readers keep getting the old report until then.
+    """
+    db = session_factory()
+    try:
+        entry = db.query(KnowledgeBase).filter(KnowledgeBase.id == entry_id).first()
+        if not entry or not is_stale(entry):
+            return
+        key = slugify(normalize_query(entry.query))
+        if single_flight.in_flight(key) or (research_lock and not research_lock.acquire(key)):
+            # Already being researched here or on another worker
+            return
+        refresh_stats["started"] += 1
+        metrics.KNOWLEDGE_BASE_REFRESHES.labels(outcome="started").inc()
+        try:
+            # single_flight runs it as its own task, so the background priority stays with this run
+            output, _ = await single_flight.do(key, lambda: _regenerate(entry.query))
+        finally:
+            if research_lock:
+                research_lock.release(key)
+
+        if not output.get("is_relevant") or not output.get("report"):
+            # Keep serving the old report rather than replacing it with a refusal
+            refresh_stats["not_relevant"] += 1
+            metrics.KNOWLEDGE_BASE_REFRESHES.labels(outcome="not_relevant").inc()
+            return
+        entry.content = output["report"]
+        if output.get("suggestions") is not None:
+            entry.suggestions = json.dumps(output["suggestions"])
+        entry.refreshed_at = datetime.utcnow()
+        entry.ttl_seconds = ttl_for(entry.query)
+        db.commit()
+        db.refresh(entry)
+        sync_to_local(entry)
+        refresh_stats["refreshed"] += 1
+        metrics.KNOWLEDGE_BASE_REFRESHES.labels(outcome="refreshed").inc()
+        print(f"DEBUG: Refreshed stale knowledge base entry {entry_id} ('{entry.query}')")
+    except Exception as e:
+        db.rollback()
+        refresh_stats["failed"] += 1
+        metrics.KNOWLEDGE_BASE_REFRESHES.labels(outcome="failed").inc()
+        print(f"ERROR: Knowledge base refresh failed for entry {entry_id}: {e}")
+    finally:
+        db.close()
+
+def request_refresh(entry_id: int) -> bool:
+    """
+    Schedules a background refresh of a stale entry without blocking the
+    caller. Skipped while live traffic keeps the LLM busy or enough refreshes
+    are already running; the next stale hit asks again.
+    """
+    refresh_stats["stale_hits"] += 1
+    if entry_id in _refreshing:
+        return False
+    if len(_refreshing) >= KB_REFRESH_CONCURRENCY or admission.is_busy():
+        refresh_stats["skipped_busy"] += 1
+        metrics.KNOWLEDGE_BASE_REFRESHES.labels(outcome="skipped_busy").inc()
+        return False
+    _refreshing.add(entry_id)
+    task = asyncio.create_task(refresh_entry(entry_id))
+    _tasks.add(task)
+    task.add_done_callback(lambda t: (_tasks.discard(t), _refreshing.discard(entry_id)))
+    return True
+
+def stats() -> dict:
+    return {"enabled": KB_REFRESH_ENABLED, "ttl_seconds": KB_TOPIC_TTLS, "refreshing": len(_refreshing), **refresh_stats}
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Set to "false" to send every LLM call to Groq
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+# How long a response is reused (seconds) and how much memory the cache may hold per worker
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(6 * 3600)))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "32"))
+# Nodes whose calls must stay stochastic. The writer is re-run precisely to get a
+# different draft after a reviewer FAIL, and its tokens are streamed to the client.
+LLM_CACHE_SKIP_NODES = {n.strip() for n in os.getenv("LLM_CACHE_SKIP_NODES", "writer").split(",") if n.strip()}
+
+def response_key(prompt, inputs: dict, settings: dict) -> str:
+    """Content address of an LLM call: prompt template, rendered inputs and model settings."""
+    payload = json.dumps({
+        "template": getattr(prompt, "template", None) or repr(prompt),
+        "inputs": inputs,
+        "settings": settings,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """
+    Per-worker LRU of LLM responses bounded by total size in bytes, with
+    per-entry expiry. Lookups and hits are counted per node.
+    """
+    def __init__(self, max_bytes: int = int(LLM_CACHE_MAX_MB * 1024 * 1024), ttl: float = LLM_CACHE_TTL,
+                 skip_nodes=LLM_CACHE_SKIP_NODES, enabled: bool = LLM_CACHE_ENABLED):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.skip_nodes = set(skip_nodes)
+        self.enabled = enabled
+        self._data = OrderedDict()  # key -> (text, expires_at, size)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+        self.nodes = {}
+
+    def enabled_for(self, node) -> bool:
+        return self.enabled and node not in self.skip_nodes
+
+    def _count(self, node, field):
+        counts = self.nodes.setdefault(node or "other", {"hits": 0, "misses": 0})
+        counts[field] += 1
+
+    def get(self, key: str, node=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] <= time.monotonic():
+                self._drop(key)
+                item = None
+            if item is None:
+                self._count(node, "misses")
+                return None
+            self._data.move_to_end(key)
+            self._count(node, "hits")
+            return item[0]
+
+    def set(self, key: str, text: str):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (text, time.monotonic() + self.ttl, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, _, size = self._data.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "skip_nodes": sorted(self.skip_nodes),
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "nodes": {
+                node: {**counts, "hit_rate": round(counts["hits"] / (counts["hits"] + counts["misses"]), 3)}
+                for node, counts in self.nodes.items()
+            },
+        }
+
+llm_cache = LLMResponseCache()
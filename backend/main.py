@@ -1,11 +1,14 @@
 from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 import sentry_sdk
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from dotenv import load_dotenv
 import os
-import re
+import json
+import math
+import asyncio
 import secrets
 from datetime import datetime, timedelta
 from typing import List, Optional
@@ -26,6 +29,18 @@ class ResearchResponse(BaseModel):
     file_path: Optional[str] = None
     suggestions: List[str] = []
 
+class ResearchJobResponse(BaseModel):
+    job_id: str
+    status: str
+    query: str
+    queue_position: Optional[int] = None
+    progress: List[dict] = []
+    result: Optional[ResearchResponse] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 class UserCreate(BaseModel):
     username: str
     email: str
@@ -66,28 +81,25 @@ class ResetPasswordRequest(BaseModel):
 
 # --- DB & SERVICES ---
 # (AI imports moved inside endpoints to save memory)
-from .database import engine, Base, get_db, User, ChatHistory, KnowledgeBase, init_db, sync_to_local
+from .database import engine, Base, get_db, User, ChatHistory, KnowledgeBase, ResearchJob, init_db, sync_to_local
 from .auth import verify_password, get_password_hash, create_access_token, create_refresh_token, decode_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, verify_google_token
 from .email_service import send_verification_email, send_reset_email
+from .semantic_cache import semantic_index
+from .single_flight import single_flight, research_lock
+from .admission import admission, AdmissionRejected, current_requester
+from .rate_limiter import rate_limiter, RateLimitExceeded
+from .groq_pool import groq_pool
+from .metrics import render_metrics, CONTENT_TYPE_LATEST, KNOWLEDGE_BASE_LOOKUPS
+from .suggestions_backfill import load_suggestions, request_backfill
+from . import kb_refresh
+from .job_worker import JOB_MAX_QUEUED, JOB_WORKER_EMBEDDED, queued_count, estimated_wait, job_payload, active_jobs_for_user
 
 # --- HELPERS ---
-def slugify(text: str) -> str:
-    text = text.lower().strip()
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[\s_-]+', '-', text)
-    text = re.sub(r'^-+|-+$', '', text)
-    return text
-
-def normalize_query(query: str) -> str:
-    query = query.lower().strip()
-    query = re.sub(r'[^\w\s]', '', query)
-    words = sorted(query.split())
-    return " ".join(words)
-
-REQUEST_TIMESTAMPS = []
-IP_REQUESTS = {} # {ip: [timestamps]}
-RPM_LIMIT = 25 
-IP_RPM_LIMIT = 10 # 10 requests per minute per IP
+from .text_utils import slugify, normalize_query
+
+CACHE_STATS = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+# Full research runs a signed-in user gets per 24h
+DAILY_RESEARCH_LIMIT = 15
 
 # --- SENTRY SETUP ---
 SENTRY_DSN = os.getenv("SENTRY_DSN")
@@ -130,8 +142,18 @@ async def startup_event():
     threading.Thread(target=heavy_startup, daemon=True).start()
     
     from .gdrive_backup import periodic_gdrive_backup
+    from .suggestions_backfill import periodic_suggestions_backfill
     import asyncio
     asyncio.create_task(periodic_gdrive_backup())
+    asyncio.create_task(periodic_suggestions_backfill())
+    if JOB_WORKER_EMBEDDED:
+        from .job_worker import embedded_worker_loop
+        asyncio.create_task(embedded_worker_loop(f"api-{os.getpid()}"))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Close kept-alive Groq connections instead of dropping them mid-stream
+    await groq_pool.aclose()
 
 @app.get("/health")
 def health_check(db: Session = Depends(get_db)):
@@ -160,6 +182,38 @@ def health_check(db: Session = Depends(get_db)):
 
     return health_status
 
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint, aggregated across all gunicorn workers."""
+    from fastapi.responses import Response
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/stats")
+def runtime_stats():
+    """Per-worker runtime counters used for capacity planning."""
+    from .research_chain import key_manager, memory, NODE_MODEL_CONFIG, llm_cache, SPECULATIVE_MODE, speculation_stats, hedge_policy, retry_policy
+    from .search_cache import search_cache
+    from .report_quality import review_gate_stats
+    from .domain_classifier import domain_classifier
+    return {
+        "groq_keys": key_manager.stats(),
+        "search_cache": search_cache.stats(),
+        "knowledge_base_cache": {**CACHE_STATS, "semantic_index": semantic_index.stats()},
+        "knowledge_base_refresh": kb_refresh.stats(),
+        "single_flight": single_flight.stats(),
+        "review_gate": review_gate_stats,
+        "gatekeeper_classifier": domain_classifier.stats(),
+        "llm_admission": admission.stats(),
+        "checkpointer": memory.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "groq_clients": groq_pool.stats(),
+        "llm_models": NODE_MODEL_CONFIG,
+        "llm_cache": llm_cache.stats(),
+        "speculation": {"mode": SPECULATIVE_MODE, **speculation_stats},
+        "llm_hedging": hedge_policy.stats(),
+        "llm_retries": retry_policy.stats(),
+    }
+
 @app.middleware("http")
 async def manual_cors_and_headers(request, call_next):
     origin = request.headers.get("Origin")
@@ -315,87 +369,376 @@ def refresh_token(req: RefreshRequest, db: Session = Depends(get_db)):
         "username": user.username
     }
 
+def rate_limit_identities(client_ip: str, user: Optional[User]) -> dict:
+    """Scopes a request counts against: everyone together, the client IP, and the signed-in user if any."""
+    identities = {"global": "all", "ip": client_ip}
+    if user:
+        identities["user"] = str(user.id)
+    return identities
+
+RATE_LIMIT_MESSAGES = {
+    "global": "Server busy, try again in a minute",
+    "ip": "Too many requests from your IP. Please wait a minute.",
+    "user": "Too many requests. Please wait a minute.",
+}
+
+def rate_limit_error(e: RateLimitExceeded) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=RATE_LIMIT_MESSAGES.get(e.scope, "Too many requests"),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def check_research_limits(client_ip: str, user: Optional[User], db: Session, now: datetime, route: str = "research", reserved: int = 0):
+    """
+    Raises 429 if the global, per-IP or per-user quota is exhausted.
+    `reserved` counts runs already promised to the user but not yet in chats_count (queued jobs).
+    """
+    try:
+        rate_limiter.check(route, rate_limit_identities(client_ip, user))
+    except RateLimitExceeded as e:
+        raise rate_limit_error(e)
+
+    if user:
+        if user.limit_reached_at and now - user.limit_reached_at < timedelta(hours=24): 
+            raise HTTPException(status_code=429, detail="Daily limit reached")
+        if user.chats_count >= DAILY_RESEARCH_LIMIT:
+            user.limit_reached_at = now
+            db.commit()
+            db.refresh(user)
+            sync_to_local(user)
+            raise HTTPException(status_code=429, detail="Daily limit hit")
+        if user.chats_count + reserved >= DAILY_RESEARCH_LIMIT:
+            raise HTTPException(status_code=429, detail="Daily limit hit (including your unfinished research jobs)")
+
+def check_llm_capacity():
+    """Turns a research request away up front when the LLM queue is already too deep to serve it promptly."""
+    try:
+        admission.check()
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Server busy ({e.queue_depth} AI calls queued), estimated wait {math.ceil(e.retry_after)}s",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+
+def record_research_request(client_ip: str, user: Optional[User], route: str = "research"):
+    """
+    Counts a full (non-cached) research run against the global, per-IP and
+    per-user limits. The count and the limit check are one step, so this
+    raises 429 if a concurrent request took the last slot since
+    check_research_limits.
+    """
+    try:
+        rate_limiter.hit(route, rate_limit_identities(client_ip, user))
+    except RateLimitExceeded as e:
+        raise rate_limit_error(e)
+
+async def build_cached_response(req: ResearchRequest, cache: dict, user: Optional[User], db: Session) -> ResearchResponse:
+    # Save to ChatHistory even for cached responses
+    report_id = None
+    if user:
+        new_chat = ChatHistory(user_id=user.id, query=req.query, response=cache["result"])
+        db.add(new_chat)
+        db.commit()
+        db.refresh(new_chat)
+        sync_to_local(new_chat)
+        report_id = new_chat.id
+
+    # Suggestions are stored with the entry; legacy rows get them generated in the background
+    suggestions = cache.get("suggestions")
+    if suggestions is None:
+        suggestions = []
+        if cache.get("id"):
+            request_backfill(cache["id"])
+    # Stale-while-revalidate: serve the stored report now, regenerate it in the background
+    if cache.get("stale") and cache.get("id"):
+        kb_refresh.request_refresh(cache["id"])
+    return ResearchResponse(query=req.query, result=cache["result"], id=report_id, file_path="cache", suggestions=suggestions)
+
+def persist_research_output(query: str, output: dict, db: Session) -> dict:
+    """Saves a fresh report once per run (knowledge base + file), before it is shared with waiting requests."""
+    # Only save to knowledge base and file if query is energy-related
+    output["file_path"] = None
+    if output.get("is_relevant"):
+        save_to_knowledge_base(query, output["report"], db, output.get("suggestions"))
+        output["file_path"] = save_result_to_file(query, output["report"])
+    return output
+
+async def build_research_response(req: ResearchRequest, output: dict, user: Optional[User], db: Session) -> ResearchResponse:
+    # Another worker produced this report; account for it like a cache hit
+    if output.get("cached"):
+        return await build_cached_response(req, {"result": output["report"], "suggestions": output.get("suggestions")}, user, db)
+
+    res_text = output["report"]
+    report_id = None
+    if user:
+        user.chats_count += 1
+        new_chat = ChatHistory(user_id=user.id, query=req.query, response=res_text)
+        db.add(new_chat)
+        db.commit()
+        db.refresh(new_chat)
+        db.refresh(user)
+        sync_to_local(new_chat)
+        sync_to_local(user)
+        report_id = new_chat.id
+
+    return ResearchResponse(query=req.query, result=res_text, id=report_id, file_path=output.get("file_path"), suggestions=output.get("suggestions", []))
+
+def research_key(query: str) -> str:
+    return slugify(normalize_query(query))
+
+async def wait_for_other_worker(key: str, db: Session) -> Optional[dict]:
+    """Waits for the worker holding the research lock to publish its report to the knowledge base."""
+    def published():
+        return db.query(KnowledgeBase).filter(KnowledgeBase.slug == key).first()
+
+    entry = await research_lock.wait(key, published)
+    if not entry:
+        return None
+    return {"report": entry.content, "suggestions": load_suggestions(entry), "is_relevant": True, "cached": True}
+
+async def run_research_once(req: ResearchRequest, db: Session) -> dict:
+    """
+    Runs the research pipeline once for all concurrent requests with the same
+    normalized query. Each caller still gets its own ChatHistory row and quota
+    accounting from build_research_response.
+    """
+    key = research_key(req.query)
+
+    async def shared_run():
+        if research_lock and not research_lock.acquire(key):
+            print(f"DEBUG: '{key}' is being researched by another worker, waiting for it")
+            output = await wait_for_other_worker(key, db)
+            if output:
+                return output
+        try:
+            # Lazy load heavy AI chain only when needed
+            from .research_chain import run_full_research
+            output = await run_full_research(req.query, req.thread_id)
+            return persist_research_output(req.query, output, db)
+        finally:
+            if research_lock:
+                research_lock.release(key)
+
+    output, shared = await single_flight.do(key, shared_run)
+    if shared:
+        print(f"DEBUG: Joined in-flight research for '{key}'")
+    return output
+
 @app.post("/research", response_model=ResearchResponse)
 async def research(req: ResearchRequest, request: Request, user: Optional[User] = Depends(get_optional_user), db: Session = Depends(get_db)):
     try:
-        global REQUEST_TIMESTAMPS, IP_REQUESTS
         now = datetime.utcnow()
         client_ip = request.client.host
-
-        # 1. Global Rate Limit Check
-        REQUEST_TIMESTAMPS = [t for t in REQUEST_TIMESTAMPS if now - t < timedelta(seconds=60)]
-        if len(REQUEST_TIMESTAMPS) >= RPM_LIMIT: 
-            raise HTTPException(status_code=429, detail="Server busy, try again in a minute")
-
-        # 2. IP-based Rate Limit Check
-        if client_ip not in IP_REQUESTS:
-            IP_REQUESTS[client_ip] = []
-        IP_REQUESTS[client_ip] = [t for t in IP_REQUESTS[client_ip] if now - t < timedelta(seconds=60)]
-        
-        if len(IP_REQUESTS[client_ip]) >= IP_RPM_LIMIT:
-            raise HTTPException(status_code=429, detail="Too many requests from your IP. Please wait a minute.")
-
-        if user:
-            if user.limit_reached_at and now - user.limit_reached_at < timedelta(hours=24): 
-                raise HTTPException(status_code=429, detail="Daily limit reached")
-            if user.chats_count >= 15:
-                user.limit_reached_at = now
-                db.commit()
-                db.refresh(user)
-                sync_to_local(user)
-                raise HTTPException(status_code=429, detail="Daily limit hit")
+        check_research_limits(client_ip, user, db, now)
+        # LLM calls made for this request queue fairly against other users
+        current_requester.set(f"user:{user.id}" if user else f"ip:{client_ip}")
 
         norm_q = normalize_query(req.query)
         cache = check_in_cache(norm_q, db)
         if cache:
-            # Save to ChatHistory even for cached responses
-            report_id = None
-            if user:
-                new_chat = ChatHistory(user_id=user.id, query=req.query, response=cache["result"])
-                db.add(new_chat)
-                db.commit()
-                db.refresh(new_chat)
-                sync_to_local(new_chat)
-                report_id = new_chat.id
-
-            # Even for cache, we want to show suggestions
-            from .research_chain import invoke_chain_with_retry, suggestions_prompt
-            try:
-                result = await invoke_chain_with_retry(suggestions_prompt, {"report": cache["result"]})
-                suggestions = [q.strip() for q in result.strip().split('\n') if q.strip()][:3]
-            except:
-                suggestions = []
-            return ResearchResponse(query=req.query, result=cache["result"], id=report_id, file_path="cache", suggestions=suggestions)
-
-        REQUEST_TIMESTAMPS.append(now)
-        IP_REQUESTS[client_ip].append(now)
-        
-        # Lazy load heavy AI chain only when needed
-        from .research_chain import run_full_research
-        output = await run_full_research(req.query, req.thread_id)
-        res_text = output["report"]
-        # Only save to knowledge base and file if query is energy-related
-        file_path = None
-        if output.get("is_relevant"):
-            save_to_knowledge_base(req.query, res_text, db)
-            file_path = save_result_to_file(req.query, res_text)
-
-        report_id = None
-        if user:
-            user.chats_count += 1
-            new_chat = ChatHistory(user_id=user.id, query=req.query, response=res_text)
-            db.add(new_chat)
-            db.commit()
-            db.refresh(new_chat)
-            db.refresh(user)
-            sync_to_local(new_chat)
-            sync_to_local(user)
-            report_id = new_chat.id
+            return await build_cached_response(req, cache, user, db)
 
-        return ResearchResponse(query=req.query, result=res_text, id=report_id, file_path=file_path, suggestions=output.get("suggestions", []))
+        check_llm_capacity()
+        record_research_request(client_ip, user)
+        output = await run_research_once(req, db)
+        return await build_research_response(req, output, user, db)
     except HTTPException as he: raise he
     except Exception as e: raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+# research key -> event queues of the clients streaming that run on this worker
+stream_subscribers = {}
+# Strong references to streamed runs, which outlive the client that started them
+background_runs = set()
+
+async def broadcast_research(key: str, req: ResearchRequest, db: Session, future):
+    """
+    Runs a streamed research for `key` detached from the client that started it.
+    Events go to every subscriber queue and the output resolves the shared
+    future, so a client disconnecting only drops its own queue.
+    """
+    def publish(event, data):
+        for queue in stream_subscribers.get(key, []):
+            queue.put_nowait((event, data))
+
+    try:
+        output = None
+        if research_lock and not research_lock.acquire(key):
+            publish("progress", {"node": "queue", "status": "started", "message": "Waiting for identical research on another worker"})
+            output = await wait_for_other_worker(key, db)
+
+        if output is None:
+            try:
+                # Lazy load heavy AI chain only when needed
+                from .research_chain import stream_full_research
+                async for event, data in stream_full_research(req.query, req.thread_id):
+                    if event == "result":
+                        output = data
+                    else:
+                        publish(event, data)
+            finally:
+                if research_lock:
+                    research_lock.release(key)
+            output = persist_research_output(req.query, output, db)
+
+        future.set_result(output)
+        publish("result", output)
+    except BaseException as e:
+        if not future.done():
+            future.set_exception(RuntimeError(f"Shared research run failed: {e!r}"))
+        publish("error", e)
+        if not isinstance(e, Exception):
+            raise
+    finally:
+        single_flight.release(key, future)
+        stream_subscribers.pop(key, None)
+
+async def stream_research_once(req: ResearchRequest, db: Session):
+    """
+    Streams the research run for a key, starting it if none is in flight.
+    The run is registered with single_flight so identical requests (streaming
+    or not) can join it, and streaming joiners get the remaining events too.
+    Yields (event, data) tuples, ending with ("result", output).
+    """
+    key = research_key(req.query)
+    queue = asyncio.Queue()
+    if key in stream_subscribers:
+        yield "progress", {"node": "queue", "status": "started", "message": "Joining identical research already in progress"}
+        stream_subscribers[key].append(queue)
+        single_flight.followers += 1
+    elif single_flight.in_flight(key):
+        # Led by a non-streaming request: only the result can be shared
+        yield "progress", {"node": "queue", "status": "started", "message": "Joining identical research already in progress"}
+        yield "result", await single_flight.join(key)
+        return
+    else:
+        future = asyncio.get_running_loop().create_future()
+        single_flight.register(key, future)
+        stream_subscribers[key] = [queue]
+        run = asyncio.create_task(broadcast_research(key, req, db, future))
+        background_runs.add(run)
+        run.add_done_callback(background_runs.discard)
+
+    try:
+        while True:
+            event, data = await queue.get()
+            if event == "error":
+                raise data
+            yield event, data
+            if event == "result":
+                return
+    finally:
+        # A disconnecting client only stops listening; the run carries on for the others
+        subscribers = stream_subscribers.get(key)
+        if subscribers and queue in subscribers:
+            subscribers.remove(queue)
+
+@app.post("/research/stream")
+async def research_stream(req: ResearchRequest, request: Request, user: Optional[User] = Depends(get_optional_user), db: Session = Depends(get_db)):
+    """
+    Server-Sent-Events variant of /research.
+    Emits "progress" events per graph node, "token" events while the writer
+    generates, then a final "result" event carrying the ResearchResponse.
+    Quota errors are raised before the stream starts so clients get a plain 429.
+    """
+    now = datetime.utcnow()
+    client_ip = request.client.host
+    check_research_limits(client_ip, user, db, now)
+    current_requester.set(f"user:{user.id}" if user else f"ip:{client_ip}")
+
+    norm_q = normalize_query(req.query)
+    cache = check_in_cache(norm_q, db)
+    if not cache:
+        check_llm_capacity()
+        record_research_request(client_ip, user)
+
+    async def event_stream():
+        try:
+            if cache:
+                yield sse_event("progress", {"node": "cache", "status": "finished", "message": "Found in knowledge base"})
+                response = await build_cached_response(req, cache, user, db)
+                yield sse_event("result", response.model_dump())
+                return
+
+            yield sse_event("progress", {"node": "queue", "status": "started", "message": "Starting research"})
+            output = None
+            async for event, data in stream_research_once(req, db):
+                if event == "result":
+                    output = data
+                else:
+                    yield sse_event(event, data)
+
+            response = await build_research_response(req, output, user, db)
+            yield sse_event("result", response.model_dump())
+        except Exception as e:
+            print(f"ERROR: Streaming research failed: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/research/jobs", response_model=ResearchJobResponse, status_code=202)
+async def create_research_job(req: ResearchRequest, request: Request, user: Optional[User] = Depends(get_optional_user), db: Session = Depends(get_db)):
+    """
+    Queues a research run for the job workers and returns immediately.
+    Poll GET /research/jobs/{job_id} for progress and the final ResearchResponse.
+    """
+    now = datetime.utcnow()
+    client_ip = request.client.host
+    # Jobs only add to chats_count when they finish, so unfinished ones hold their share of the daily limit
+    reserved = active_jobs_for_user(db, user.id) if user else 0
+    check_research_limits(client_ip, user, db, now, route="research_jobs", reserved=reserved)
+
+    job = ResearchJob(
+        id=secrets.token_hex(16),
+        query=req.query,
+        thread_id=req.thread_id,
+        user_id=user.id if user else None,
+        requester=f"user:{user.id}" if user else f"ip:{client_ip}",
+        status="queued",
+        created_at=now
+    )
+
+    norm_q = normalize_query(req.query)
+    cache = check_in_cache(norm_q, db)
+    if cache:
+        # Nothing to run; the job is born finished
+        response = await build_cached_response(req, cache, user, db)
+        job.status = "done"
+        job.progress = json.dumps([{"node": "cache", "status": "finished", "message": "Found in knowledge base"}])
+        job.result = response.model_dump_json()
+        job.finished_at = now
+    else:
+        queued = queued_count(db)
+        if queued >= JOB_MAX_QUEUED:
+            wait = math.ceil(estimated_wait(db, queued))
+            raise HTTPException(
+                status_code=429,
+                detail=f"Research queue is full ({queued} jobs waiting), estimated wait {wait}s",
+                headers={"Retry-After": str(wait)}
+            )
+        record_research_request(client_ip, user, route="research_jobs")
+
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job_payload(job, db)
+
+@app.get("/research/jobs/{job_id}", response_model=ResearchJobResponse)
+def get_research_job(job_id: str, user: Optional[User] = Depends(get_optional_user), db: Session = Depends(get_db)):
+    job = db.query(ResearchJob).filter(ResearchJob.id == job_id).first()
+    # Jobs of signed-in users are only visible to them
+    if not job or (job.user_id and (not user or user.id != job.user_id)):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_payload(job, db)
+
 @app.get("/history", response_model=List[ChatHistoryResponse])
 async def history(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     return db.query(ChatHistory).filter(ChatHistory.user_id == user.id).order_by(ChatHistory.timestamp.desc()).limit(10).all()
@@ -465,22 +808,46 @@ async def get_shared_report(item_id: int, db: Session = Depends(get_db)):
 def check_in_cache(query: str, db: Session):
     slug = slugify(normalize_query(query))
     entry = db.query(KnowledgeBase).filter(KnowledgeBase.slug == slug).first()
-    return {"result": entry.content} if entry else None
-
-def save_to_knowledge_base(query: str, content: str, db: Session):
+    if entry:
+        CACHE_STATS["exact_hits"] += 1
+        KNOWLEDGE_BASE_LOOKUPS.labels(result="exact_hit").inc()
+        return {"result": entry.content, "suggestions": load_suggestions(entry), "id": entry.id, "stale": kb_refresh.is_stale(entry)}
+
+    # Fall back to a near-duplicate of a previously answered question
+    match = semantic_index.lookup(query, db)
+    if match:
+        entry = db.query(KnowledgeBase).filter(KnowledgeBase.id == match[0]).first()
+        if entry:
+            print(f"DEBUG: Semantic cache hit ({match[1]:.2f}) for '{query}' -> '{entry.query}'")
+            CACHE_STATS["semantic_hits"] += 1
+            KNOWLEDGE_BASE_LOOKUPS.labels(result="semantic_hit").inc()
+            return {"result": entry.content, "suggestions": load_suggestions(entry), "id": entry.id, "stale": kb_refresh.is_stale(entry)}
+
+    CACHE_STATS["misses"] += 1
+    KNOWLEDGE_BASE_LOOKUPS.labels(result="miss").inc()
+    return None
+
+def save_to_knowledge_base(query: str, content: str, db: Session, suggestions: Optional[List[str]] = None):
     try:
         norm_q = normalize_query(query)
         slug = slugify(norm_q)
+        # "[]" means generated but empty; None is left for "never generated" (picked up by the backfill)
+        stored_suggestions = json.dumps(suggestions) if suggestions is not None else None
         existing = db.query(KnowledgeBase).filter((KnowledgeBase.slug == slug) | (KnowledgeBase.query == query)).first()
         if not existing:
-            new_kb = KnowledgeBase(query=query, slug=slug, content=content)
+            new_kb = KnowledgeBase(query=query, slug=slug, content=content, suggestions=stored_suggestions,
+                                   refreshed_at=datetime.utcnow(), ttl_seconds=kb_refresh.ttl_for(query))
             db.add(new_kb)
             db.commit()
             db.refresh(new_kb)
             sync_to_local(new_kb)
+            semantic_index.add(new_kb.id, new_kb.query)
         else:
             existing.content = content
             existing.slug = slug
+            existing.suggestions = stored_suggestions
+            existing.refreshed_at = datetime.utcnow()
+            existing.ttl_seconds = kb_refresh.ttl_for(existing.query)
             db.commit()
             db.refresh(existing)
             sync_to_local(existing)
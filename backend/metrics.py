@@ -0,0 +1,103 @@
+import os
+import time
+import functools
+from prometheus_client import Counter, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+
+# Set in the Dockerfile: every gunicorn worker writes its samples to files here and
+# /metrics merges them, so any worker can answer a scrape with totals for all of them
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR:
+    # Processes started outside the Dockerfile CMD (e.g. job workers) may not have created it
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+# Graph nodes take seconds (gatekeeper) to minutes (writer)
+NODE_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180, 300)
+
+NODE_DURATION = Histogram(
+    "energymind_node_duration_seconds", "Time spent in each research graph node",
+    ["node"], buckets=NODE_BUCKETS
+)
+LLM_CALLS = Counter(
+    "energymind_llm_calls_total", "LLM calls by node and outcome (ok, rate_limited, error)",
+    ["node", "outcome"]
+)
+LLM_CALL_DURATION = Histogram(
+    "energymind_llm_call_duration_seconds", "Latency of single LLM calls by node and model",
+    ["node", "model"], buckets=NODE_BUCKETS
+)
+LLM_RETRIES = Counter(
+    "energymind_llm_retries_total",
+    "Failed LLM call attempts by node, failure class and retry decision (retried, fatal, attempts_exhausted, budget_exhausted)",
+    ["node", "reason", "decision"]
+)
+LLM_RETRY_SECONDS = Counter(
+    "energymind_llm_retry_seconds_total", "Seconds lost to failed LLM attempts and retry waits, by node and failure class",
+    ["node", "reason"]
+)
+LLM_RATE_LIMITS = Counter(
+    "energymind_llm_rate_limited_total", "429 responses per Groq key (masked)", ["key"]
+)
+LLM_CACHE_LOOKUPS = Counter(
+    "energymind_llm_cache_lookups_total", "LLM response cache lookups by node and result (hit, miss)",
+    ["node", "result"]
+)
+LLM_TOKENS = Counter(
+    "energymind_llm_tokens_total", "Prompt and completion tokens reported by the LLM",
+    ["node", "model", "kind"]
+)
+SEARCH_DURATION = Histogram(
+    "energymind_search_duration_seconds", "Web search latency by source (tavily or cache)",
+    ["source"], buckets=(0.01, 0.1, 0.5, 1, 2, 5, 10, 20, 30)
+)
+KNOWLEDGE_BASE_LOOKUPS = Counter(
+    "energymind_knowledge_base_lookups_total", "check_in_cache results (exact_hit, semantic_hit, miss)",
+    ["result"]
+)
+KNOWLEDGE_BASE_REFRESHES = Counter(
+    "energymind_knowledge_base_refreshes_total",
+    "Background refreshes of stale knowledge base entries (started, refreshed, not_relevant, skipped_busy, failed)",
+    ["outcome"]
+)
+GATEKEEPER_DECISIONS = Counter(
+    "energymind_gatekeeper_decisions_total", "Gatekeeper verdicts by source (local classifier/memo or llm)",
+    ["source"]
+)
+LLM_HEDGES = Counter(
+    "energymind_llm_hedges_total", "Duplicate LLM calls for slow requests by node and outcome (fired, won, capped)",
+    ["node", "outcome"]
+)
+SPECULATIVE_RUNS = Counter(
+    "energymind_speculative_runs_total", "Research work started alongside the gatekeeper, by mode and outcome (used, wasted)",
+    ["mode", "outcome"]
+)
+REPORT_REVISIONS = Histogram(
+    "energymind_report_revisions", "Writer passes needed per report (revision-loop depth)",
+    buckets=(1, 2, 3, 4, 5)
+)
+
+def timed_node(name: str):
+    """Records the duration of a graph node under NODE_DURATION{node=name}."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(state, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(state, *args, **kwargs)
+            finally:
+                NODE_DURATION.labels(node=name).observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def record_token_usage(node: str, model: str, message):
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        LLM_TOKENS.labels(node=node, model=model, kind="prompt").inc(usage.get("input_tokens", 0))
+        LLM_TOKENS.labels(node=node, model=model, kind="completion").inc(usage.get("output_tokens", 0))
+
+def render_metrics() -> bytes:
+    """Prometheus text exposition, merged across worker processes in multiprocess mode."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
@@ -0,0 +1,274 @@
+import os
+import json
+import math
+import time
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from .database import SessionLocal, RateLimitCounter
+
+# "sql" shares counters through the primary database (all gunicorn workers),
+# "redis" uses REDIS_URL, "memory" keeps them per process (local stand-in / tests)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sql").lower()
+REDIS_URL = os.getenv("REDIS_URL")
+# Sweep expired counters every N increments instead of on each one
+PRUNE_EVERY = 200
+
+# route -> scope -> "limit/window_seconds". Scopes: "global" (everyone together),
+# "ip" (per client IP, signed in or not) and "user" (per signed-in user).
+# Override with RATE_LIMITS='{"research": {"user": "20/60"}}'.
+DEFAULT_LIMITS = {
+    "research": {"global": "25/60", "ip": "10/60", "user": "10/60"},
+    "research_jobs": {"global": "25/60", "ip": "10/60", "user": "10/60"},
+}
+
+def parse_limit(spec: str):
+    limit, window = spec.split("/")
+    return int(limit), int(window)
+
+def load_limits() -> dict:
+    limits = {route: dict(scopes) for route, scopes in DEFAULT_LIMITS.items()}
+    try:
+        for route, scopes in json.loads(os.getenv("RATE_LIMITS", "{}")).items():
+            limits.setdefault(route, {}).update(scopes)
+    except ValueError as e:
+        print(f"WARNING: Ignoring invalid RATE_LIMITS ({e})")
+    return {route: {scope: parse_limit(spec) for scope, spec in scopes.items()} for route, scopes in limits.items()}
+
+class RateLimitExceeded(Exception):
+    def __init__(self, route: str, scope: str, limit: int, window: int, retry_after: int):
+        super().__init__(f"{route} limit for {scope} reached ({limit} per {window}s)")
+        self.route = route
+        self.scope = scope
+        self.limit = limit
+        self.window = window
+        self.retry_after = retry_after
+
+# =========================
+# Counter stores
+# =========================
+class MemoryStore:
+    """Per-process counters with expiry; a stand-in for the shared stores."""
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._ops = 0
+
+    def get_many(self, keys: list) -> dict:
+        now = time.time()
+        with self._lock:
+            return {k: v[0] for k in keys if (v := self._counts.get(k)) and v[1] > now}
+
+    def incr(self, key: str, ttl: int) -> int:
+        """Adds one to `key` and returns the new count."""
+        now = time.time()
+        with self._lock:
+            count, expires_at = self._counts.get(key, (0, 0))
+            count = count + 1 if expires_at > now else 1
+            self._counts[key] = (count, now + ttl)
+            self._ops += 1
+            if self._ops % PRUNE_EVERY == 0:
+                for k in [k for k, (_, exp) in self._counts.items() if exp <= now]:
+                    del self._counts[k]
+            return count
+
+    def decr(self, key: str):
+        with self._lock:
+            if key in self._counts:
+                count, expires_at = self._counts[key]
+                self._counts[key] = (max(0, count - 1), expires_at)
+
+    def __len__(self):
+        return len(self._counts)
+
+class SQLStore:
+    """Counters in the rate_limit_counters table, shared by every worker using the same database."""
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._ops = 0
+
+    def get_many(self, keys: list) -> dict:
+        db = self.session_factory()
+        try:
+            rows = db.query(RateLimitCounter).filter(
+                RateLimitCounter.key.in_(keys),
+                RateLimitCounter.expires_at > datetime.utcnow()
+            ).all()
+            return {row.key: row.count for row in rows}
+        finally:
+            db.close()
+
+    def incr(self, key: str, ttl: int) -> int:
+        """Adds one to `key` and returns the new count, in a single UPDATE ... RETURNING."""
+        db = self.session_factory()
+        try:
+            expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+            count = None
+            for _ in range(2):
+                count = db.execute(
+                    update(RateLimitCounter)
+                    .where(RateLimitCounter.key == key)
+                    .values(count=RateLimitCounter.count + 1, expires_at=expires_at)
+                    .returning(RateLimitCounter.count)
+                ).scalar()
+                if count is None:
+                    db.add(RateLimitCounter(key=key, count=1, expires_at=expires_at))
+                    count = 1
+                try:
+                    db.commit()
+                    break
+                except IntegrityError:
+                    # Another worker created the row first; increment it instead
+                    db.rollback()
+            self._ops += 1
+            if self._ops % PRUNE_EVERY == 0:
+                db.query(RateLimitCounter).filter(RateLimitCounter.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+                db.commit()
+            return count
+        finally:
+            db.close()
+
+    def decr(self, key: str):
+        db = self.session_factory()
+        try:
+            db.query(RateLimitCounter).filter(RateLimitCounter.key == key, RateLimitCounter.count > 0).update(
+                {RateLimitCounter.count: RateLimitCounter.count - 1}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+class RedisStore:
+    """Counters in Redis (INCR + EXPIRE), for deployments that already run one."""
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get_many(self, keys: list) -> dict:
+        return {k: int(v) for k, v in zip(keys, self.client.mget(keys)) if v is not None}
+
+    def incr(self, key: str, ttl: int) -> int:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.incr(key)
+        pipe.expire(key, ttl)
+        return int(pipe.execute()[0])
+
+    def decr(self, key: str):
+        self.client.decr(key)
+
+def create_store():
+    if RATE_LIMIT_BACKEND == "redis" and REDIS_URL:
+        try:
+            return RedisStore(REDIS_URL)
+        except ImportError:
+            print("WARNING: RATE_LIMIT_BACKEND=redis but the redis package is not installed; using the database")
+    if RATE_LIMIT_BACKEND == "memory":
+        return MemoryStore()
+    return SQLStore()
+
+# =========================
+# Limiter
+# =========================
+class RateLimiter:
+    """
+    Sliding-window counters: each window keeps one counter and the request
+    rate is estimated from the current and previous window, weighted by how
+    far into the current window we are. Checking and recording are O(1) per
+    scope, and counters expire on their own after two windows.
+
+    `check` is a cheap read-only pre-check; `hit` is the authoritative one:
+    it increments first and judges the count the store handed back, so two
+    workers racing for the last slot cannot both get it.
+    """
+    def __init__(self, store=None, limits=None):
+        self.store = store if store is not None else create_store()
+        self.limits = limits if limits is not None else load_limits()
+        self.allowed = 0
+        self.rejected = {}
+        self.store_errors = 0
+
+    def _keys(self, route: str, scope: str, identity: str, window: int, now: float):
+        index = int(now // window)
+        prefix = f"{route}:{scope}:{identity}"
+        return f"{prefix}:{index}", f"{prefix}:{index - 1}", (now % window) / window
+
+    @staticmethod
+    def retry_after(limit: int, window: int, current: int, previous: int, elapsed: float) -> int:
+        """Seconds until the estimated rate drops below `limit` again."""
+        if current >= limit:
+            # Wait for the window to roll, then for the carried-over weight to decay
+            wait = window * (1 - elapsed) + window * max(0.0, 1 - limit / current)
+        elif previous:
+            wait = window * (1 - (limit - current) / previous) - window * elapsed
+        else:
+            wait = 1
+        return max(1, math.ceil(round(wait, 3)))
+
+    def check(self, route: str, identities: dict):
+        """
+        Raises RateLimitExceeded if any scope of `route` is at its limit.
+        `identities` maps scope -> identity, e.g. {"global": "all", "ip": "1.2.3.4"}.
+        """
+        now = time.time()
+        scopes = [(scope, identity, *self.limits[route][scope])
+                  for scope, identity in identities.items() if scope in self.limits.get(route, {})]
+        keys = {scope: self._keys(route, scope, identity, window, now) for scope, identity, _, window in scopes}
+        try:
+            counts = self.store.get_many([k for current, previous, _ in keys.values() for k in (current, previous)])
+        except Exception as e:
+            # Never turn users away because the counter store is down
+            self.store_errors += 1
+            print(f"WARNING: Rate limiter store unavailable, allowing request: {e}")
+            return
+
+        for scope, identity, limit, window in scopes:
+            current_key, previous_key, elapsed = keys[scope]
+            current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+            if previous * (1 - elapsed) + current >= limit:
+                self.rejected[f"{route}:{scope}"] = self.rejected.get(f"{route}:{scope}", 0) + 1
+                raise RateLimitExceeded(route, scope, limit, window, self.retry_after(limit, window, current, previous, elapsed))
+        self.allowed += 1
+
+    def hit(self, route: str, identities: dict):
+        """
+        Counts one request against every scope of `route`, atomically with the
+        limit check: if the new count puts any scope over its limit the
+        increments are taken back and RateLimitExceeded is raised.
+        """
+        now = time.time()
+        scopes = [(scope, identity, *self.limits[route][scope])
+                  for scope, identity in identities.items() if scope in self.limits.get(route, {})]
+        counted = []
+        try:
+            for scope, identity, limit, window in scopes:
+                current_key, previous_key, elapsed = self._keys(route, scope, identity, window, now)
+                current = self.store.incr(current_key, ttl=2 * window)
+                counted.append(current_key)
+                previous = self.store.get_many([previous_key]).get(previous_key, 0)
+                # `current` includes this request, so the rate before it is current - 1
+                if previous * (1 - elapsed) + current - 1 >= limit:
+                    for key in counted:
+                        self.store.decr(key)
+                    self.rejected[f"{route}:{scope}"] = self.rejected.get(f"{route}:{scope}", 0) + 1
+                    raise RateLimitExceeded(route, scope, limit, window,
+                                            self.retry_after(limit, window, current - 1, previous, elapsed))
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            self.store_errors += 1
+            print(f"WARNING: Rate limiter store unavailable, request not counted: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.store).__name__,
+            "limits": {route: {scope: f"{limit}/{window}" for scope, (limit, window) in scopes.items()}
+                       for route, scopes in self.limits.items()},
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "store_errors": self.store_errors,
+        }
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,97 @@
+import os
+import re
+
+# "full": fail fast and skip the LLM reviewer on clear passes
+# "fail_only": fail fast, but always let the LLM reviewer judge the rest
+# "off": every report goes to the LLM reviewer
+REVIEW_GATE_MODE = os.getenv("REVIEW_GATE_MODE", "full").lower()
+
+# Below these the report fails without an LLM review
+MIN_WORDS = int(os.getenv("REVIEW_MIN_WORDS", "1200"))
+MIN_FACT_DENSITY = float(os.getenv("REVIEW_MIN_FACT_DENSITY", "5"))
+# At or above these (with every section present) the report passes without an LLM review
+PASS_WORDS = int(os.getenv("REVIEW_PASS_WORDS", "2000"))
+PASS_FACT_DENSITY = float(os.getenv("REVIEW_PASS_FACT_DENSITY", "12"))
+
+# The nine sections writing_prompt asks for, with heading patterns that identify them
+REPORT_SECTIONS = [
+    ("Executive Summary", "3-4 dense paragraphs with summary of findings",
+     [r"executive summary", r"\bsummary\b"]),
+    ("Technical Deep-Dive", "In-depth explanation of how the energy technology/topic works",
+     [r"technical", r"technology"]),
+    ("Global Market Landscapes & Regional Comparisons", "Detailed comparison of US, EU, China, etc.",
+     [r"market", r"regional", r"landscape"]),
+    ("Policy & Regulatory Environment", "Analysis of specific government subsidies, laws, and regulatory impacts",
+     [r"polic", r"regulat"]),
+    ("Case Studies & Real-world Implementations", "Detailed examples of notable projects",
+     [r"case stud", r"implementation"]),
+    ("Strategic SWOT Analysis", "Deep analysis of Strengths, Weaknesses, Opportunities, and Threats",
+     [r"\bswot\b"]),
+    ("Financial Outlook & Investment ROI Analysis", "Financial performance, LCOE data, and future market predictions",
+     [r"financ", r"invest", r"\broi\b"]),
+    ("Strategic Future Outlook", "Year-by-year projections for the next decade",
+     [r"future", r"projection", r"roadmap"]),
+    ("Sources & Bibliography", "Citations from research",
+     [r"source", r"bibliograph", r"reference", r"citation"]),
+]
+
+_HEADING = re.compile(r"^\s*(?:#{1,6}\s+(?P<md>.+?)|(?:\d+[.)]\s*)?\*\*(?P<bold>[^*]+?)\*\*:?)\s*$")
+_NUMBER = re.compile(r"(?<![\w.])[$€£₹]?\d[\d,]*(?:\.\d+)?\s?(?:%|x\b)?")
+_LIST_MARKER = re.compile(r"^\s*\d+[.)]\s")
+
+review_gate_stats = {"rule_fail": 0, "rule_pass": 0, "llm_review": 0}
+
+def extract_headings(report: str) -> list:
+    """Markdown headings plus standalone bold lines such as "1. **Executive Summary**"."""
+    headings = []
+    for line in report.splitlines():
+        match = _HEADING.match(line)
+        if match:
+            headings.append((match.group("md") or match.group("bold")).strip().lower())
+    return headings
+
+def find_missing_sections(report: str) -> list:
+    headings = extract_headings(report)
+    missing = []
+    for title, _, patterns in REPORT_SECTIONS:
+        if not any(re.search(p, h) for h in headings for p in patterns):
+            missing.append(title)
+    return missing
+
+def fact_density(report: str, words: int) -> float:
+    """Numeric facts (figures, percentages, years, prices) per 1000 words, ignoring list numbering."""
+    text = "\n".join(_LIST_MARKER.sub("", line) for line in report.splitlines())
+    return 1000 * len(_NUMBER.findall(text)) / words if words else 0.0
+
+def check_report(report: str) -> dict:
+    """
+    Cheap structural review of a writer draft.
+    Returns {"verdict": "FAIL" | "PASS" | "REVIEW", "feedback": str, ...metrics}.
+    "REVIEW" means the rules are not conclusive and the LLM reviewer should decide.
+    """
+    words = len(report.split())
+    missing = find_missing_sections(report)
+    density = fact_density(report, words)
+
+    problems = []
+    if missing:
+        problems.append(f"Missing required sections: {', '.join(missing)}.")
+    if words < MIN_WORDS:
+        problems.append(f"Report is only {words} words; expand every section to reach at least 2000-3000 words.")
+    if density < MIN_FACT_DENSITY:
+        problems.append(f"Too few specific figures ({density:.1f} per 1000 words); add data, percentages, costs, capacities and dates.")
+
+    if problems:
+        verdict = "FAIL"
+    elif words >= PASS_WORDS and density >= PASS_FACT_DENSITY:
+        verdict = "PASS"
+    else:
+        verdict = "REVIEW"
+
+    return {
+        "verdict": verdict,
+        "feedback": " ".join(problems) if problems else "PASS",
+        "words": words,
+        "fact_density": round(density, 1),
+        "missing_sections": missing,
+    }
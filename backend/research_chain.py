@@ -1,17 +1,32 @@
 import os
-from typing import TypedDict, List, Annotated
+import re
+import json
+import hashlib
+import time
+from collections import deque
+from typing import TypedDict, List, Annotated, Optional
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 from langchain_tavily import TavilySearch
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 import asyncio
 import random
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from groq import InternalServerError, RateLimitError
+from concurrent.futures import ThreadPoolExecutor
+from groq import RateLimitError
 
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables import RunnableConfig
+
+from .search_cache import search_cache
+from .checkpointer import BoundedCheckpointSaver, new_anonymous_thread_id
+from .admission import admission, NODE_PRIORITY
+from .groq_pool import groq_pool
+from .domain_classifier import domain_classifier, REFUSAL_MESSAGE
+from .llm_cache import llm_cache, response_key
+from .hedging import hedge_policy, first_success
+from .retry_policy import retry_policy
+from . import metrics
+from .search_compaction import compact_search_results, count_tokens, extract_documents, canonical_url, RESEARCH_CONTEXT_TOKENS
+from .report_quality import REPORT_SECTIONS, check_report, review_gate_stats, REVIEW_GATE_MODE
 
 
 load_dotenv()
@@ -28,55 +43,400 @@ for var_name in ["GROQ_API_KEYS", "GROQ_API_KEY"]:
         raw_keys.extend([k.strip() for k in val.split(",") if k.strip()])
 GROQ_KEYS = list(dict.fromkeys(raw_keys))
 
-# Global Semaphore to limit concurrent AI calls (Queuing)
-AI_SEMAPHORE = asyncio.Semaphore(5)
+# How long a key rests after a 429 that carries no reset/Retry-After hint
+DEFAULT_KEY_COOLDOWN = float(os.getenv("GROQ_KEY_COOLDOWN_SECONDS", "20"))
+# Treat a key as exhausted once its per-minute token budget drops below this
+MIN_REMAINING_TOKENS = int(os.getenv("GROQ_MIN_REMAINING_TOKENS", "1000"))
+# Longest we park a request waiting for a cooled-down key before trying anyway
+MAX_KEY_WAIT = float(os.getenv("GROQ_MAX_KEY_WAIT_SECONDS", "30"))
+
+# Large model for research, analysis and writing; small fast model for short classification-style replies
+LARGE_MODEL = os.getenv("GROQ_LARGE_MODEL", "llama-3.3-70b-versatile")
+FAST_MODEL = os.getenv("GROQ_FAST_MODEL", "llama-3.1-8b-instant")
+
+# Per-node model and generation limits. Override single fields with
+# NODE_MODEL_CONFIG='{"reviewer": {"model": "llama-3.3-70b-versatile"}}'.
+NODE_MODEL_CONFIG = {
+    "gatekeeper": {"model": FAST_MODEL, "max_tokens": 8, "temperature": 0.0},      # "YES" / "NO"
+    "reviewer": {"model": FAST_MODEL, "max_tokens": 512, "temperature": 0.0},      # "PASS" or "FAIL: <feedback>"
+    "suggester": {"model": FAST_MODEL, "max_tokens": 256, "temperature": 0.7},     # three questions
+    "backfill": {"model": FAST_MODEL, "max_tokens": 256, "temperature": 0.7},
+    "researcher": {"model": LARGE_MODEL, "max_tokens": 4096, "temperature": 0.3},
+    "analyst": {"model": LARGE_MODEL, "max_tokens": 4096, "temperature": 0.3},
+    "writer": {"model": LARGE_MODEL, "max_tokens": 4096, "temperature": 0.5},
+}
+DEFAULT_MODEL_CONFIG = {"model": LARGE_MODEL, "max_tokens": 4096, "temperature": 0.5}
+
+try:
+    for _node, _overrides in json.loads(os.getenv("NODE_MODEL_CONFIG", "{}")).items():
+        NODE_MODEL_CONFIG[_node] = {**NODE_MODEL_CONFIG.get(_node, DEFAULT_MODEL_CONFIG), **_overrides}
+except (ValueError, AttributeError) as e:
+    print(f"WARNING: Ignoring invalid NODE_MODEL_CONFIG ({e})")
+
+def model_config(node=None) -> dict:
+    return NODE_MODEL_CONFIG.get(node, DEFAULT_MODEL_CONFIG)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+def parse_reset_duration(value) -> Optional[float]:
+    """Parses Groq reset headers ("2m59.56s", "7.66s", "120ms") and Retry-After ("12") into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+def _header_int(headers, name):
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+def mask_key(key: str) -> str:
+    return f"...{key[-6:]}" if key else "none"
+
+class NoAPIKeyError(ValueError):
+    """No Groq key is configured. A ValueError, so the retry policy fails it at once."""
+    def __init__(self):
+        super().__init__("No Groq API key configured: set GROQ_API_KEYS (comma-separated) or GROQ_API_KEY")
 
 class APIKeyManager:
+    """
+    Health-aware Groq key scheduler.
+    Tracks each key's remaining request/token budget from Groq's rate-limit
+    headers, parks keys that hit a 429 until their reset time and hands out
+    the least-loaded healthy key. Groq limits are per model, so budgets and
+    cooldowns are kept per (key, model); `model=None` asks about a key as a
+    whole, which is usable while any of its models is.
+    """
     def __init__(self, keys):
         self.keys = keys
         self.index = 0
+        self.peak_rpm = 0
+        self.state = {key: {
+            "in_flight": 0,
+            "requests": 0,
+            "rate_limited": 0,
+            "failures": 0,
+            "last_used": 0.0,
+            "recent": deque(),
+        } for key in keys}
+        # (key, model) -> budget and cooldown from that model's rate-limit headers
+        self.budgets = {}
+
+    def _budget(self, key, model):
+        return self.budgets.setdefault((key, model), {
+            "limit_requests": None,
+            "remaining_requests": None,
+            "limit_tokens": None,
+            "remaining_tokens": None,
+            "cooldown_until": 0.0,
+        })
+
+    def _cooldown_until(self, key, model=None):
+        if model is not None:
+            budget = self.budgets.get((key, model))
+            return budget["cooldown_until"] if budget else 0.0
+        return min((b["cooldown_until"] for (k, _), b in self.budgets.items() if k == key), default=0.0)
 
-    def get_key(self):
+    def _is_healthy(self, key, now, model=None):
+        return self._cooldown_until(key, model) <= now
+
+    def _load(self, key, model=None):
+        """Lower is better: in-flight calls first, then how much of the model's budget is used up."""
+        s = self.state[key]
+        b = self.budgets.get((key, model), {})
+        used = 0.0
+        for remaining, limit in ((b.get("remaining_requests"), b.get("limit_requests")), (b.get("remaining_tokens"), b.get("limit_tokens"))):
+            if remaining is not None and limit:
+                used = max(used, 1 - remaining / limit)
+        return (s["in_flight"], used, s["last_used"])
+
+    def get_key(self, exclude=(), model=None):
         if not self.keys:
             return None
-        # Round-robin selection
-        key = self.keys[self.index]
-        self.index = (self.index + 1) % len(self.keys)
+        now = time.monotonic()
+        candidates = [k for k in self.keys if k not in exclude] or list(self.keys)
+        healthy = [k for k in candidates if self._is_healthy(k, now, model)]
+        if healthy:
+            key = min(healthy, key=lambda k: self._load(k, model))
+        else:
+            # Everything is cooling down: use the key that recovers first
+            key = min(candidates, key=lambda k: self._cooldown_until(k, model))
+        self.state[key]["last_used"] = now
         return key
 
+    def healthy_count(self, model=None) -> int:
+        now = time.monotonic()
+        return sum(1 for k in self.keys if self._is_healthy(k, now, model))
+
+    def cooldown_remaining(self, model=None) -> float:
+        """Seconds until at least one key is healthy again (0 if one is healthy now)."""
+        if not self.keys:
+            return 0.0
+        now = time.monotonic()
+        return max(0.0, min(self._cooldown_until(k, model) for k in self.keys) - now)
+
+    def begin(self, key):
+        s = self.state.get(key)
+        if s is None:
+            return
+        now = time.monotonic()
+        s["in_flight"] += 1
+        s["requests"] += 1
+        s["recent"].append(now)
+        self._trim(s, now)
+        self.peak_rpm = max(self.peak_rpm, sum(len(v["recent"]) for v in self.state.values()))
+
+    def end(self, key, failed=False):
+        s = self.state.get(key)
+        if s is None:
+            return
+        s["in_flight"] = max(0, s["in_flight"] - 1)
+        if failed:
+            s["failures"] += 1
+
+    def _trim(self, s, now):
+        while s["recent"] and now - s["recent"][0] > 60:
+            s["recent"].popleft()
+
+    def _cooldown(self, key, model, seconds):
+        b = self._budget(key, model)
+        b["cooldown_until"] = max(b["cooldown_until"], time.monotonic() + seconds)
+        print(f"DEBUG: Groq key {mask_key(key)} cooling down for {seconds:.1f}s" + (f" on {model}" if model else ""))
+
+    def record_headers(self, key, headers, model=None):
+        """Updates a key's budget for `model` from x-ratelimit-* response headers."""
+        if key not in self.state:
+            return
+        b = self._budget(key, model)
+        for field in ("limit_requests", "remaining_requests", "limit_tokens", "remaining_tokens"):
+            value = _header_int(headers, "x-ratelimit-" + field.replace("_", "-"))
+            if value is not None:
+                b[field] = value
+        if b["remaining_requests"] == 0:
+            self._cooldown(key, model, parse_reset_duration(headers.get("x-ratelimit-reset-requests")) or DEFAULT_KEY_COOLDOWN)
+        if b["remaining_tokens"] is not None and b["remaining_tokens"] <= MIN_REMAINING_TOKENS:
+            self._cooldown(key, model, parse_reset_duration(headers.get("x-ratelimit-reset-tokens")) or DEFAULT_KEY_COOLDOWN)
+
+    def record_rate_limit(self, key, headers=None, model=None):
+        """Puts a key on cooldown for `model` after a 429, honouring Retry-After / reset headers."""
+        s = self.state.get(key)
+        if s is None:
+            return
+        s["rate_limited"] += 1
+        headers = headers or {}
+        wait = (parse_reset_duration(headers.get("retry-after"))
+                or parse_reset_duration(headers.get("x-ratelimit-reset-tokens"))
+                or parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+                or DEFAULT_KEY_COOLDOWN)
+        self._cooldown(key, model, wait)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        keys = []
+        for key in self.keys:
+            s = self.state[key]
+            self._trim(s, now)
+            keys.append({
+                "key": mask_key(key),
+                "healthy": self._is_healthy(key, now),
+                "cooldown_seconds": round(max(0.0, self._cooldown_until(key) - now), 1),
+                "models": {
+                    model or "unknown": {
+                        "healthy": b["cooldown_until"] <= now,
+                        "cooldown_seconds": round(max(0.0, b["cooldown_until"] - now), 1),
+                        "limit_requests": b["limit_requests"],
+                        "remaining_requests": b["remaining_requests"],
+                        "limit_tokens": b["limit_tokens"],
+                        "remaining_tokens": b["remaining_tokens"],
+                    }
+                    for (k, model), b in self.budgets.items() if k == key
+                },
+                "in_flight": s["in_flight"],
+                "requests": s["requests"],
+                "requests_last_minute": len(s["recent"]),
+                "rate_limited": s["rate_limited"],
+                "failures": s["failures"],
+            })
+        return {
+            "total_keys": len(self.keys),
+            "healthy_keys": sum(1 for k in keys if k["healthy"]),
+            "requests_last_minute": sum(k["requests_last_minute"] for k in keys),
+            "peak_rpm": self.peak_rpm,
+            "keys": keys,
+        }
+
 key_manager = APIKeyManager(GROQ_KEYS)
 
-def get_chat_model(key=None):
-    """Creates an LLM instance with a specific key or a fresh one from manager."""
-    return ChatGroq(
-        model="llama-3.3-70b-versatile", # Updated to the latest supported model
-        temperature=0.5,
-        max_tokens=4096,
-        groq_api_key=key if key else key_manager.get_key()
-    )
+# LLM capacity grows and shrinks with the number of keys not cooling down
+admission.healthy_keys = key_manager.healthy_count
 
-@retry(
-    stop=stop_after_attempt(5), # More attempts for multiple keys
-    wait=wait_exponential(multiplier=1, min=2, max=10),
-    retry=retry_if_exception_type((RateLimitError, InternalServerError, Exception))
-)
-async def invoke_chain_with_retry(prompt, inputs):
+def _request_model(request):
+    """The model a Groq chat request was sent for (its rate-limit headers are that model's)."""
+    try:
+        return json.loads(request.content).get("model")
+    except Exception:
+        return None
+
+async def _track_groq_response(response):
+    """httpx response hook: feeds Groq's rate-limit headers back into the key manager."""
+    auth = response.request.headers.get("authorization", "")
+    key = auth[len("Bearer "):] if auth.startswith("Bearer ") else None
+    if not key:
+        return
+    # 429s are recorded by invoke_chain_with_retry from the RateLimitError itself
+    if response.status_code != 429:
+        key_manager.record_headers(key, response.headers, model=_request_model(response.request))
+
+groq_pool.response_hooks.append(_track_groq_response)
+
+def get_chat_model(key=None, node=None):
     """
-    Builds and invokes a chain with a fresh LLM key on each retry.
+    Returns the pooled LLM client for a specific key (or the healthiest one
+    from the manager), set up with the model and limits configured for `node`.
     """
-    async with AI_SEMAPHORE:
-        current_key = key_manager.get_key()
-        print(f"DEBUG: Using Groq Key ending in ...{current_key[-6:]}")
-        
-        # Build the chain fresh with the new key
-        llm = get_chat_model(current_key)
-        chain = prompt | llm | StrOutputParser()
-        
+    config = model_config(node)
+    return groq_pool.chat_model(key if key else key_manager.get_key(model=config["model"]), **config)
+
+def _count_llm_failure(node, reason, decision, seconds_lost):
+    metrics.LLM_RETRIES.labels(node=node, reason=reason, decision=decision).inc()
+    metrics.LLM_RETRY_SECONDS.labels(node=node, reason=reason).inc(seconds_lost)
+
+retry_policy.on_failure = _count_llm_failure
+
+async def _invoke_chain(prompt, inputs, tags=None, node=None):
+    """
+    One attempt at an LLM call: builds and invokes a chain with the healthiest available key.
+    `tags` are attached to the run so streaming consumers can tell calls apart.
+    `node` picks the model and limits (NODE_MODEL_CONFIG) and the admission
+    priority class (admission.NODE_PRIORITY).
+    """
+    # If every key is cooling down for this model, wait for the first one to recover instead of burning an attempt
+    model = model_config(node)["model"]
+    wait = key_manager.cooldown_remaining(model)
+    if wait > 0:
+        print(f"DEBUG: All Groq keys cooling down for {model}, waiting {min(wait, MAX_KEY_WAIT):.1f}s")
+        await asyncio.sleep(min(wait, MAX_KEY_WAIT))
+
+    async with admission.slot(NODE_PRIORITY.get(node, "standard")):
+        current_key = key_manager.get_key(model=model)
+        if not current_key:
+            raise NoAPIKeyError()
+        print(f"DEBUG: Using Groq Key ending in {mask_key(current_key)}")
+        hedge_policy.record_call()
+        started = time.perf_counter()
+        primary = asyncio.create_task(_call_groq(prompt, inputs, current_key, tags=tags, node=node))
         try:
-            return await chain.ainvoke(inputs)
-        except Exception as e:
-            print(f"DEBUG: Groq call failed with key ...{current_key[-6:]}: {str(e)}")
-            raise e
+            content = await _await_with_hedge(primary, prompt, inputs, current_key, tags=tags, node=node)
+        finally:
+            if not primary.done():
+                primary.cancel()
+        hedge_policy.record_latency(node, time.perf_counter() - started)
+        return content
+
+async def _await_with_hedge(primary, prompt, inputs, current_key, tags=None, node=None):
+    """
+    Waits for `primary`. If it outlasts the node's hedge delay (see hedging.py),
+    the same call also goes out on another healthy key; the first to succeed
+    wins and the other is cancelled.
+    """
+    delay = hedge_policy.delay(node)
+    if delay is None:
+        return await primary
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+    # Only on spare capacity: a hedge never queues or takes a slot from a waiting call
+    model = model_config(node)["model"]
+    if key_manager.healthy_count(model) < 2 or not hedge_policy.allow(node) or not admission.try_acquire():
+        metrics.LLM_HEDGES.labels(node=node or "other", outcome="capped").inc()
+        return await primary
+
+    hedge_key = key_manager.get_key(exclude=(current_key,), model=model)
+    print(f"DEBUG: {node} call on {mask_key(current_key)} past {delay:.1f}s, hedging on {mask_key(hedge_key)}")
+    hedge_policy.record_hedge(node)
+    metrics.LLM_HEDGES.labels(node=node or "other", outcome="fired").inc()
+    hedge_started = time.monotonic()
+    hedge = asyncio.create_task(_call_groq(prompt, inputs, hedge_key, tags=tags, node=node))
+    try:
+        winner, content = await first_success(primary, hedge)
+    finally:
+        if not hedge.done():
+            hedge.cancel()
+        admission.release(time.monotonic() - hedge_started)
+    if winner is hedge:
+        hedge_policy.record_win(node)
+        metrics.LLM_HEDGES.labels(node=node or "other", outcome="won").inc()
+    return content
+
+async def _call_groq(prompt, inputs, key, tags=None, node=None):
+    """One Groq call on `key`, with key bookkeeping and call metrics."""
+    # Chain on the pooled client for this key
+    # (no output parser: the raw message carries token usage for metrics)
+    llm = get_chat_model(key, node=node)
+    chain = prompt | llm
+    if tags:
+        chain = chain.with_config(tags=tags)
+
+    label = node or "other"
+    model = model_config(node)["model"]
+    key_manager.begin(key)
+    started = time.perf_counter()
+    try:
+        message = await chain.ainvoke(inputs)
+    except asyncio.CancelledError:
+        # Lost a hedge race (or the request went away): not the key's fault
+        key_manager.end(key)
+        raise
+    except Exception as e:
+        print(f"DEBUG: Groq call failed with key {mask_key(key)}: {str(e)}")
+        if isinstance(e, RateLimitError):
+            key_manager.record_rate_limit(key, e.response.headers, model=model)
+            metrics.LLM_RATE_LIMITS.labels(key=mask_key(key)).inc()
+        metrics.LLM_CALLS.labels(node=label, outcome="rate_limited" if isinstance(e, RateLimitError) else "error").inc()
+        key_manager.end(key, failed=True)
+        raise e
+    key_manager.end(key)
+    metrics.LLM_CALLS.labels(node=label, outcome="ok").inc()
+    metrics.LLM_CALL_DURATION.labels(node=label, model=model).observe(time.perf_counter() - started)
+    metrics.record_token_usage(label, model, message)
+    return message.content
+
+async def _invoke_chain_retrying(prompt, inputs, tags=None, node=None):
+    """Runs _invoke_chain under the retry policy (see retry_policy.py)."""
+    return await retry_policy.call(
+        lambda: _invoke_chain(prompt, inputs, tags=tags, node=node),
+        node=node,
+        # After a 429 the key manager knows, from Retry-After, when a key is free again
+        rate_limit_wait=lambda: key_manager.cooldown_remaining(model_config(node)["model"]),
+    )
+
+async def invoke_chain_with_retry(prompt, inputs, tags=None, node=None):
+    """
+    Invokes the chain with retries, reusing the response of an identical
+    earlier call (same template, inputs and model settings) unless `node` opts out.
+    """
+    if not llm_cache.enabled_for(node):
+        return await _invoke_chain_retrying(prompt, inputs, tags=tags, node=node)
+
+    key = response_key(prompt, inputs, model_config(node))
+    cached = llm_cache.get(key, node=node)
+    metrics.LLM_CACHE_LOOKUPS.labels(node=node or "other", result="miss" if cached is None else "hit").inc()
+    if cached is not None:
+        print(f"DEBUG: LLM response cache hit for {node or 'other'}")
+        return cached
+
+    result = await _invoke_chain_retrying(prompt, inputs, tags=tags, node=node)
+    llm_cache.set(key, result)
+    return result
 
 # Placeholder for the original llm variable to avoid breaking imports
 llm = get_chat_model()
@@ -86,6 +446,128 @@ llm = get_chat_model()
 # =========================
 search_tool = TavilySearch(max_results=10)
 
+# Searches run in their own small thread pool so a slow Tavily call never blocks the event loop
+SEARCH_MAX_CONCURRENCY = int(os.getenv("SEARCH_MAX_CONCURRENCY", "16"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "20"))
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_CONCURRENCY, thread_name_prefix="web-search")
+
+def _search_blocking(query: str):
+    params = {"max_results": search_tool.max_results}
+    started = time.perf_counter()
+    results = search_cache.get(query, **params)
+    if results is not None:
+        print("--- ⚡ Search cache hit ---")
+        metrics.SEARCH_DURATION.labels(source="cache").observe(time.perf_counter() - started)
+        return results
+
+    started = time.perf_counter()
+    try:
+         results = search_tool.run(query) 
+    except:
+         results = str(search_tool.invoke(query))
+    metrics.SEARCH_DURATION.labels(source="tavily").observe(time.perf_counter() - started)
+
+    # Tavily reports failures as {"error": ...}; never cache those
+    if not (isinstance(results, dict) and "error" in results):
+        search_cache.set(query, results, **params)
+    return results
+
+async def search_web(query: str):
+    """
+    Runs a web search (served from the two-tier search cache when possible)
+    without blocking the event loop. Gives up after SEARCH_TIMEOUT seconds,
+    including time spent queued behind other searches.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(search_executor, _search_blocking, query),
+            timeout=SEARCH_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        print(f"--- ⚠️ Web search timed out after {SEARCH_TIMEOUT}s, continuing without results ---")
+        return {"query": query, "results": []}
+
+# Angle-specific sub-searches covering what research_prompt asks for; "overview" is the plain query
+SEARCH_ANGLES = {
+    "overview": "",
+    "news": "latest news announcements",
+    "technical": "technology how it works",
+    "case_studies": "case study projects",
+    "regional": "US EU China India market",
+    "policy": "policy subsidies regulation",
+    "financial": "LCOE cost investment",
+}
+# Angles actually searched (comma-separated; "overview" alone turns the fan-out off).
+# Each angle is one more Tavily call per uncached run, and a timed-out one keeps its
+# search_executor thread until Tavily answers, so the rest of SEARCH_ANGLES is opt-in.
+SEARCH_FANOUT_ANGLES = [a.strip() for a in os.getenv("SEARCH_FANOUT_ANGLES", "overview,news,financial").split(",") if a.strip() in SEARCH_ANGLES]
+# Sub-searches one run may have in flight at once
+SEARCH_FANOUT_CONCURRENCY = int(os.getenv("SEARCH_FANOUT_CONCURRENCY", "3"))
+# Sub-searches still running after this long are dropped (the first result is always waited for)
+SEARCH_FANOUT_SECONDS = float(os.getenv("SEARCH_FANOUT_SECONDS", "8"))
+
+def merge_search_results(query: str, results_by_angle: dict) -> dict:
+    """
+    Interleaves sub-search results round-robin (so no angle crowds out the
+    others) and drops repeats by canonical URL or identical content.
+    """
+    lists = {angle: extract_documents(results) for angle, results in results_by_angle.items()}
+    merged, seen_urls, seen_content = [], set(), set()
+    for rank in range(max((len(docs) for docs in lists.values()), default=0)):
+        for angle, docs in lists.items():
+            if rank >= len(docs):
+                continue
+            doc = docs[rank]
+            url = canonical_url(doc["url"])
+            digest = hashlib.sha1(" ".join(doc["content"].lower().split()).encode("utf-8")).hexdigest()
+            if (url and url in seen_urls) or digest in seen_content:
+                continue
+            seen_urls.add(url)
+            seen_content.add(digest)
+            merged.append({**doc, "angle": angle})
+    return {"query": query, "results": merged}
+
+async def search_angles(query: str) -> dict:
+    """
+    Runs the SEARCH_FANOUT_ANGLES sub-searches concurrently and merges them.
+    Whatever has not finished SEARCH_FANOUT_SECONDS in is dropped, so the run
+    takes about as long as one search. A failing sub-search is dropped too;
+    only when every angle fails does the error reach the caller.
+    """
+    angles = SEARCH_FANOUT_ANGLES or ["overview"]
+    if angles == ["overview"]:
+        return await search_web(query)
+
+    limit = asyncio.Semaphore(SEARCH_FANOUT_CONCURRENCY)
+
+    async def sub_search(angle: str):
+        async with limit:
+            try:
+                return angle, await search_web(f"{query} {SEARCH_ANGLES[angle]}".strip()), None
+            except Exception as e:
+                print(f"--- ⚠️ '{angle}' sub-search failed, dropping it: {e} ---")
+                return angle, None, e
+
+    tasks = [asyncio.create_task(sub_search(angle)) for angle in angles]
+    done, pending = await asyncio.wait(tasks, timeout=SEARCH_FANOUT_SECONDS)
+    while pending and all(task.result()[2] is not None for task in done):
+        # Nothing usable back yet: wait for the next sub-search (each bounded by SEARCH_TIMEOUT)
+        finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        done |= finished
+    for task in pending:
+        task.cancel()
+    if pending:
+        print(f"--- ⏱️ Dropped {len(pending)} slow sub-search(es) ---")
+
+    finished = sorted((task.result() for task in done), key=lambda item: angles.index(item[0]))
+    results_by_angle = {angle: results for angle, results, error in finished if error is None}
+    if not results_by_angle:
+        raise finished[0][2]
+    merged = merge_search_results(query, results_by_angle)
+    print(f"--- 🔎 {len(done)}/{len(angles)} sub-searches merged into {len(merged['results'])} results ---")
+    return merged
+
 # =========================
 # State Definition
 # =========================
@@ -120,24 +602,41 @@ gatekeeper_prompt = PromptTemplate.from_template(
 
 # We removed the global chain to allow per-call LLM rotation
 
-async def gatekeeper_node(state: AgentState):
+@metrics.timed_node("gatekeeper")
+async def gatekeeper_node(state: AgentState, config: RunnableConfig = None):
     print("--- 🛡️ Node: Gatekeeper ---")
     query = state["query"]
-    
-    try:
-        result = await invoke_chain_with_retry(gatekeeper_prompt, {"query": query})
-        result = result.strip().upper()
-    except Exception as e:
-        print(f"Gatekeeper error: {e}")
-        # Fail open if LLM fails
-        result = "YES"
+
+    # Known and obvious queries are answered locally; only uncertain ones need the LLM
+    local_verdict = None
+    if domain_classifier.mode != "off":
+        local_verdict = await asyncio.to_thread(domain_classifier.classify, query)
+
+    if local_verdict is not None and domain_classifier.mode == "on":
+        print(f"--- ⚡ Gatekeeper answered locally ({'YES' if local_verdict else 'NO'}) ---")
+        metrics.GATEKEEPER_DECISIONS.labels(source="local").inc()
+        result = "YES" if local_verdict else "NO"
+    else:
+        # Most queries are relevant: let the researcher's work start while the LLM decides
+        start_speculation(state, config)
+        try:
+            result = await invoke_chain_with_retry(gatekeeper_prompt, {"query": query}, node="gatekeeper")
+            result = result.strip().upper()
+            metrics.GATEKEEPER_DECISIONS.labels(source="llm").inc()
+            domain_classifier.record_shadow(local_verdict, "YES" in result)
+            await asyncio.to_thread(domain_classifier.record, query, "YES" in result)
+        except Exception as e:
+            print(f"Gatekeeper error: {e}")
+            # Fail open if LLM fails
+            result = "YES"
     
     if "YES" in result:
         print("--- ✅ Query is Relevant ---")
         return {"is_relevant": True}
     else:
         print("--- ⛔ Query is Irrelevant ---")
-        refusal_msg = "I specialize in the Energy industry. Please ask a question related to energy, power, sustainability, or climate technology."
+        discard_speculation(_thread_id(config))
+        refusal_msg = REFUSAL_MESSAGE
         return {
             "is_relevant": False, 
             "report": refusal_msg,
@@ -175,23 +674,106 @@ research_prompt = PromptTemplate.from_template(
 
 # Chain will be built inside the node
 
-async def research_node(state: AgentState):
-    print("--- 🔄 Node: Researcher ---")
-    query = state["query"]
+def compact_for_prompt(query: str, raw_results, history_text: str) -> str:
+    """Fits the search results into what is left of RESEARCH_CONTEXT_TOKENS after the history."""
+    budget = max(RESEARCH_CONTEXT_TOKENS - count_tokens(history_text), RESEARCH_CONTEXT_TOKENS // 4)
+    # Rank passages against the angle terms too, so policy or cost passages are not crowded out by the overview
+    ranking_query = " ".join([query] + [SEARCH_ANGLES[a] for a in SEARCH_FANOUT_ANGLES if SEARCH_ANGLES[a]])
+    compacted = compact_search_results(ranking_query, raw_results, budget)
+    before = count_tokens(str(raw_results))
+    after = count_tokens(compacted)
+    print(f"--- ✂️ Search results compacted: {before} -> {after} tokens (budget {budget}) ---")
+    return compacted
+
+async def gather_research(query: str, history_text: str, summarize: bool = True):
+    """Search, compaction and (optionally) the researcher LLM call. Returns (results, summary)."""
+    raw_results = await search_angles(query)
+    results = await asyncio.to_thread(compact_for_prompt, query, raw_results, history_text)
+    summary = None
+    if summarize:
+        summary = await invoke_chain_with_retry(research_prompt, {
+            "query": query,
+            "search_results": results,
+            "history": history_text
+        }, node="researcher")
+    return results, summary
+
+# =========================
+# Speculative research
+# =========================
+# "off" waits for the gatekeeper verdict; "search" runs the web search alongside the
+# gatekeeper LLM call; "research" also runs the researcher LLM call speculatively
+SPECULATIVE_MODE = os.getenv("SPECULATIVE_MODE", "search").lower()
+
+speculation_stats = {"started": 0, "used": 0, "wasted": 0}
+# thread_id -> (query, task) for work started by the gatekeeper and not yet claimed by the researcher
+speculative_runs = {}
+
+def _thread_id(config):
+    return ((config or {}).get("configurable") or {}).get("thread_id")
+
+def _history_text(state) -> str:
     history = state.get("history", [])
-    
-    history_text = "\n".join(history[-3:]) if history else "No previous context."
-    
+    return "\n".join(history[-3:]) if history else "No previous context."
+
+def start_speculation(state, config):
+    thread_id = _thread_id(config)
+    if SPECULATIVE_MODE not in ("search", "research") or not thread_id:
+        return
+    discard_speculation(thread_id)
+    task = asyncio.create_task(gather_research(state["query"], _history_text(state), summarize=SPECULATIVE_MODE == "research"))
+    speculative_runs[thread_id] = (state["query"], task)
+    speculation_stats["started"] += 1
+
+def _count_speculation(outcome: str):
+    speculation_stats[outcome] += 1
+    metrics.SPECULATIVE_RUNS.labels(mode=SPECULATIVE_MODE, outcome=outcome).inc()
+
+def discard_speculation(thread_id):
+    """Cancels speculative work nobody will use (verdict "NO", or the run failed)."""
+    entry = speculative_runs.pop(thread_id, None)
+    if entry:
+        entry[1].cancel()
+        _count_speculation("wasted")
+        print("--- 🗑️ Speculative research discarded ---")
+
+async def claim_speculation(thread_id, query: str):
+    """The speculative (results, summary) for this run, or None if there is none or it failed."""
+    entry = speculative_runs.pop(thread_id, None)
+    if not entry:
+        return None
+    speculative_query, task = entry
+    if speculative_query != query:
+        task.cancel()
+        _count_speculation("wasted")
+        return None
     try:
-         results = search_tool.run(query) 
-    except:
-         results = str(search_tool.invoke(query))
-    
-    summary = await invoke_chain_with_retry(research_prompt, {
-        "query": query,
-        "search_results": results,
-        "history": history_text
-    })
+        outcome = await task
+    except Exception as e:
+        print(f"--- ⚠️ Speculative research failed ({e}), running it now ---")
+        _count_speculation("wasted")
+        return None
+    _count_speculation("used")
+    return outcome
+
+@metrics.timed_node("researcher")
+async def research_node(state: AgentState, config: RunnableConfig = None):
+    print("--- 🔄 Node: Researcher ---")
+    query = state["query"]
+    history_text = _history_text(state)
+
+    results, summary = await claim_speculation(_thread_id(config), query) or (None, None)
+    if results is None:
+        results, summary = await gather_research(query, history_text)
+    elif summary is None:
+        print("--- ⚡ Using speculative search results ---")
+        summary = await invoke_chain_with_retry(research_prompt, {
+            "query": query,
+            "search_results": results,
+            "history": history_text
+        }, node="researcher")
+    else:
+        print("--- ⚡ Using speculative research summary ---")
     
     return {
         "search_results": results, 
@@ -223,10 +805,11 @@ analysis_prompt = PromptTemplate.from_template(
 
 # Chain will be built in node
 
+@metrics.timed_node("analyst")
 async def analysis_node(state: AgentState):
     print("--- 🔄 Node: Analyst ---")
     research_summary = state["research_check"]
-    analysis = await invoke_chain_with_retry(analysis_prompt, {"research": research_summary})
+    analysis = await invoke_chain_with_retry(analysis_prompt, {"research": research_summary}, node="analyst")
     return {"analysis": analysis}
 
 # =========================
@@ -260,8 +843,69 @@ writing_prompt = PromptTemplate.from_template(
     """
 )
 
-# Chain will be built in node
+# "single": one call writes the whole report
+# "sections": each section is written by its own concurrent call and assembled in order
+WRITER_MODE = os.getenv("WRITER_MODE", "single").lower()
+# Extra attempts for a section that still fails after invoke_chain_with_retry gave up
+SECTION_RETRIES = int(os.getenv("WRITER_SECTION_RETRIES", "1"))
+
+section_writing_prompt = PromptTemplate.from_template(
+    """
+    You are writing ONE section of a HIGH-LEVEL, EXHAUSTIVE, and HIGHLY DETAILED structured energy report.
+    The other sections are being written separately from the same analysis, so do not repeat their content.
+
+    Full report outline:
+    {outline}
+
+    Your section: {number}. **{title}** ({description})
+
+    Analysis:
+    {analysis}
+
+    FEEDBACK FROM PREVIOUS VERSION (If any):
+    {feedback}
+
+    CRITICAL INSTRUCTION:
+    Start with the heading "## {number}. {title}" and write ONLY this section.
+    Write 250-350 words of dense, professional energy insight with specific data, numbers and regional comparisons.
+    If the feedback concerns this section, you MUST address it.
+
+    """
+)
+
+REPORT_OUTLINE = "\n".join(f"{i}. {title}" for i, (title, _, _) in enumerate(REPORT_SECTIONS, start=1))
 
+async def write_section(index: int, analysis_text: str, feedback: str) -> str:
+    title, description, _ = REPORT_SECTIONS[index]
+    return await invoke_chain_with_retry(section_writing_prompt, {
+        "outline": REPORT_OUTLINE,
+        "number": index + 1,
+        "title": title,
+        "description": description,
+        "analysis": analysis_text,
+        "feedback": feedback
+    }, tags=[f"report_section:{index + 1}"], node="writer")
+
+async def write_report_by_sections(analysis_text: str, feedback: str) -> str:
+    """Fans the report out into one call per section; failed sections are retried on their own."""
+    indexes = range(len(REPORT_SECTIONS))
+    results = await asyncio.gather(*(write_section(i, analysis_text, feedback) for i in indexes), return_exceptions=True)
+    sections = dict(zip(indexes, results))
+
+    for attempt in range(SECTION_RETRIES):
+        failed = [i for i, r in sections.items() if isinstance(r, Exception)]
+        if not failed:
+            break
+        print(f"--- 🔁 Retrying {len(failed)} failed section(s) (attempt {attempt + 1}) ---")
+        retried = await asyncio.gather(*(write_section(i, analysis_text, feedback) for i in failed), return_exceptions=True)
+        sections.update(zip(failed, retried))
+
+    for i, result in sections.items():
+        if isinstance(result, Exception):
+            raise result
+    return "\n\n".join(sections[i].strip() for i in indexes)
+
+@metrics.timed_node("writer")
 async def writing_node(state: AgentState):
     print("--- 🔄 Node: Writer ---")
     analysis_text = state["analysis"]
@@ -271,10 +915,13 @@ async def writing_node(state: AgentState):
     if current_rev > 0:
         print(f"--- 📝 Revision #{current_rev} (Feedback: {feedback}) ---")
     
-    report = await invoke_chain_with_retry(writing_prompt, {
-        "analysis": analysis_text,
-        "feedback": feedback
-    })
+    if WRITER_MODE == "sections":
+        report = await write_report_by_sections(analysis_text, feedback)
+    else:
+        report = await invoke_chain_with_retry(writing_prompt, {
+            "analysis": analysis_text,
+            "feedback": feedback
+        }, node="writer")
     
     return {"report": report, "revision_number": current_rev + 1}
 
@@ -304,11 +951,26 @@ reviewer_prompt = PromptTemplate.from_template(
 
 # Chain will be built in node
 
+@metrics.timed_node("reviewer")
 async def reviewer_node(state: AgentState):
     print("--- 🔄 Node: Reviewer ---")
     report_text = state["report"]
+
+    # Cheap structural checks first; only ambiguous drafts need the LLM reviewer
+    if REVIEW_GATE_MODE != "off":
+        check = check_report(report_text)
+        if check["verdict"] == "FAIL":
+            review_gate_stats["rule_fail"] += 1
+            print(f"--- ❌ Review (rules): FAIL (Feedback: {check['feedback']}) ---")
+            return {"reviewer_feedback": check["feedback"]}
+        if check["verdict"] == "PASS" and REVIEW_GATE_MODE == "full":
+            review_gate_stats["rule_pass"] += 1
+            print(f"--- ✅ Review (rules): PASS ({check['words']} words, {check['fact_density']} facts/1k words) ---")
+            return {"reviewer_feedback": "PASS"}
+
+    review_gate_stats["llm_review"] += 1
     try:
-        result = await invoke_chain_with_retry(reviewer_prompt, {"report": report_text})
+        result = await invoke_chain_with_retry(reviewer_prompt, {"report": report_text}, node="reviewer")
     except Exception as e:
         print(f"--- ⚠️ Reviewer Error: {e}. Skipping review. ---")
         return {"reviewer_feedback": "PASS"} 
@@ -334,23 +996,31 @@ suggestions_prompt = PromptTemplate.from_template(
     """
 )
 
+def parse_suggestions(text: str) -> List[str]:
+    return [q.strip() for q in text.strip().split('\n') if q.strip()][:3]
+
+async def generate_suggestions(report_text: str, node: str = "suggester") -> List[str]:
+    result = await invoke_chain_with_retry(suggestions_prompt, {"report": report_text}, node=node)
+    return parse_suggestions(result)
+
 # Chain will be built in node
 
+@metrics.timed_node("suggester")
 async def suggestions_node(state: AgentState):
     print("--- 🔄 Node: Suggestions & History Update ---")
     report_text = state["report"]
     query = state["query"]
     
     # Generate suggestions
-    result = await invoke_chain_with_retry(suggestions_prompt, {"report": report_text})
-    questions = [q.strip() for q in result.strip().split('\n') if q.strip()]
+    questions = await generate_suggestions(report_text)
+    metrics.REPORT_REVISIONS.observe(state.get("revision_number", 0))
     
     # Update History
     current_history = state.get("history", [])
     new_entry = f"User: {query}\nAI Report Summary: {report_text[:200]}..." 
     updated_history = current_history + [new_entry]
     
-    return {"suggestions": questions[:3], "history": updated_history}
+    return {"suggestions": questions, "history": updated_history}
 
 # =========================
 # 🚀 Conditional Logic
@@ -410,8 +1080,8 @@ workflow.add_conditional_edges(
 
 workflow.add_edge("suggester", END)
 
-# Initialize Memory
-memory = MemorySaver()
+# Initialize Memory (database-backed, bounded per thread)
+memory = BoundedCheckpointSaver()
 
 # Compile with Checkpointer
 app = workflow.compile(checkpointer=memory)
@@ -423,17 +1093,105 @@ async def run_full_research(query: str, thread_id: str = None) -> dict:
     """
     Entry point for the backend logic.
     """
+    # Without a thread_id the run gets its own thread, deleted once it finishes
+    anonymous = not thread_id
     config = {
-        "configurable": {"thread_id": thread_id if thread_id else "default_thread"}
+        "configurable": {"thread_id": new_anonymous_thread_id() if anonymous else thread_id}
     }
 
     
     initial_state = {"query": query}
     
-    result = await app.ainvoke(initial_state, config=config)
+    try:
+        result = await app.ainvoke(initial_state, config=config)
+    finally:
+        discard_speculation(config["configurable"]["thread_id"])
+        if anonymous:
+            await memory.adelete_thread(config["configurable"]["thread_id"])
     
     return {
         "report": result.get("report", "No report generated."),
         "suggestions": result.get("suggestions", []),
         "is_relevant": result.get("is_relevant", True)
     }
+
+
+# Human-readable progress labels for each graph node (used by the streaming API)
+NODE_LABELS = {
+    "gatekeeper": "Checking query relevance",
+    "researcher": "Researching the web",
+    "analyst": "Analysing research",
+    "writer": "Writing report",
+    "reviewer": "Reviewing report",
+    "suggester": "Generating follow-up questions",
+}
+
+def _node_finished_message(node: str, state: dict, output: dict) -> str:
+    if node == "gatekeeper":
+        return "Query is energy-related" if output.get("is_relevant") else "Query is not energy-related"
+    if node == "reviewer":
+        if output.get("reviewer_feedback") == "PASS":
+            return "Review PASS"
+        if should_continue({**state, **output}) == "writer":
+            return "Review FAIL, revising"
+        return "Review FAIL, revision limit reached"
+    return f"{NODE_LABELS[node]} done"
+
+async def stream_full_research(query: str, thread_id: str = None):
+    """
+    Streaming counterpart of run_full_research.
+    Yields (event, data) tuples: "progress" for node start/finish, "token" for
+    writer output as it is generated and a final "result" with the same shape
+    as run_full_research.
+    """
+    anonymous = not thread_id
+    config = {
+        "configurable": {"thread_id": new_anonymous_thread_id() if anonymous else thread_id}
+    }
+
+    initial_state = {"query": query}
+
+    try:
+        async for event in app.astream_events(initial_state, config=config, version="v2"):
+            kind = event["event"]
+            name = event.get("name")
+            node = event.get("metadata", {}).get("langgraph_node")
+
+            if kind == "on_chain_start" and name in NODE_LABELS and name == node:
+                data = {"node": name, "status": "started", "message": NODE_LABELS[name]}
+                if name == "writer":
+                    data["revision"] = event["data"].get("input", {}).get("revision_number", 0)
+                yield "progress", data
+            elif kind == "on_chain_end" and name in NODE_LABELS and name == node:
+                state = event["data"].get("input")
+                output = event["data"].get("output")
+                yield "progress", {
+                    "node": name,
+                    "status": "finished",
+                    "message": _node_finished_message(
+                        name,
+                        state if isinstance(state, dict) else {},
+                        output if isinstance(output, dict) else {}
+                    )
+                }
+            elif kind == "on_chat_model_stream" and node == "writer":
+                text = event["data"]["chunk"].content
+                if text:
+                    data = {"text": text}
+                    # In sections mode tokens of different sections interleave; label them
+                    for tag in event.get("tags", []):
+                        if tag.startswith("report_section:"):
+                            data["section"] = int(tag.split(":", 1)[1])
+                    yield "token", data
+
+        result = (await app.aget_state(config)).values
+
+        yield "result", {
+            "report": result.get("report", "No report generated."),
+            "suggestions": result.get("suggestions", []),
+            "is_relevant": result.get("is_relevant", True)
+        }
+    finally:
+        discard_speculation(config["configurable"]["thread_id"])
+        if anonymous:
+            await memory.adelete_thread(config["configurable"]["thread_id"])
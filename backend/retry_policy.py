@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import asyncio
+import httpx
+import groq
+
+# Attempts per LLM call, and the total time (seconds) a call may take across all attempts and waits
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "5"))
+LLM_RETRY_BUDGET_SECONDS = float(os.getenv("LLM_RETRY_BUDGET_SECONDS", "180"))
+# Exponential backoff between retries of transient failures (seconds)
+LLM_BACKOFF_MIN_SECONDS = float(os.getenv("LLM_BACKOFF_MIN_SECONDS", "2"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "10"))
+
+RATE_LIMITED = "rate_limited"
+RETRYABLE = "retryable"
+FATAL = "fatal"
+
+def classify_error(error: BaseException) -> tuple:
+    """
+    Returns (kind, reason) for a failed LLM call. `kind` is rate_limited,
+    retryable or fatal; `reason` is the finer failure class used in telemetry.
+    """
+    if isinstance(error, groq.RateLimitError):
+        return RATE_LIMITED, "rate_limited"
+    if isinstance(error, groq.APIStatusError):
+        status = error.status_code
+        if status == 429:
+            return RATE_LIMITED, "rate_limited"
+        if status >= 500 or status in (408, 409, 425):
+            return RETRYABLE, "server_error"
+        if status == 413 or "context" in str(error).lower():
+            return FATAL, "context_length"
+        if status in (401, 403):
+            return FATAL, "auth"
+        if status == 404:
+            return FATAL, "not_found"
+        return FATAL, "bad_request"
+    if isinstance(error, (groq.APITimeoutError, httpx.TimeoutException, asyncio.TimeoutError)):
+        return RETRYABLE, "timeout"
+    if isinstance(error, (groq.APIConnectionError, httpx.TransportError, ConnectionError)):
+        return RETRYABLE, "connection"
+    # Missing prompt variables, bad settings and similar bugs fail the same way every time
+    if isinstance(error, (KeyError, TypeError, ValueError, NotImplementedError)):
+        return FATAL, "invalid_request"
+    return RETRYABLE, "unknown"
+
+def retry_after(error: BaseException):
+    """Seconds from the Retry-After header of an API error, if it has a numeric one."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+class RetryPolicy:
+    """
+    Retries LLM calls by failure class: permanent errors fail at once,
+    rate limits wait as long as the server (or the key manager) says, other
+    transient errors back off exponentially, and the whole call, attempts and
+    waits included, stays inside a time budget. Time lost to each failure
+    class is counted so the expensive ones show up in /stats and metrics.
+    """
+    def __init__(self, max_attempts: int = LLM_MAX_ATTEMPTS, budget: float = LLM_RETRY_BUDGET_SECONDS,
+                 backoff_min: float = LLM_BACKOFF_MIN_SECONDS, backoff_max: float = LLM_BACKOFF_MAX_SECONDS):
+        self.max_attempts = max_attempts
+        self.budget = budget
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        # reason -> {"failures", "retried", "gave_up", "seconds_lost"}
+        self.reasons = {}
+        # Set by the owner to emit metrics: on_failure(node, reason, decision, seconds_lost)
+        self.on_failure = None
+
+    def backoff(self, attempt: int) -> float:
+        return min(self.backoff_max, self.backoff_min * 2 ** (attempt - 1))
+
+    def _delay(self, kind, error, attempt, rate_limit_wait):
+        if kind == RATE_LIMITED:
+            # The key manager has already put the key on cooldown from Retry-After;
+            # if another key is healthy this is 0 and the retry goes out at once
+            if rate_limit_wait is not None:
+                return rate_limit_wait()
+            wait = retry_after(error)
+            if wait is not None:
+                return wait
+        return self.backoff(attempt)
+
+    def _record(self, node, reason, decision, lost, attempt, error):
+        counts = self.reasons.setdefault(reason, {"failures": 0, "retried": 0, "gave_up": 0, "seconds_lost": 0.0})
+        counts["failures"] += 1
+        counts["retried" if decision == "retried" else "gave_up"] += 1
+        counts["seconds_lost"] += lost
+        print("WARNING: LLM retry " + json.dumps({
+            "node": node or "other", "attempt": attempt, "reason": reason, "decision": decision,
+            "seconds_lost": round(lost, 2), "error": str(error)[:200],
+        }))
+        if self.on_failure:
+            self.on_failure(node or "other", reason, decision, lost)
+
+    async def call(self, attempt_fn, node=None, rate_limit_wait=None):
+        """
+        Runs `attempt_fn()` (a coroutine factory) until it succeeds or the
+        policy gives up, re-raising the last error. `rate_limit_wait` returns
+        the seconds until a key can take the next attempt after a 429.
+        """
+        deadline = time.monotonic() + self.budget
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.monotonic()
+            try:
+                return await asyncio.wait_for(attempt_fn(), timeout=max(0.0, deadline - started))
+            except Exception as e:
+                kind, reason = classify_error(e)
+                lost = time.monotonic() - started
+                if kind == FATAL:
+                    self._record(node, reason, "fatal", lost, attempt, e)
+                    raise
+                if attempt >= self.max_attempts:
+                    self._record(node, reason, "attempts_exhausted", lost, attempt, e)
+                    raise
+                delay = self._delay(kind, e, attempt, rate_limit_wait)
+                if time.monotonic() + delay >= deadline:
+                    self._record(node, reason, "budget_exhausted", lost, attempt, e)
+                    raise
+                self._record(node, reason, "retried", lost + delay, attempt, e)
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "max_attempts": self.max_attempts,
+            "budget_seconds": self.budget,
+            "reasons": {
+                reason: {**counts, "seconds_lost": round(counts["seconds_lost"], 1)}
+                for reason, counts in sorted(self.reasons.items(), key=lambda item: -item[1]["seconds_lost"])
+            },
+        }
+
+retry_policy = RetryPolicy()
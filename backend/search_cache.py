@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta
+
+from .cache import TTLCache
+from .database import SessionLocal, SearchCacheEntry
+from .text_utils import normalize_query
+
+# How long a search result stays fresh (seconds)
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(6 * 3600)))
+# Size bounds for the in-memory tier and the database tier
+SEARCH_CACHE_MEMORY_ENTRIES = int(os.getenv("SEARCH_CACHE_MEMORY_ENTRIES", "256"))
+SEARCH_CACHE_DB_ROWS = int(os.getenv("SEARCH_CACHE_DB_ROWS", "5000"))
+# Prune the database tier every N writes instead of on each one
+PRUNE_EVERY = 50
+
+class SearchCache:
+    """
+    Two-tier cache for web search results.
+    Tier 1 is a per-worker LRU, tier 2 is the search_cache table shared by
+    all workers. Entries are keyed by the normalized query plus search params.
+    """
+    def __init__(self, ttl=SEARCH_CACHE_TTL, memory_entries=SEARCH_CACHE_MEMORY_ENTRIES, db_rows=SEARCH_CACHE_DB_ROWS, session_factory=SessionLocal):
+        self.ttl = ttl
+        self.session_factory = session_factory
+        self.db_rows = db_rows
+        self.memory = TTLCache(max_entries=memory_entries, ttl=ttl)
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @staticmethod
+    def make_key(query: str, params: dict) -> str:
+        payload = json.dumps({"query": normalize_query(query), **params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, query: str, **params):
+        key = self.make_key(query, params)
+        results = self.memory.get(key)
+        if results is not None:
+            self.memory_hits += 1
+            return results
+
+        db = self.session_factory()
+        try:
+            entry = db.query(SearchCacheEntry).filter(SearchCacheEntry.key == key).first()
+            if entry and datetime.utcnow() - entry.created_at < timedelta(seconds=self.ttl):
+                results = json.loads(entry.results)
+                remaining = self.ttl - (datetime.utcnow() - entry.created_at).total_seconds()
+                self.memory.set(key, results, ttl=remaining)
+                self.db_hits += 1
+                return results
+        except Exception as e:
+            print(f"WARNING: Search cache lookup failed: {e}")
+        finally:
+            db.close()
+
+        self.misses += 1
+        return None
+
+    def set(self, query: str, results, **params):
+        key = self.make_key(query, params)
+        self.memory.set(key, results)
+
+        db = self.session_factory()
+        try:
+            db.merge(SearchCacheEntry(
+                key=key,
+                query=query,
+                params=json.dumps(params, sort_keys=True, default=str),
+                results=json.dumps(results, default=str),
+                created_at=datetime.utcnow()
+            ))
+            db.commit()
+            self.writes += 1
+            if self.writes % PRUNE_EVERY == 0:
+                self.prune(db)
+        except Exception as e:
+            db.rollback()
+            print(f"WARNING: Search cache write failed: {e}")
+        finally:
+            db.close()
+
+    def prune(self, db):
+        """Drops expired rows, then the oldest rows beyond the size bound."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        db.query(SearchCacheEntry).filter(SearchCacheEntry.created_at < cutoff).delete(synchronize_session=False)
+        overflow = db.query(SearchCacheEntry.key).order_by(SearchCacheEntry.created_at.desc()).offset(self.db_rows).all()
+        if overflow:
+            db.query(SearchCacheEntry).filter(SearchCacheEntry.key.in_([k for (k,) in overflow])).delete(synchronize_session=False)
+        db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        hits = self.memory_hits + self.db_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory": self.memory.stats(),
+            "ttl_seconds": self.ttl,
+        }
+
+search_cache = SearchCache()
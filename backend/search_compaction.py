@@ -0,0 +1,144 @@
+import os
+import re
+import math
+import hashlib
+from collections import Counter
+from urllib.parse import urlsplit
+
+# Token budget for web results plus conversation history in research_prompt
+RESEARCH_CONTEXT_TOKENS = int(os.getenv("RESEARCH_CONTEXT_TOKENS", "3000"))
+# Passage size used when splitting result content (words)
+PASSAGE_WORDS = int(os.getenv("RESEARCH_PASSAGE_WORDS", "60"))
+# Results whose word shingles overlap this much are treated as copies of each other
+NEAR_DUPLICATE_JACCARD = 0.8
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "is", "are", "was", "were", "be",
+    "what", "how", "why", "which", "who", "does", "do", "with", "about", "by", "as", "at", "it",
+    "its", "this", "that", "from", "has", "have", "will", "can", "their", "than",
+}
+
+_encoder = None
+_encoder_failed = False
+
+def count_tokens(text: str) -> int:
+    """Counts tokens with tiktoken (cl100k_base); falls back to ~4 chars/token if the encoding can't be loaded."""
+    global _encoder, _encoder_failed
+    if _encoder is None and not _encoder_failed:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            _encoder_failed = True
+            print(f"WARNING: tiktoken unavailable ({e}); estimating tokens from length")
+    if _encoder is not None:
+        return len(_encoder.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+def tokenize(text: str) -> list:
+    return [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in STOPWORDS]
+
+def canonical_url(url: str) -> str:
+    parts = urlsplit(url or "")
+    return f"{parts.netloc.lower().removeprefix('www.')}{parts.path.rstrip('/')}"
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = tokenize(text)
+    return {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+def extract_documents(results) -> list:
+    """Normalizes Tavily output (dict with "results", a list, or plain text) into [{title, url, content}]."""
+    if isinstance(results, dict):
+        items = results.get("results", [])
+    elif isinstance(results, list):
+        items = results
+    else:
+        return [{"title": "", "url": "", "content": str(results)}] if results else []
+    docs = []
+    for item in items:
+        if isinstance(item, dict) and item.get("content"):
+            docs.append({"title": item.get("title", ""), "url": item.get("url", ""), "content": item["content"]})
+    return docs
+
+def dedupe_documents(docs: list) -> list:
+    """Drops repeated URLs and results whose content is a near copy of an earlier one."""
+    kept, seen_urls, kept_shingles = [], set(), []
+    for doc in docs:
+        url = canonical_url(doc["url"])
+        if url and url in seen_urls:
+            continue
+        shingles = _shingles(doc["content"])
+        if any(len(shingles & other) / len(shingles | other) >= NEAR_DUPLICATE_JACCARD for other in kept_shingles):
+            continue
+        seen_urls.add(url)
+        kept_shingles.append(shingles)
+        kept.append(doc)
+    return kept
+
+def split_passages(text: str, size: int = PASSAGE_WORDS) -> list:
+    """Groups whole sentences into passages of roughly `size` words."""
+    sentences = re.split(r"(?<=[.!?])\s+", re.sub(r"\s+", " ", text).strip())
+    passages, current = [], []
+    for sentence in sentences:
+        current.append(sentence)
+        if sum(len(s.split()) for s in current) >= size:
+            passages.append(" ".join(current))
+            current = []
+    if current:
+        passages.append(" ".join(current))
+    return [p for p in passages if p]
+
+def bm25_scores(query: str, passages: list, k1: float = 1.5, b: float = 0.75) -> list:
+    docs = [tokenize(p) for p in passages]
+    if not docs:
+        return []
+    avg_len = sum(len(d) for d in docs) / len(docs) or 1.0
+    df = Counter(term for d in docs for term in set(d))
+    n = len(docs)
+    terms = set(tokenize(query))
+    scores = []
+    for d in docs:
+        tf = Counter(d)
+        score = 0.0
+        for term in terms:
+            if term not in tf:
+                continue
+            idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+            score += idf * tf[term] * (k1 + 1) / (tf[term] + k1 * (1 - b + b * len(d) / avg_len))
+        scores.append(score)
+    return scores
+
+def compact_search_results(query: str, results, budget: int = RESEARCH_CONTEXT_TOKENS) -> str:
+    """
+    Turns raw search output into a deduplicated, query-ranked digest that fits
+    in `budget` tokens. Passages are picked by BM25 score and printed grouped
+    by source so the writer can still cite URLs.
+    """
+    docs = dedupe_documents(extract_documents(results))
+
+    passages, seen = [], set()
+    for source, doc in enumerate(docs):
+        for passage in split_passages(doc["content"]):
+            digest = hashlib.md5(passage.lower().encode("utf-8")).hexdigest()
+            if digest not in seen:
+                seen.add(digest)
+                passages.append((source, passage))
+
+    scores = bm25_scores(query, [p for _, p in passages])
+    ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+
+    chosen, used = set(), 0
+    for i in ranked:
+        cost = count_tokens(passages[i][1]) + 2
+        if used + cost > budget:
+            continue
+        chosen.add(i)
+        used += cost
+
+    sections = []
+    for source, doc in enumerate(docs):
+        picked = [passages[i][1] for i in sorted(chosen) if passages[i][0] == source]
+        if picked:
+            header = f"[{len(sections) + 1}] {doc['title'] or 'Untitled'} ({doc['url']})" if doc["url"] else f"[{len(sections) + 1}] {doc['title'] or 'Web result'}"
+            sections.append(header + "\n" + "\n".join(f"- {p}" for p in picked))
+    return "\n\n".join(sections) if sections else "No web results available."
@@ -0,0 +1,191 @@
+import os
+import re
+import time
+import zlib
+import threading
+import numpy as np
+
+from .database import KnowledgeBase
+
+# Cosine similarity a cached query needs to count as the same question
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.82"))
+# How often each worker picks up KnowledgeBase rows written by other workers
+SEMANTIC_CACHE_REFRESH_SECONDS = float(os.getenv("SEMANTIC_CACHE_REFRESH_SECONDS", "60"))
+# Width of the hashed feature space
+FEATURE_DIM = 4096
+CHAR_GRAM_WEIGHT = 0.3
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "is", "are", "was", "be",
+    "what", "whats", "how", "why", "which", "who", "does", "do", "can", "with", "about", "by",
+    "me", "tell", "explain", "give", "show", "please", "its", "it", "this", "that", "vs", "versus",
+}
+
+# Common energy-industry abbreviations, expanded so both spellings share features
+ABBREVIATIONS = {
+    "lcoe": "levelized cost energy",
+    "levelised": "levelized",
+    "pv": "photovoltaic",
+    "ev": "electric vehicle",
+    "evs": "electric vehicle",
+    "bess": "battery energy storage",
+    "h2": "hydrogen",
+    "ccs": "carbon capture storage",
+    "ccus": "carbon capture utilisation storage",
+    "smr": "small modular reactor",
+    "ppa": "power purchase agreement",
+    "ira": "inflation reduction act",
+    "lng": "liquefied natural gas",
+    "gw": "gigawatt",
+    "mw": "megawatt",
+}
+
+# Words that can differ between two phrasings without changing the topic
+GENERIC_TERMS = {
+    "energy", "power", "future", "outlook", "trend", "latest", "current", "overview", "analysis",
+    "report", "detail", "detailed", "industry", "sector", "market", "role", "impact", "state",
+    "guide", "summary", "introduction", "basic", "comprehensive", "structured", "way",
+}
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(query: str) -> list:
+    text = re.sub(r"'s\b", "", query.lower())
+    text = re.sub(r"[^\w\s]", " ", text)
+    tokens = []
+    for word in text.split():
+        for part in ABBREVIATIONS.get(word, word).split():
+            if part not in STOPWORDS:
+                tokens.append(_stem(part))
+    return tokens
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % FEATURE_DIM
+
+def featurize(query: str):
+    """Returns (raw term-frequency vector, set of content words) for a query."""
+    vec = np.zeros(FEATURE_DIM, dtype=np.float32)
+    tokens = tokenize(query)
+    for token in tokens:
+        vec[_bucket("w:" + token)] += 1.0
+        padded = f"#{token}#"
+        for i in range(len(padded) - 2):
+            vec[_bucket("c:" + padded[i:i + 3])] += CHAR_GRAM_WEIGHT
+    np.log1p(vec, out=vec)
+    return vec, frozenset(tokens)
+
+def _close_match(word: str, others) -> bool:
+    # Tolerates typos and inflections ("hydron"/"hydrogen", "forecasting"/"forecast")
+    return not word.isdigit() and any(len(o) >= 5 and o[:5] == word[:5] for o in others if not o.isdigit())
+
+def same_topic(words: frozenset, other: frozenset) -> bool:
+    """
+    Similar vectors are not enough: "solar energy in india" must not match
+    "energy in india", nor "solar 2024" match "solar 2025". Every word that
+    only one side has must be a generic term or a near-spelling of the other side.
+    """
+    for word in words ^ other:
+        if word in GENERIC_TERMS:
+            continue
+        if _close_match(word, other if word in words else words):
+            continue
+        return False
+    return True
+
+class SemanticQueryIndex:
+    """
+    Offline nearest-neighbour index over KnowledgeBase.query.
+    Queries are hashed into TF-IDF vectors; lookups are a single matrix-vector
+    product. Entries are appended incrementally as new reports are saved.
+    """
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, refresh_seconds=SEMANTIC_CACHE_REFRESH_SECONDS):
+        self.threshold = threshold
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._ids = []
+        self._words = []
+        self._rows = []
+        self._matrix = None
+        self._weighted = None
+        self._df = np.zeros(FEATURE_DIM, dtype=np.float32)
+        self._max_id = 0
+        self._loaded_at = 0.0
+        self.lookups = 0
+        self.hits = 0
+
+    def add(self, entry_id: int, query: str):
+        vec, words = featurize(query)
+        with self._lock:
+            if entry_id in self._ids:
+                return
+            self._ids.append(entry_id)
+            self._words.append(words)
+            self._rows.append(vec)
+            self._df += vec > 0
+            self._max_id = max(self._max_id, entry_id)
+            self._matrix = None
+            self._weighted = None
+
+    def refresh(self, db):
+        """Loads rows this worker has not seen yet (all of them on first use)."""
+        if time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        self._loaded_at = time.monotonic()
+        try:
+            rows = db.query(KnowledgeBase.id, KnowledgeBase.query).filter(KnowledgeBase.id > self._max_id).all()
+        except Exception as e:
+            print(f"WARNING: Semantic cache refresh failed: {e}")
+            return
+        for entry_id, query in rows:
+            if query:
+                self.add(entry_id, query)
+
+    def _weighted_matrix(self):
+        if self._weighted is None:
+            if self._matrix is None:
+                self._matrix = np.vstack(self._rows)
+            n = len(self._ids)
+            self._idf = np.log((1 + n) / (1 + self._df)).astype(np.float32) + 1.0
+            weighted = self._matrix * self._idf
+            norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._weighted = weighted / norms
+        return self._weighted
+
+    def lookup(self, query: str, db=None):
+        """Returns (KnowledgeBase id, similarity) of the closest cached query above the threshold, else None."""
+        if db is not None:
+            self.refresh(db)
+        vec, words = featurize(query)
+        with self._lock:
+            self.lookups += 1
+            if not self._ids:
+                return None
+            matrix = self._weighted_matrix()
+            weighted = vec * self._idf
+            norm = np.linalg.norm(weighted)
+            if norm == 0:
+                return None
+            scores = matrix @ (weighted / norm)
+            for i in np.argsort(scores)[::-1][:5]:
+                if scores[i] < self.threshold:
+                    break
+                if same_topic(words, self._words[i]):
+                    self.hits += 1
+                    return self._ids[i], float(scores[i])
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._ids),
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+        }
+
+semantic_index = SemanticQueryIndex()
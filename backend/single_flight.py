@@ -0,0 +1,142 @@
+import os
+import uuid
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+
+from .database import SessionLocal, ResearchLock
+
+# Optional cross-worker coordination through the research_locks table
+RESEARCH_DB_LOCK = os.getenv("RESEARCH_DB_LOCK", "false").lower() in ("1", "true", "yes")
+RESEARCH_LOCK_TTL = int(os.getenv("RESEARCH_LOCK_TTL_SECONDS", "300"))
+RESEARCH_LOCK_POLL = float(os.getenv("RESEARCH_LOCK_POLL_SECONDS", "2"))
+
+def _consume_exception(future):
+    # Followers may all be gone; don't let asyncio warn about an unretrieved error
+    if not future.cancelled():
+        future.exception()
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key on this worker.
+    The first caller leads and runs the work; callers arriving while it is in
+    flight await the same result instead of starting their own run.
+    """
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def in_flight(self, key) -> bool:
+        return key in self._calls
+
+    def register(self, key, future) -> bool:
+        """Makes `future` the in-flight call for `key`. Returns False if another call already leads."""
+        if key in self._calls:
+            return False
+        self._calls[key] = future
+        future.add_done_callback(_consume_exception)
+        self.leaders += 1
+        return True
+
+    def release(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    async def join(self, key):
+        self.followers += 1
+        # shield: a follower disconnecting must not cancel the shared run
+        return await asyncio.shield(self._calls[key])
+
+    async def do(self, key, fn):
+        """Runs `fn()` once for all concurrent callers of `key`. Returns (result, shared)."""
+        if key in self._calls:
+            return await self.join(key), True
+        task = asyncio.ensure_future(fn())
+        self.register(key, task)
+        task.add_done_callback(lambda t: self.release(key, t))
+        return await asyncio.shield(task), False
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "followers": self.followers}
+
+class DatabaseLock:
+    """
+    Cross-worker lock on a research key, held as a row in research_locks.
+    Rows expire after `ttl` seconds so a crashed worker can't block a query forever.
+    """
+    def __init__(self, ttl=RESEARCH_LOCK_TTL, poll=RESEARCH_LOCK_POLL, session_factory=SessionLocal):
+        self.ttl = ttl
+        self.poll = poll
+        self.session_factory = session_factory
+        self.owner = uuid.uuid4().hex
+
+    def acquire(self, key) -> bool:
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            db.query(ResearchLock).filter(ResearchLock.key == key, ResearchLock.expires_at < now).delete()
+            db.add(ResearchLock(key=key, owner=self.owner, expires_at=now + timedelta(seconds=self.ttl)))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+        except Exception as e:
+            # Fail open: a broken lock table must not stop research
+            db.rollback()
+            print(f"WARNING: Research lock unavailable: {e}")
+            return True
+        finally:
+            db.close()
+
+    def is_held(self, key) -> bool:
+        db = self.session_factory()
+        try:
+            return db.query(ResearchLock).filter(ResearchLock.key == key, ResearchLock.expires_at >= datetime.utcnow()).first() is not None
+        except Exception:
+            return False
+        finally:
+            db.close()
+
+    def renew(self, key) -> bool:
+        """Pushes out the expiry of a lock this instance holds. False means another owner has it now."""
+        db = self.session_factory()
+        try:
+            renewed = db.query(ResearchLock).filter(ResearchLock.key == key, ResearchLock.owner == self.owner).update(
+                {ResearchLock.expires_at: datetime.utcnow() + timedelta(seconds=self.ttl)}, synchronize_session=False
+            )
+            db.commit()
+            return bool(renewed)
+        except Exception as e:
+            db.rollback()
+            print(f"WARNING: Failed to renew research lock: {e}")
+            return True
+        finally:
+            db.close()
+
+    def release(self, key):
+        db = self.session_factory()
+        try:
+            db.query(ResearchLock).filter(ResearchLock.key == key, ResearchLock.owner == self.owner).delete()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"WARNING: Failed to release research lock: {e}")
+        finally:
+            db.close()
+
+    async def wait(self, key, check):
+        """Polls `check()` while another worker holds the lock. Returns its result, or None if the lock went away first."""
+        deadline = asyncio.get_running_loop().time() + self.ttl
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(self.poll)
+            result = check()
+            if result:
+                return result
+            if not self.is_held(key):
+                return None
+        return None
+
+single_flight = SingleFlight()
+research_lock = DatabaseLock() if RESEARCH_DB_LOCK else None
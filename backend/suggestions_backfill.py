@@ -0,0 +1,84 @@
+import os
+import json
+import asyncio
+
+from .database import SessionLocal, KnowledgeBase, sync_to_local
+from .single_flight import DatabaseLock
+
+# Rows handled per pass of the periodic job, and the pause between passes (seconds)
+BACKFILL_BATCH_SIZE = int(os.getenv("SUGGESTIONS_BACKFILL_BATCH", "5"))
+BACKFILL_INTERVAL = int(os.getenv("SUGGESTIONS_BACKFILL_INTERVAL_SECONDS", "600"))
+# How long a worker's claim on an entry lasts if it dies mid-backfill (seconds)
+BACKFILL_CLAIM_TTL = int(os.getenv("SUGGESTIONS_BACKFILL_CLAIM_SECONDS", "300"))
+
+# Entries queued or being backfilled right now, so a hot entry is only generated once
+_pending = set()
+# One backfill at a time, queued in the background LLM class, so it never crowds out live research
+_backfill_lock = asyncio.Lock()
+# Every worker runs the periodic job; an entry is claimed in research_locks so only one generates it
+backfill_claims = DatabaseLock(ttl=BACKFILL_CLAIM_TTL)
+
+def load_suggestions(entry) -> list:
+    """Stored suggestions for a KnowledgeBase row, or None if they were never generated."""
+    if entry.suggestions is None:
+        return None
+    try:
+        return json.loads(entry.suggestions)
+    except ValueError:
+        return None
+
+async def backfill_entry(entry_id: int):
+    if entry_id in _pending:
+        return
+    _pending.add(entry_id)
+    try:
+        async with _backfill_lock:
+            claim = f"suggestions:{entry_id}"
+            if not backfill_claims.acquire(claim):
+                # Another worker is generating them
+                return
+            db = SessionLocal()
+            try:
+                # Read after claiming: a worker that held the claim before us may have filled it in
+                entry = db.query(KnowledgeBase).filter(KnowledgeBase.id == entry_id).first()
+                if not entry or entry.suggestions is not None:
+                    return
+                # Lazy load heavy AI chain only when needed
+                from .research_chain import generate_suggestions
+                suggestions = await generate_suggestions(entry.content, node="backfill")
+                entry.suggestions = json.dumps(suggestions)
+                db.commit()
+                db.refresh(entry)
+                sync_to_local(entry)
+                print(f"DEBUG: Backfilled suggestions for knowledge base entry {entry_id}")
+            except Exception as e:
+                db.rollback()
+                print(f"ERROR: Suggestions backfill failed for entry {entry_id}: {e}")
+            finally:
+                db.close()
+                backfill_claims.release(claim)
+    finally:
+        _pending.discard(entry_id)
+
+def request_backfill(entry_id: int):
+    """Schedules a backfill for one entry without blocking the caller."""
+    if entry_id not in _pending:
+        asyncio.create_task(backfill_entry(entry_id))
+
+async def periodic_suggestions_backfill():
+    # Let startup (init_db migrations) finish before touching the new column
+    await asyncio.sleep(30)
+    while True:
+        try:
+            db = SessionLocal()
+            try:
+                ids = [entry_id for (entry_id,) in db.query(KnowledgeBase.id)
+                       .filter(KnowledgeBase.suggestions.is_(None))
+                       .limit(BACKFILL_BATCH_SIZE).all()]
+            finally:
+                db.close()
+            for entry_id in ids:
+                await backfill_entry(entry_id)
+        except Exception as e:
+            print(f"ERROR in suggestions backfill loop: {e}")
+        await asyncio.sleep(BACKFILL_INTERVAL)
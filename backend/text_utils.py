@@ -0,0 +1,14 @@
+import re
+
+def slugify(text: str) -> str:
+    text = text.lower().strip()
+    text = re.sub(r'[^\w\s-]', '', text)
+    text = re.sub(r'[\s_-]+', '-', text)
+    text = re.sub(r'^-+|-+$', '', text)
+    return text
+
+def normalize_query(query: str) -> str:
+    query = query.lower().strip()
+    query = re.sub(r'[^\w\s]', '', query)
+    words = sorted(query.split())
+    return " ".join(words)
@@ -0,0 +1,345 @@
+"""
+Offline throughput benchmark for the research graph.
+
+Swaps the Groq chat model and Tavily search for fakes with configurable
+latency, output length and failure/429 rates, drives run_full_research
+from N concurrent sessions and writes latency percentiles, throughput,
+LLM queue wait and memory growth to JSON.
+
+    python benchmarks/graph_benchmark.py --sessions 10 --runs 50 --llm-latency 0.5
+    python benchmarks/graph_benchmark.py --compare benchmarks/results/graph-abc1234.json
+"""
+import os
+import sys
+import json
+import zlib
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import httpx
+from groq import RateLimitError, InternalServerError
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# research_chain reads its keys at import time; the fakes never use them
+os.environ.setdefault("GROQ_API_KEY", "gsk_benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "tvly-benchmark")
+
+TOPICS = [
+    "Solar PV capacity in India", "Offshore wind in the North Sea", "Green hydrogen costs",
+    "Battery storage economics", "Small modular reactors", "Geothermal heat in Kenya",
+    "EV charging networks in Europe", "Carbon capture in cement", "Grid-scale pumped hydro",
+]
+
+FILLER = ("capacity grew 12% to 450 GW in 2024 while costs fell to $38/MWh across key markets "
+          "as policy support and supply chains matured").split()
+
+def _lognormal(median: float, sigma: float, rng: random.Random) -> float:
+    return median * rng.lognormvariate(0, sigma) if median > 0 else 0.0
+
+def _fake_response(status: int, retry_after: float) -> httpx.Response:
+    return httpx.Response(status, headers={"retry-after": str(retry_after)},
+                          request=httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions"))
+
+class BenchmarkStats:
+    def __init__(self):
+        self.llm_calls = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.searches = 0
+
+class FakeChatModel(BaseChatModel):
+    """Chat model with a latency distribution and injected 429s / 5xx errors."""
+    latency: float = 0.5
+    sigma: float = 0.3
+    output_words: int = 400
+    rate_limit_rate: float = 0.0
+    failure_rate: float = 0.0
+    retry_after: float = 1.0
+    rng: random.Random
+    stats: BenchmarkStats
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def _reply(self, messages) -> ChatResult:
+        prompt = " ".join(str(m.content) for m in messages)
+        prompt_words = len(prompt.split())
+        # Like a real model, different prompts get different replies (keeps the LLM response cache honest)
+        words = ["YES", "PASS", f"ref-{zlib.crc32(prompt.encode('utf-8')):08x}"] + [FILLER[i % len(FILLER)] for i in range(self.output_words)]
+        message = AIMessage(content=" ".join(words), usage_metadata={
+            "input_tokens": int(prompt_words * 1.3),
+            "output_tokens": int(len(words) * 1.3),
+            "total_tokens": int((prompt_words + len(words)) * 1.3),
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _maybe_fail(self):
+        self.stats.llm_calls += 1
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            self.stats.rate_limited += 1
+            raise RateLimitError("benchmark 429", response=_fake_response(429, self.retry_after), body=None)
+        if roll < self.rate_limit_rate + self.failure_rate:
+            self.stats.failures += 1
+            raise InternalServerError("benchmark 500", response=_fake_response(500, 0), body=None)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(_lognormal(self.latency, self.sigma, self.rng))
+        self._maybe_fail()
+        return self._reply(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(_lognormal(self.latency, self.sigma, self.rng))
+        self._maybe_fail()
+        return self._reply(messages)
+
+class FakeSearch:
+    """Blocking search tool (like TavilySearch.run) with a latency distribution."""
+    max_results = 10
+
+    def __init__(self, latency: float, sigma: float, results: int, rng: random.Random, stats: BenchmarkStats):
+        self.latency = latency
+        self.sigma = sigma
+        self.results = results
+        self.rng = rng
+        self.stats = stats
+
+    def run(self, query):
+        time.sleep(_lognormal(self.latency, self.sigma, self.rng))
+        self.stats.searches += 1
+        return {"query": query, "results": [{
+            "title": f"{query} source {i}",
+            "url": f"https://example.com/{i}/{abs(hash(query))}",
+            # Shuffled so results are not near-duplicates of each other
+            "content": " ".join(self.rng.choice(FILLER) for _ in range(150)),
+        } for i in range(self.results)]}
+
+    invoke = run
+
+@contextmanager
+def patched(module, **attrs):
+    saved = {name: getattr(module, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+async def drive(research_chain, admission_module, sessions: int, runs: int):
+    gate = asyncio.Semaphore(sessions)
+    latencies, errors = [], []
+
+    async def one(i: int):
+        async with gate:
+            # Each simulated session queues as its own requester
+            admission_module.current_requester.set(f"bench-session-{i % sessions}")
+            started = time.perf_counter()
+            try:
+                await research_chain.run_full_research(f"{TOPICS[i % len(TOPICS)]} (run {i})")
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(repr(e))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(runs)))
+    return latencies, errors, time.perf_counter() - started
+
+def run_benchmark(args) -> dict:
+    from backend import research_chain
+    from backend import admission as admission_module
+    from backend.admission import AdmissionScheduler
+    from backend.database import Base
+    from backend.search_cache import SearchCache
+    from backend.checkpointer import BoundedCheckpointSaver
+    from backend.domain_classifier import DomainClassifier
+    from backend.llm_cache import LLMResponseCache
+
+    rng = random.Random(args.seed)
+    stats = BenchmarkStats()
+    workdir = tempfile.mkdtemp(prefix="graph-bench-")
+    engine = create_engine(f"sqlite:///{workdir}/bench.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def fake_model(key=None, **kwargs):
+        return FakeChatModel(latency=args.llm_latency, sigma=args.llm_sigma, output_words=args.output_words,
+                             rate_limit_rate=args.rate_limit_rate, failure_rate=args.failure_rate,
+                             retry_after=args.retry_after, rng=rng, stats=stats)
+
+    keys = [f"gsk_benchmark_key_{i}" for i in range(args.keys)]
+    key_manager = research_chain.APIKeyManager(keys)
+    scheduler = AdmissionScheduler()
+    scheduler.healthy_keys = key_manager.healthy_count
+    memory = BoundedCheckpointSaver(session_factory=session_factory)
+    llm_cache = LLMResponseCache()
+    app = research_chain.workflow.compile(checkpointer=memory)
+
+    with patched(research_chain,
+                 get_chat_model=fake_model,
+                 search_tool=FakeSearch(args.search_latency, args.search_sigma, args.search_results, rng, stats),
+                 search_cache=SearchCache(session_factory=session_factory),
+                 domain_classifier=DomainClassifier(session_factory=session_factory),
+                 llm_cache=llm_cache,
+                 key_manager=key_manager,
+                 admission=scheduler,
+                 memory=memory,
+                 app=app,
+                 REVIEW_GATE_MODE=args.review_gate,
+                 WRITER_MODE=args.writer_mode):
+        tracemalloc.start()
+        rss_before = rss_mb()
+        latencies, errors, wall = asyncio.run(drive(research_chain, admission_module, args.sessions, args.runs))
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = rss_mb()
+
+    engine.dispose()
+    queue = scheduler.stats()
+    return {
+        "label": args.label,
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": {
+            "runs": args.runs,
+            "completed": len(latencies),
+            "errors": len(errors),
+            "error_samples": errors[:5],
+            "wall_seconds": round(wall, 3),
+            "throughput_runs_per_minute": round(60 * len(latencies) / wall, 2) if wall else 0.0,
+            "latency_seconds": {
+                "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "p50": round(percentile(latencies, 50), 3),
+                "p95": round(percentile(latencies, 95), 3),
+                "p99": round(percentile(latencies, 99), 3),
+                "max": round(max(latencies), 3) if latencies else 0.0,
+            },
+            "llm": {
+                "calls": stats.llm_calls,
+                "rate_limited": stats.rate_limited,
+                "failures": stats.failures,
+                "searches": stats.searches,
+                "cache": llm_cache.stats()["nodes"],
+            },
+            "queue_wait": {cls: {k: v for k, v in data.items() if k.endswith("wait_seconds") or k == "admitted"}
+                           for cls, data in queue["classes"].items()},
+            "memory": {
+                "rss_before_mb": round(rss_before, 1),
+                "rss_after_mb": round(rss_after, 1),
+                "rss_growth_mb": round(rss_after - rss_before, 1),
+                "python_heap_mb": round(current / 2**20, 1),
+                "python_heap_peak_mb": round(peak / 2**20, 1),
+            },
+        },
+    }
+
+COMPARED = [
+    ("throughput_runs_per_minute", ("throughput_runs_per_minute",), True),
+    ("p50 latency", ("latency_seconds", "p50"), False),
+    ("p95 latency", ("latency_seconds", "p95"), False),
+    ("p99 latency", ("latency_seconds", "p99"), False),
+    ("errors", ("errors",), False),
+    ("rss growth MB", ("memory", "rss_growth_mb"), False),
+]
+
+def compare(current: dict, baseline: dict):
+    print(f"\nvs {baseline.get('label') or 'baseline'} ({baseline.get('commit')}):")
+    for name, path, higher_is_better in COMPARED:
+        new, old = current["results"], baseline["results"]
+        for part in path:
+            new, old = new[part], old[part]
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change < 0 if higher_is_better else change > 0
+        flag = "  <-- regression" if worse and abs(change) >= 10 else ""
+        print(f"  {name:28} {old:>10} -> {new:<10} ({change:+.1f}%){flag}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the research graph with fake LLM and search backends")
+    parser.add_argument("--sessions", type=int, default=5, help="concurrent research sessions")
+    parser.add_argument("--runs", type=int, default=20, help="total research runs")
+    parser.add_argument("--keys", type=int, default=1, help="simulated Groq keys")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="median LLM call latency (s)")
+    parser.add_argument("--llm-sigma", type=float, default=0.3, help="log-normal spread of LLM latency")
+    parser.add_argument("--output-words", type=int, default=400, help="words per LLM reply")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of LLM calls answered with 429")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of LLM calls answered with 500")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with fake 429s (s)")
+    parser.add_argument("--search-latency", type=float, default=0.8, help="median search latency (s)")
+    parser.add_argument("--search-sigma", type=float, default=0.3, help="log-normal spread of search latency")
+    parser.add_argument("--search-results", type=int, default=10, help="results per search")
+    parser.add_argument("--writer-mode", choices=["single", "sections"], default="single")
+    parser.add_argument("--review-gate", choices=["full", "fail_only", "off"], default="off",
+                        help="fake reports have no real sections, so the rule gate is off by default")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--label", default="", help="free-form name stored with the results")
+    parser.add_argument("--out", help="JSON output path (default benchmarks/results/graph-<commit>.json)")
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    report = run_benchmark(args)
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"graph-{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    results = report["results"]
+    print(f"\n=== Graph benchmark ({args.runs} runs, {args.sessions} sessions) ===")
+    print(f"  completed {results['completed']}, errors {results['errors']}, wall {results['wall_seconds']}s")
+    print(f"  throughput {results['throughput_runs_per_minute']} runs/min")
+    print(f"  latency p50 {results['latency_seconds']['p50']}s  p95 {results['latency_seconds']['p95']}s  p99 {results['latency_seconds']['p99']}s")
+    print(f"  rss growth {results['memory']['rss_growth_mb']} MB, heap peak {results['memory']['python_heap_peak_mb']} MB")
+    print(f"  saved to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Per-call overhead of building a Groq client for every LLM call versus the
+pooled keep-alive clients in backend/groq_pool.py.
+
+Serves a fake Groq chat completions endpoint on localhost that waits
+--handshake-ms on every new connection (standing in for the TCP + TLS
+setup to api.groq.com) and --server-ms on every request, then times
+sequential and concurrent calls through ChatGroq both ways.
+
+    python benchmarks/groq_client_benchmark.py --calls 50 --handshake-ms 40
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import httpx
+from langchain_groq import ChatGroq
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend.groq_pool import GroqClientPool  # noqa: E402
+
+MODEL_SETTINGS = {"model": "llama-3.3-70b-versatile", "temperature": 0.5, "max_tokens": 4096}
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-benchmark",
+    "object": "chat.completion",
+    "created": 0,
+    "model": MODEL_SETTINGS["model"],
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+}).encode()
+
+class FakeGroqServer:
+    """Minimal HTTP/1.1 keep-alive server answering every request with a fixed chat completion."""
+    def __init__(self, handshake_ms: float, server_ms: float):
+        self.handshake = handshake_ms / 1000
+        self.latency = server_ms / 1000
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(self.handshake)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                self.requests += 1
+                await asyncio.sleep(self.latency)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: " + str(len(COMPLETION)).encode() + b"\r\n\r\n" + COMPLETION)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+def fresh_model(base_url: str, key: str, opened: list) -> ChatGroq:
+    """What get_chat_model did before the pool: a new SDK and HTTP client per call."""
+    client = httpx.AsyncClient()
+    opened.append(client)
+    return ChatGroq(groq_api_key=key, base_url=base_url, max_retries=0,
+                    http_async_client=client, **MODEL_SETTINGS)
+
+async def timed_calls(get_model, calls: int, concurrency: int) -> list:
+    durations = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await get_model(i).ainvoke("ping")
+            durations.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return durations
+
+def summarize(durations: list) -> dict:
+    ordered = sorted(durations)
+    return {
+        "mean_ms": round(1000 * sum(ordered) / len(ordered), 2),
+        "p50_ms": round(1000 * ordered[len(ordered) // 2], 2),
+        "p95_ms": round(1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+    }
+
+async def run(args) -> dict:
+    server = FakeGroqServer(args.handshake_ms, args.server_ms)
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    base_url = f"http://127.0.0.1:{listener.sockets[0].getsockname()[1]}"
+    keys = [f"gsk_benchmark_key_{i}" for i in range(args.keys)]
+    results = {}
+
+    for concurrency in (1, args.concurrency):
+        server.connections = 0
+        opened = []
+        fresh = await timed_calls(lambda i: fresh_model(base_url, keys[i % len(keys)], opened), args.calls, concurrency)
+        fresh_connections = server.connections
+        for client in opened:
+            await client.aclose()
+
+        server.connections = 0
+        pool = GroqClientPool(base_url=base_url)
+        pooled = await timed_calls(lambda i: pool.chat_model(keys[i % len(keys)], **MODEL_SETTINGS), args.calls, concurrency)
+        pooled_connections = server.connections
+        await pool.aclose()
+
+        fresh_stats, pooled_stats = summarize(fresh), summarize(pooled)
+        results[f"concurrency_{concurrency}"] = {
+            "fresh_client": {**fresh_stats, "connections": fresh_connections},
+            "pooled_client": {**pooled_stats, "connections": pooled_connections},
+            "saved_per_call_ms": round(fresh_stats["mean_ms"] - pooled_stats["mean_ms"], 2),
+        }
+
+    listener.close()
+    await listener.wait_closed()
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fresh vs pooled Groq client overhead against a local fake endpoint")
+    parser.add_argument("--calls", type=int, default=50, help="LLM calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel calls in the concurrent scenario")
+    parser.add_argument("--keys", type=int, default=2, help="API keys the calls rotate through")
+    parser.add_argument("--handshake-ms", type=float, default=40.0, help="simulated connection + TLS setup per new connection")
+    parser.add_argument("--server-ms", type=float, default=5.0, help="simulated server time per request")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    return results
+
+if __name__ == "__main__":
+    main()
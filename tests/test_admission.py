@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+
+from backend.admission import AdmissionScheduler, AdmissionRejected
+
+async def hold(scheduler, priority, requester, order, release_after=0.0):
+    await scheduler.acquire(priority, requester)
+    order.append((priority, requester))
+    await asyncio.sleep(release_after)
+    scheduler.release()
+
+async def run_queued(scheduler, calls):
+    """Fills the only slot, queues `calls` behind it, then lets everything drain."""
+    order = []
+    await scheduler.acquire("standard", "blocker")
+    tasks = []
+    for priority, requester in calls:
+        tasks.append(asyncio.create_task(hold(scheduler, priority, requester, order)))
+        await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    return order
+
+def test_short_calls_go_ahead_of_writer_calls():
+    scheduler = AdmissionScheduler(per_key=1)
+    order = asyncio.run(run_queued(scheduler, [("long", "a"), ("long", "b"), ("interactive", "c")]))
+    assert order[0] == ("interactive", "c")
+    assert scheduler.stats()["classes"]["long"]["admitted"] == 2
+
+def test_requesters_are_served_round_robin():
+    scheduler = AdmissionScheduler(per_key=1)
+    calls = [("standard", "heavy")] * 3 + [("standard", "light")]
+    order = asyncio.run(run_queued(scheduler, calls))
+    assert [requester for _, requester in order] == ["heavy", "light", "heavy", "heavy"]
+
+def test_old_low_priority_calls_are_not_starved():
+    scheduler = AdmissionScheduler(per_key=1, aging_seconds=0)
+    order = asyncio.run(run_queued(scheduler, [("long", "a"), ("interactive", "b")]))
+    assert order[0] == ("long", "a")
+
+def test_capacity_follows_healthy_keys():
+    scheduler = AdmissionScheduler(per_key=2)
+    scheduler.healthy_keys = lambda: 3
+    assert scheduler.capacity() == 6
+    scheduler.healthy_keys = lambda: 0
+    assert scheduler.capacity() == 2
+
+def test_deep_queue_is_rejected_with_a_wait_estimate():
+    scheduler = AdmissionScheduler(per_key=1, max_queue_depth=2)
+
+    async def scenario():
+        await scheduler.acquire("standard", "a")
+        waiters = [asyncio.create_task(scheduler.acquire("long", "b")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            scheduler.check()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.queue_depth == 2
+    assert rejected.retry_after >= scheduler.avg_service_seconds
+    assert scheduler.queue_depth() == 0
+    assert scheduler.stats()["rejected"] == 1
+
+def test_background_work_is_capped_and_never_ages_ahead():
+    scheduler = AdmissionScheduler(per_key=3, aging_seconds=0, background_slots=1)
+
+    async def scenario():
+        first = await scheduler.acquire("background", "refresh")
+        second = asyncio.create_task(scheduler.acquire("background", "refresh"))
+        await asyncio.sleep(0)
+        # A free slot is left, but only for live traffic
+        assert not second.done() and scheduler.active == 1
+        assert await scheduler.acquire("interactive", "user") == "interactive"
+        scheduler.release(priority=first)
+        await second
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 2 and stats["active_background"] == 1
@@ -0,0 +1,110 @@
+import os
+import asyncio
+import operator
+from datetime import datetime, timedelta
+from typing import TypedDict, Annotated
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from langgraph.graph import StateGraph, END
+
+from backend.checkpointer import BoundedCheckpointSaver, new_anonymous_thread_id
+from backend.database import GraphCheckpoint
+
+TEST_DATABASE_URL = "sqlite:///./test_checkpoints.db"
+
+engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+class CounterState(TypedDict):
+    query: str
+    history: Annotated[list, operator.add]
+
+def build_graph(saver):
+    async def step_one(state):
+        return {"history": [f"one:{state['query']}"]}
+
+    async def step_two(state):
+        return {"history": [f"two:{state['query']}"]}
+
+    workflow = StateGraph(CounterState)
+    workflow.add_node("one", step_one)
+    workflow.add_node("two", step_two)
+    workflow.set_entry_point("one")
+    workflow.add_edge("one", "two")
+    workflow.add_edge("two", END)
+    return workflow.compile(checkpointer=saver)
+
+@pytest.fixture(autouse=True)
+def fresh_db():
+    if os.path.exists("./test_checkpoints.db"):
+        os.remove("./test_checkpoints.db")
+    yield
+    engine.dispose()
+    if os.path.exists("./test_checkpoints.db"):
+        os.remove("./test_checkpoints.db")
+
+def count_rows(thread_id):
+    db = TestingSessionLocal()
+    try:
+        return db.query(GraphCheckpoint).filter(GraphCheckpoint.thread_id == thread_id).count()
+    finally:
+        db.close()
+
+def test_thread_state_survives_a_new_saver_and_is_capped():
+    config = {"configurable": {"thread_id": "user-1"}}
+    saver = BoundedCheckpointSaver(session_factory=TestingSessionLocal, max_per_thread=3)
+    graph = build_graph(saver)
+
+    asyncio.run(graph.ainvoke({"query": "solar"}, config=config))
+    asyncio.run(graph.ainvoke({"query": "wind"}, config=config))
+    assert count_rows("user-1") == 3
+
+    # A new worker with a cold LRU reads the same state from the database
+    restarted = BoundedCheckpointSaver(session_factory=TestingSessionLocal, max_per_thread=3)
+    state = asyncio.run(build_graph(restarted).aget_state(config)).values
+    assert state["history"] == ["one:solar", "two:solar", "one:wind", "two:wind"]
+    assert restarted.db_reads == 1
+
+    asyncio.run(build_graph(restarted).aget_state(config))
+    assert restarted.hot_hits == 1
+
+def test_workers_sharing_a_thread_never_resume_from_a_stale_copy():
+    config = {"configurable": {"thread_id": "shared"}}
+    worker_a = BoundedCheckpointSaver(session_factory=TestingSessionLocal)
+    worker_b = BoundedCheckpointSaver(session_factory=TestingSessionLocal)
+
+    asyncio.run(build_graph(worker_a).ainvoke({"query": "solar"}, config=config))
+    # Worker B moves the thread on while A still has its own latest checkpoint cached
+    asyncio.run(build_graph(worker_b).ainvoke({"query": "wind"}, config=config))
+    asyncio.run(build_graph(worker_a).ainvoke({"query": "hydro"}, config=config))
+
+    assert worker_a.hot_stale >= 1
+    state = asyncio.run(build_graph(worker_b).aget_state(config)).values
+    assert state["history"] == ["one:solar", "two:solar", "one:wind", "two:wind", "one:hydro", "two:hydro"]
+    # One unbroken parent chain: every checkpoint but the first has its predecessor as parent
+    chain = list(worker_b.list(config))
+    for newer, older in zip(chain, chain[1:]):
+        assert newer.parent_config["configurable"]["checkpoint_id"] == older.config["configurable"]["checkpoint_id"]
+
+def test_delete_and_expiry_remove_threads():
+    saver = BoundedCheckpointSaver(session_factory=TestingSessionLocal, thread_ttl=3600, anon_ttl=60)
+    graph = build_graph(saver)
+    anon = new_anonymous_thread_id()
+    for thread_id in ("kept", "deleted", anon):
+        asyncio.run(graph.ainvoke({"query": "hydrogen"}, config={"configurable": {"thread_id": thread_id}}))
+
+    asyncio.run(saver.adelete_thread("deleted"))
+    assert count_rows("deleted") == 0
+    assert asyncio.run(graph.aget_state({"configurable": {"thread_id": "deleted"}})).values == {}
+
+    # Age everything by ten minutes: past the anonymous TTL, within the normal one
+    db = TestingSessionLocal()
+    db.query(GraphCheckpoint).update({GraphCheckpoint.created_at: datetime.utcnow() - timedelta(minutes=10)})
+    db.commit()
+    db.close()
+
+    saver.prune_expired()
+    assert count_rows(anon) == 0
+    assert count_rows("kept") > 0
+    assert saver.stats()["threads_expired"] == 1
@@ -0,0 +1,62 @@
+import os
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.database import Base, ChatHistory, KnowledgeBase, GatekeeperVerdict
+from backend.domain_classifier import DomainClassifier, REFUSAL_MESSAGE
+
+TEST_DATABASE_URL = "sqlite:///./test_gatekeeper.db"
+
+engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def classifier():
+    if os.path.exists("./test_gatekeeper.db"):
+        os.remove("./test_gatekeeper.db")
+    Base.metadata.create_all(bind=engine)
+    yield DomainClassifier(session_factory=TestingSessionLocal)
+    engine.dispose()
+    if os.path.exists("./test_gatekeeper.db"):
+        os.remove("./test_gatekeeper.db")
+
+def test_obvious_energy_queries_skip_the_llm(classifier):
+    for query in ["Offshore wind capacity factors", "Green hydrogen electrolyzer costs", "Nuclear policy in Japan"]:
+        assert classifier.classify(query) is True
+    assert classifier.stats()["decisions"]["accepted"] == 3
+
+def test_unclear_queries_are_left_to_the_llm(classifier):
+    assert classifier.classify("Kazakhstan economic outlook") is None
+    assert classifier.classify("semiconductor supply chain") is None
+    assert classifier.stats()["decisions"]["uncertain"] == 2
+
+def test_obviously_off_domain_queries_are_refused_locally(classifier):
+    for query in ["best pasta recipe", "write a poem about cats"]:
+        assert classifier.classify(query) is False
+    assert classifier.stats()["decisions"]["refused"] == 2
+    # An energy term anywhere keeps the query away from a local refusal
+    assert classifier.classify("best pasta recipe for a solar oven") is not False
+
+def test_llm_verdicts_are_memoized_by_normalized_query(classifier):
+    classifier.record("Best pasta recipe?", False)
+    assert classifier.classify("recipe best pasta") is False
+
+    # A fresh worker finds the verdict in the database
+    other_worker = DomainClassifier(session_factory=TestingSessionLocal)
+    assert other_worker.classify("best pasta recipe") is False
+    assert other_worker.stats()["decisions"]["memo"] == 1
+
+def test_training_uses_past_reports_and_refusals(classifier):
+    db = TestingSessionLocal()
+    db.add(KnowledgeBase(query="Battery megapack deployments in Texas", slug="megapack", content="..."))
+    # Stored before reports were filtered for relevance; must not be learned as energy
+    db.add(KnowledgeBase(query="Celebrity gossip roundup", slug="gossip", content="..."))
+    db.add(ChatHistory(user_id=None, query="Cricket world cup schedule", response=REFUSAL_MESSAGE))
+    db.add(GatekeeperVerdict(key="aluminium smelter demand", query="Aluminium smelter demand", is_relevant=1))
+    db.commit()
+    db.close()
+
+    classifier.train()
+    assert classifier.stats()["training_rows"] == 60 + 3
+    assert classifier.probability("Battery megapack deployments in Texas") > classifier.probability("Cricket world cup schedule")
@@ -0,0 +1,37 @@
+import os
+import json
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_benchmark():
+    spec = importlib.util.spec_from_file_location("graph_benchmark", os.path.join(ROOT, "benchmarks", "graph_benchmark.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_benchmark_runs_offline_and_writes_json(monkeypatch, tmp_path):
+    monkeypatch.setenv("GROQ_API_KEY", os.getenv("GROQ_API_KEY", "gsk_test"))
+    monkeypatch.setenv("TAVILY_API_KEY", os.getenv("TAVILY_API_KEY", "tvly-test"))
+    benchmark = load_benchmark()
+
+    out = tmp_path / "bench.json"
+    report = benchmark.main([
+        "--sessions", "2", "--runs", "3", "--keys", "2",
+        "--llm-latency", "0.01", "--search-latency", "0.01", "--output-words", "50",
+        "--out", str(out), "--label", "smoke",
+    ])
+
+    saved = json.loads(out.read_text())
+    assert saved["label"] == "smoke"
+    results = saved["results"]
+    assert results["completed"] == 3 and results["errors"] == 0
+    assert 0 < results["latency_seconds"]["p50"] <= results["latency_seconds"]["p99"]
+    assert results["llm"]["calls"] >= 3 * 5
+    assert results["queue_wait"]["long"]["admitted"] == 3
+    assert report["results"]["throughput_runs_per_minute"] > 0
+
+    # The real backends are restored afterwards
+    from backend import research_chain
+    assert research_chain.get_chat_model.__name__ == "get_chat_model"
+    assert not isinstance(research_chain.search_tool, benchmark.FakeSearch)
@@ -0,0 +1,48 @@
+import asyncio
+import importlib.util
+import os
+
+from backend.groq_pool import GroqClientPool
+
+SETTINGS = {"model": "llama-3.3-70b-versatile", "temperature": 0.5, "max_tokens": 4096}
+
+def test_models_and_connections_are_reused_per_key():
+    pool = GroqClientPool()
+
+    async def scenario():
+        first = pool.chat_model("gsk_a", **SETTINGS)
+        again = pool.chat_model("gsk_a", **SETTINGS)
+        other_key = pool.chat_model("gsk_b", **SETTINGS)
+        other_settings = pool.chat_model("gsk_a", **{**SETTINGS, "max_tokens": 512})
+        assert first is again
+        assert other_key is not first
+        # Different model settings for the same key still share its HTTP connections
+        assert other_settings.http_async_client is first.http_async_client
+        assert other_key.http_async_client is not first.http_async_client
+        assert pool.stats()["open_clients"] == 2
+        await pool.aclose()
+        assert first.http_async_client.is_closed
+
+    asyncio.run(scenario())
+    assert pool.stats() == {"open_clients": 0, "clients_created": 2, "models_created": 3,
+                            "reused": 1, "max_connections_per_key": pool.limits.max_connections}
+
+def test_each_event_loop_gets_its_own_clients():
+    pool = GroqClientPool()
+
+    async def client_for_loop():
+        return pool.chat_model("gsk_a", **SETTINGS).http_async_client
+
+    assert asyncio.run(client_for_loop()) is not asyncio.run(client_for_loop())
+
+def test_benchmark_shows_pooled_calls_open_fewer_connections():
+    path = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "groq_client_benchmark.py")
+    spec = importlib.util.spec_from_file_location("groq_client_benchmark", path)
+    benchmark = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(benchmark)
+
+    results = benchmark.main(["--calls", "6", "--concurrency", "2", "--keys", "1", "--handshake-ms", "20", "--server-ms", "1"])
+    sequential = results["concurrency_1"]
+    assert sequential["fresh_client"]["connections"] == 6
+    assert sequential["pooled_client"]["connections"] == 1
+    assert sequential["saved_per_call_ms"] > 0
@@ -0,0 +1,111 @@
+import os
+import asyncio
+import importlib
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from backend.hedging import HedgePolicy, first_success
+from backend.admission import AdmissionScheduler
+
+def test_calls_are_hedged_past_the_node_percentile_once_warmed_up():
+    policy = HedgePolicy(enabled=True, percentile=90, min_samples=10, nodes={"analyst"})
+    for seconds in range(1, 10):
+        policy.record_latency("analyst", float(seconds))
+    assert policy.delay("analyst") is None
+    policy.record_latency("analyst", 10.0)
+    assert policy.delay("analyst") == 10.0
+    policy.record_latency("writer", 1.0)
+    assert policy.delay("writer") is None
+    assert HedgePolicy(enabled=False, min_samples=0, nodes={"analyst"}).delay("analyst") is None
+
+def test_extra_load_is_capped():
+    policy = HedgePolicy(enabled=True, max_extra_load=0.1)
+    for _ in range(20):
+        policy.record_call()
+    assert policy.allow("analyst")
+    policy.record_hedge("analyst")
+    assert policy.allow("analyst")
+    policy.record_hedge("analyst")
+    assert not policy.allow("analyst")
+    assert policy.stats()["counts"]["analyst"] == {"fired": 2, "won": 0, "capped": 1}
+
+def test_first_success_skips_failures_and_cancels_the_loser():
+    async def run():
+        async def slow():
+            await asyncio.sleep(10)
+            return "slow"
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        async def fast():
+            await asyncio.sleep(0.01)
+            return "fast"
+
+        loser = asyncio.create_task(slow())
+        winner, result = await first_success(loser, asyncio.create_task(fast()))
+        await asyncio.sleep(0)
+        assert result == "fast" and winner is not loser and loser.cancelled()
+
+        with pytest.raises(RuntimeError):
+            await first_success(asyncio.create_task(broken()), asyncio.create_task(broken()))
+
+        winner, result = await first_success(asyncio.create_task(broken()), asyncio.create_task(fast()))
+        assert result == "fast"
+
+    asyncio.run(run())
+
+@pytest.fixture
+def research_chain(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", os.getenv("GROQ_API_KEY", "gsk_test"))
+    monkeypatch.setenv("TAVILY_API_KEY", os.getenv("TAVILY_API_KEY", "tvly-test"))
+    module = importlib.import_module("backend.research_chain")
+    keys = module.APIKeyManager(["gsk_slow_key", "gsk_fast_key"])
+    scheduler = AdmissionScheduler(per_key=2)
+    scheduler.healthy_keys = keys.healthy_count
+    monkeypatch.setattr(module, "key_manager", keys)
+    monkeypatch.setattr(module, "admission", scheduler)
+    return module
+
+def fake_models(calls):
+    def get_chat_model(key=None, node=None):
+        async def reply(prompt_value):
+            calls.append(key)
+            await asyncio.sleep(0.3 if "slow" in key else 0.01)
+            return AIMessage(content=f"answer from {key}")
+        return RunnableLambda(reply)
+    return get_chat_model
+
+def test_slow_call_is_hedged_on_another_key(research_chain, monkeypatch):
+    calls = []
+    policy = HedgePolicy(enabled=True, min_samples=1, max_extra_load=1.0, nodes={"analyst"})
+    policy.record_latency("analyst", 0.05)
+    monkeypatch.setattr(research_chain, "hedge_policy", policy)
+    monkeypatch.setattr(research_chain, "get_chat_model", fake_models(calls))
+    # The slow key is picked first
+    research_chain.key_manager.state["gsk_fast_key"]["in_flight"] = 1
+
+    prompt = PromptTemplate.from_template("Analyse {topic}")
+    content = asyncio.run(research_chain._invoke_chain(prompt, {"topic": "solar"}, node="analyst"))
+
+    assert content == "answer from gsk_fast_key"
+    assert calls == ["gsk_slow_key", "gsk_fast_key"]
+    assert policy.stats()["counts"]["analyst"] == {"fired": 1, "won": 1, "capped": 0}
+    assert research_chain.key_manager.state["gsk_slow_key"]["in_flight"] == 0
+    assert research_chain.admission.active == 0
+
+def test_hedging_never_exceeds_the_load_cap(research_chain, monkeypatch):
+    calls = []
+    policy = HedgePolicy(enabled=True, min_samples=1, max_extra_load=0.0, nodes={"analyst"})
+    policy.record_latency("analyst", 0.05)
+    monkeypatch.setattr(research_chain, "hedge_policy", policy)
+    monkeypatch.setattr(research_chain, "get_chat_model", fake_models(calls))
+    research_chain.key_manager.state["gsk_fast_key"]["in_flight"] = 1
+
+    prompt = PromptTemplate.from_template("Analyse {topic}")
+    asyncio.run(research_chain._invoke_chain(prompt, {"topic": "wind"}, node="analyst"))
+
+    assert len(calls) == 1
+    assert policy.stats()["counts"]["analyst"]["capped"] == 1
@@ -0,0 +1,125 @@
+import os
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import backend.main as main
+from backend import job_worker
+from backend.database import Base, ResearchJob
+from backend.single_flight import DatabaseLock
+
+TEST_DATABASE_URL = "sqlite:///./test_job_worker.db"
+
+engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def jobs_db(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(job_worker, "SessionLocal", TestingSessionLocal)
+    yield
+    engine.dispose()
+    if os.path.exists("./test_job_worker.db"):
+        os.remove("./test_job_worker.db")
+
+def heartbeat_of(job_id):
+    db = TestingSessionLocal()
+    try:
+        return db.query(ResearchJob).filter(ResearchJob.id == job_id).first().heartbeat_at
+    finally:
+        db.close()
+
+def test_a_long_silent_step_keeps_the_job_alive(jobs_db, monkeypatch):
+    long_ago = datetime.utcnow() - timedelta(hours=1)
+    db = TestingSessionLocal()
+    db.add(ResearchJob(id="slow", query="Tidal power", status="running", worker="worker-a", attempts=1, heartbeat_at=long_ago, created_at=long_ago))
+    db.commit()
+    db.close()
+    monkeypatch.setattr(job_worker, "HEARTBEAT_SECONDS", 0.05)
+    beats = []
+
+    async def silent_stream(req, db):
+        # One slow LLM call: no events at all for several heartbeat periods
+        await asyncio.sleep(0.3)
+        beats.append(heartbeat_of("slow"))
+        yield "result", {"report": "tidal report"}
+
+    async def fake_response(req, output, user, db):
+        return SimpleNamespace(model_dump_json=lambda: '{"result": "tidal report"}')
+
+    monkeypatch.setattr(main, "stream_research_once", silent_stream)
+    monkeypatch.setattr(main, "build_research_response", fake_response)
+    asyncio.run(job_worker.run_job("slow", "worker-a"))
+
+    assert beats[0] > long_ago + timedelta(minutes=59)
+    # The heartbeat stops with the job, and never touches a finished row
+    finished = heartbeat_of("slow")
+    job_worker.write_heartbeat("slow", "worker-a")
+    assert heartbeat_of("slow") == finished
+
+def test_a_worker_that_lost_its_job_does_not_overwrite_it(jobs_db, monkeypatch):
+    db = TestingSessionLocal()
+    db.add(ResearchJob(id="contested", query="Wave power", status="running", worker="worker-a", attempts=1,
+                       heartbeat_at=datetime.utcnow(), created_at=datetime.utcnow()))
+    db.commit()
+    db.close()
+
+    async def stream_then_lose_the_job(req, db):
+        # Meanwhile the job was declared stale, requeued and claimed by worker-b
+        requeued = TestingSessionLocal()
+        requeued.query(ResearchJob).filter(ResearchJob.id == "contested").update({ResearchJob.worker: "worker-b"})
+        requeued.commit()
+        requeued.close()
+        yield "progress", {"node": "writer", "status": "started"}
+        yield "result", {"report": "late report"}
+
+    async def fake_response(req, output, user, db):
+        return SimpleNamespace(model_dump_json=lambda: '{"result": "late report"}')
+
+    monkeypatch.setattr(main, "stream_research_once", stream_then_lose_the_job)
+    monkeypatch.setattr(main, "build_research_response", fake_response)
+    asyncio.run(job_worker.run_job("contested", "worker-a"))
+
+    db = TestingSessionLocal()
+    job = db.query(ResearchJob).filter(ResearchJob.id == "contested").first()
+    assert (job.status, job.worker, job.result, job.progress) == ("running", "worker-b", None, None)
+    db.close()
+
+def test_only_one_api_worker_runs_the_embedded_job_loop(jobs_db, monkeypatch):
+    running = []
+
+    async def fake_worker_loop(worker_id, concurrency=job_worker.JOB_WORKER_CONCURRENCY):
+        running.append(worker_id)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            running.remove(worker_id)
+
+    monkeypatch.setattr(job_worker, "worker_loop", fake_worker_loop)
+
+    async def run():
+        # Three gunicorn workers start the embedded loop at once
+        loops = {name: asyncio.create_task(job_worker.embedded_worker_loop(
+                     name, DatabaseLock(ttl=0.3, session_factory=TestingSessionLocal)))
+                 for name in ("api-1", "api-2", "api-3")}
+        await asyncio.sleep(0.5)
+        assert len(running) == 1
+        leader = running[0]
+
+        # The leader keeps renewing its lease, so nobody else starts in the meantime
+        await asyncio.sleep(0.5)
+        assert running == [leader]
+
+        loops.pop(leader).cancel()
+        await asyncio.sleep(0.5)
+        assert len(running) == 1 and running[0] != leader
+
+        for task in loops.values():
+            task.cancel()
+        await asyncio.gather(*loops.values(), return_exceptions=True)
+
+    asyncio.run(run())
+    assert running == []
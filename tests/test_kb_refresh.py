@@ -0,0 +1,135 @@
+import os
+import asyncio
+import importlib
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import backend.main as main
+from backend import kb_refresh
+from backend.admission import AdmissionScheduler, priority_override
+from backend.database import Base, KnowledgeBase, get_db
+from backend.rate_limiter import RateLimiter, MemoryStore
+
+TEST_DATABASE_URL = "sqlite:///./test_kb_refresh.db"
+
+engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def stale_entry(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", os.getenv("GROQ_API_KEY", "gsk_test"))
+    monkeypatch.setenv("TAVILY_API_KEY", os.getenv("TAVILY_API_KEY", "tvly-test"))
+    monkeypatch.setattr(kb_refresh, "research_lock", None)
+    monkeypatch.setattr(kb_refresh, "sync_to_local", lambda obj: None)
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    entry = KnowledgeBase(query="Lithium prices", slug="lithium-prices", content="old report",
+                          refreshed_at=datetime.utcnow() - timedelta(days=3), ttl_seconds=86400)
+    db.add(entry)
+    db.commit()
+    entry_id = entry.id
+    db.close()
+    yield entry_id
+    engine.dispose()
+    if os.path.exists("./test_kb_refresh.db"):
+        os.remove("./test_kb_refresh.db")
+
+def load(entry_id):
+    db = TestingSessionLocal()
+    try:
+        return db.query(KnowledgeBase).filter(KnowledgeBase.id == entry_id).first()
+    finally:
+        db.close()
+
+def test_ttl_follows_the_topic_and_staleness_the_ttl():
+    assert kb_refresh.topic_for("Latest solar news") == "news"
+    assert kb_refresh.topic_for("Lithium carbonate prices") == "markets"
+    assert kb_refresh.topic_for("EU renewable energy subsidies") == "policy"
+    assert kb_refresh.topic_for("How do heat pumps work") == "default"
+    assert kb_refresh.ttl_for("Lithium carbonate prices") < kb_refresh.ttl_for("How do heat pumps work")
+
+    now = datetime.utcnow()
+    fresh = SimpleNamespace(query="How do heat pumps work", refreshed_at=None, timestamp=now - timedelta(days=2), ttl_seconds=None)
+    assert not kb_refresh.is_stale(fresh, now)
+    assert kb_refresh.is_stale(SimpleNamespace(query="Lithium prices", refreshed_at=now - timedelta(days=2), timestamp=None, ttl_seconds=None), now)
+
+def test_stale_hits_are_served_at_once_and_refreshed_in_the_background(stale_entry, monkeypatch):
+    def override_get_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setitem(main.app.dependency_overrides, get_db, override_get_db)
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter(store=MemoryStore()))
+    monkeypatch.setattr(main, "request_backfill", lambda entry_id: None)
+    requested = []
+    monkeypatch.setattr(main.kb_refresh, "request_refresh", requested.append)
+
+    response = TestClient(main.app).post("/research", json={"query": "lithium prices"})
+    assert response.json()["file_path"] == "cache"
+    assert response.json()["result"] == "old report"
+    assert requested == [stale_entry]
+
+def test_refresh_swaps_in_the_new_report_at_background_priority(stale_entry, monkeypatch):
+    research_chain = importlib.import_module("backend.research_chain")
+    priorities = []
+
+    async def fake_research(query, thread_id=None):
+        priorities.append(priority_override.get())
+        return {"report": f"new report on {query}", "suggestions": ["Next?"], "is_relevant": True}
+
+    monkeypatch.setattr(research_chain, "run_full_research", fake_research)
+    asyncio.run(kb_refresh.refresh_entry(stale_entry, session_factory=TestingSessionLocal))
+
+    entry = load(stale_entry)
+    assert entry.content == "new report on Lithium prices"
+    assert entry.suggestions == '["Next?"]'
+    assert not kb_refresh.is_stale(entry)
+    assert priorities == ["background"]
+    # The override stayed with the refresh run
+    assert priority_override.get() is None
+
+def test_a_refresh_without_suggestions_stores_an_empty_list(stale_entry, monkeypatch):
+    research_chain = importlib.import_module("backend.research_chain")
+
+    async def no_suggestions(query, thread_id=None):
+        return {"report": "new report", "suggestions": [], "is_relevant": True}
+
+    monkeypatch.setattr(research_chain, "run_full_research", no_suggestions)
+    asyncio.run(kb_refresh.refresh_entry(stale_entry, session_factory=TestingSessionLocal))
+    # "[]" rather than None, so the suggestions backfill leaves the entry alone
+    assert load(stale_entry).suggestions == "[]"
+
+def test_refusals_do_not_replace_a_stored_report(stale_entry, monkeypatch):
+    research_chain = importlib.import_module("backend.research_chain")
+
+    async def refused(query, thread_id=None):
+        return {"report": "Not energy related", "is_relevant": False}
+
+    monkeypatch.setattr(research_chain, "run_full_research", refused)
+    asyncio.run(kb_refresh.refresh_entry(stale_entry, session_factory=TestingSessionLocal))
+    assert load(stale_entry).content == "old report"
+
+def test_refreshes_wait_for_spare_llm_capacity(monkeypatch):
+    scheduler = AdmissionScheduler(per_key=2)
+    monkeypatch.setattr(kb_refresh, "admission", scheduler)
+    started = []
+    monkeypatch.setattr(kb_refresh, "refresh_entry", lambda entry_id: started.append(entry_id) or asyncio.sleep(0))
+
+    async def run():
+        scheduler.active = 1
+        assert not kb_refresh.request_refresh(1)
+        scheduler.active = 0
+        assert kb_refresh.request_refresh(1)
+        assert not kb_refresh.request_refresh(1)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert started == [1]
+    assert not kb_refresh._refreshing
@@ -0,0 +1,108 @@
+import os
+import asyncio
+import importlib
+import pytest
+from langchain_core.prompts import PromptTemplate
+
+@pytest.fixture
+def research_chain(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", os.getenv("GROQ_API_KEY", "gsk_test"))
+    monkeypatch.setenv("TAVILY_API_KEY", os.getenv("TAVILY_API_KEY", "tvly-test"))
+    return importlib.import_module("backend.research_chain")
+
+@pytest.fixture
+def clock(research_chain, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(research_chain.time, "monotonic", lambda: now[0])
+    return now
+
+def test_reset_headers_are_parsed(research_chain):
+    parse = research_chain.parse_reset_duration
+    assert parse("1m30s") == 90
+    assert parse("2m59.56s") == pytest.approx(179.56)
+    assert parse("250ms") == pytest.approx(0.25)
+    assert parse("12") == 12
+    assert parse("1h") == 3600
+    assert parse(None) is None
+    assert parse("soon") is None
+    assert parse("") is None
+
+def test_rate_limited_key_cools_down_and_recovers(research_chain, clock):
+    manager = research_chain.APIKeyManager(["gsk_key_a", "gsk_key_b"])
+    manager.record_rate_limit("gsk_key_a", {"retry-after": "30"})
+    assert manager.healthy_count() == 1
+    assert manager.get_key() == "gsk_key_b"
+
+    manager.record_rate_limit("gsk_key_b", {"x-ratelimit-reset-requests": "1m"})
+    assert manager.healthy_count() == 0
+    assert manager.cooldown_remaining() == 30
+    # Nothing healthy: the key that recovers first
+    assert manager.get_key() == "gsk_key_a"
+
+    clock[0] += 31
+    assert manager.healthy_count() == 1
+    assert manager.cooldown_remaining() == 0
+    assert manager.get_key() == "gsk_key_a"
+    clock[0] += 30
+    assert manager.healthy_count() == 2
+
+def test_exhausted_budget_headers_park_a_key(research_chain, clock):
+    manager = research_chain.APIKeyManager(["gsk_key_a", "gsk_key_b"])
+    manager.record_headers("gsk_key_a", {"x-ratelimit-limit-tokens": "6000", "x-ratelimit-remaining-tokens": "500",
+                                         "x-ratelimit-reset-tokens": "7.5s"})
+    assert manager.healthy_count() == 1
+    clock[0] += 8
+    assert manager.healthy_count() == 2
+
+def test_least_loaded_healthy_key_is_chosen(research_chain, clock):
+    manager = research_chain.APIKeyManager(["gsk_key_a", "gsk_key_b", "gsk_key_c"])
+    manager.begin("gsk_key_a")
+    manager.begin("gsk_key_b")
+    assert manager.get_key() == "gsk_key_c"
+    manager.begin("gsk_key_c")
+    manager.end("gsk_key_a")
+    assert manager.get_key() == "gsk_key_a"
+    # Same in-flight count: the key with more of its budget left wins
+    manager.end("gsk_key_b")
+    manager.end("gsk_key_c")
+    manager.record_headers("gsk_key_a", {"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "10"})
+    manager.record_headers("gsk_key_b", {"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "90"})
+    manager.record_headers("gsk_key_c", {"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "50"})
+    assert manager.get_key() == "gsk_key_b"
+    assert manager.get_key(exclude=("gsk_key_b",)) == "gsk_key_c"
+
+def test_budgets_and_cooldowns_are_tracked_per_model(research_chain, clock):
+    large, fast = research_chain.LARGE_MODEL, research_chain.FAST_MODEL
+    manager = research_chain.APIKeyManager(["gsk_key_a", "gsk_key_b"])
+    # An exhausted 70B budget is not masked by a healthy 8B response on the same key
+    manager.record_headers("gsk_key_a", {"x-ratelimit-limit-tokens": "6000", "x-ratelimit-remaining-tokens": "100",
+                                         "x-ratelimit-reset-tokens": "20s"}, model=large)
+    manager.record_headers("gsk_key_a", {"x-ratelimit-limit-tokens": "30000", "x-ratelimit-remaining-tokens": "29000"}, model=fast)
+    assert manager.get_key(model=large) == "gsk_key_b"
+    assert manager.healthy_count(large) == 1
+
+    # A 70B 429 leaves the key usable for 8B calls
+    manager.record_rate_limit("gsk_key_b", {"retry-after": "30"}, model=large)
+    assert manager.healthy_count(large) == 0
+    assert manager.cooldown_remaining(large) == 20
+    assert manager.healthy_count(fast) == 2
+    assert manager.cooldown_remaining(fast) == 0
+    assert manager.stats()["keys"][0]["models"][fast]["remaining_tokens"] == 29000
+
+def test_groq_responses_are_attributed_to_the_requested_model(research_chain, monkeypatch):
+    import httpx
+    manager = research_chain.APIKeyManager(["gsk_key_a"])
+    monkeypatch.setattr(research_chain, "key_manager", manager)
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions",
+                            headers={"authorization": "Bearer gsk_key_a"},
+                            json={"model": research_chain.FAST_MODEL, "messages": []})
+    response = httpx.Response(200, request=request, headers={"x-ratelimit-remaining-requests": "7"})
+    asyncio.run(research_chain._track_groq_response(response))
+    assert manager.budgets[("gsk_key_a", research_chain.FAST_MODEL)]["remaining_requests"] == 7
+    assert ("gsk_key_a", research_chain.LARGE_MODEL) not in manager.budgets
+
+def test_missing_key_fails_with_a_clear_error(research_chain, monkeypatch):
+    monkeypatch.setattr(research_chain, "key_manager", research_chain.APIKeyManager([]))
+    prompt = PromptTemplate.from_template("Analyse {topic}")
+    with pytest.raises(research_chain.NoAPIKeyError, match="GROQ_API_KEY"):
+        asyncio.run(research_chain.invoke_chain_with_retry(prompt, {"topic": "solar"}, node="writer"))
@@ -0,0 +1,46 @@
+from langchain_core.prompts import PromptTemplate
+
+from backend.llm_cache import LLMResponseCache, response_key
+
+PROMPT = PromptTemplate.from_template("Summarize: {text}")
+SETTINGS = {"model": "llama-3.3-70b-versatile", "temperature": 0.3, "max_tokens": 4096}
+
+def test_key_covers_template_inputs_and_model_settings():
+    key = response_key(PROMPT, {"text": "solar"}, SETTINGS)
+    assert key == response_key(PROMPT, {"text": "solar"}, dict(SETTINGS))
+    assert key != response_key(PROMPT, {"text": "wind"}, SETTINGS)
+    assert key != response_key(PromptTemplate.from_template("Critique: {text}"), {"text": "solar"}, SETTINGS)
+    assert key != response_key(PROMPT, {"text": "solar"}, {**SETTINGS, "temperature": 0.7})
+    assert key != response_key(PROMPT, {"text": "solar"}, {**SETTINGS, "model": "llama-3.1-8b-instant"})
+
+def test_hit_rates_are_reported_per_node():
+    cache = LLMResponseCache()
+    assert cache.get("a", node="analyst") is None
+    cache.set("a", "analysis")
+    assert cache.get("a", node="analyst") == "analysis"
+    assert cache.get("b", node="reviewer") is None
+    nodes = cache.stats()["nodes"]
+    assert nodes["analyst"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+    assert nodes["reviewer"]["hit_rate"] == 0.0
+
+def test_size_bound_evicts_least_recently_used():
+    cache = LLMResponseCache(max_bytes=10)
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    cache.get("a")
+    cache.set("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.stats()["bytes"] <= 10
+    assert cache.stats()["evictions"] == 1
+    cache.set("huge", "x" * 11)
+    assert cache.get("huge") is None
+
+def test_entries_expire_and_nodes_can_opt_out():
+    cache = LLMResponseCache(ttl=0, skip_nodes={"writer"})
+    cache.set("a", "text")
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+    assert not cache.enabled_for("writer")
+    assert cache.enabled_for("analyst")
+    assert not LLMResponseCache(enabled=False).enabled_for("analyst")
@@ -0,0 +1,141 @@
+import os
+import threading
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import rate_limiter as rate_limiter_module
+from backend.rate_limiter import RateLimiter, RateLimitExceeded, MemoryStore, SQLStore, load_limits
+from backend.database import Base
+
+TEST_DATABASE_URL = "sqlite:///./test_rate_limits.db"
+
+engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+LIMITS = {"research": {"global": (5, 60), "ip": (2, 60)}}
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_040.0]  # 20s into a 60s window
+    monkeypatch.setattr(rate_limiter_module.time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture
+def sql_store():
+    Base.metadata.create_all(bind=engine)
+    yield SQLStore(session_factory=TestingSessionLocal)
+    engine.dispose()
+    if os.path.exists("./test_rate_limits.db"):
+        os.remove("./test_rate_limits.db")
+
+def test_limit_per_ip_with_retry_after(clock):
+    limiter = RateLimiter(store=MemoryStore(), limits=LIMITS)
+    for _ in range(2):
+        limiter.check("research", {"global": "all", "ip": "1.1.1.1"})
+        limiter.hit("research", {"global": "all", "ip": "1.1.1.1"})
+
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        limiter.check("research", {"global": "all", "ip": "1.1.1.1"})
+    assert exceeded.value.scope == "ip"
+    # 40s left in this window, then the carried-over count has already decayed under the limit
+    assert exceeded.value.retry_after == 40
+    # Other IPs are unaffected
+    limiter.check("research", {"global": "all", "ip": "2.2.2.2"})
+    assert limiter.stats()["rejected"] == {"research:ip": 1}
+
+def test_previous_window_is_weighted_by_overlap(clock):
+    limiter = RateLimiter(store=MemoryStore(), limits=LIMITS)
+    limiter.hit("research", {"ip": "1.1.1.1"})
+    limiter.hit("research", {"ip": "1.1.1.1"})
+
+    clock[0] += 60  # next window, 20s in: previous counts 2/3 -> 1.33 < 2
+    limiter.check("research", {"ip": "1.1.1.1"})
+    limiter.hit("research", {"ip": "1.1.1.1"})
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        limiter.check("research", {"ip": "1.1.1.1"})
+    # 1 + 2 * (1 - t/60) < 2 once t > 30s, i.e. 10s from now
+    assert exceeded.value.retry_after == 10
+
+    clock[0] += 11
+    limiter.check("research", {"ip": "1.1.1.1"})
+
+def test_counters_expire(clock):
+    store = MemoryStore()
+    limiter = RateLimiter(store=store, limits=LIMITS)
+    limiter.hit("research", {"ip": "1.1.1.1"})
+    limiter.hit("research", {"ip": "1.1.1.1"})
+    clock[0] += 120
+    limiter.check("research", {"ip": "1.1.1.1"})
+    assert store.get_many(["research:ip:1.1.1.1:16667"]) == {}
+
+def test_sql_store_is_shared_between_limiters(clock, sql_store):
+    # Two limiters on one database stand in for two API workers
+    first = RateLimiter(store=sql_store, limits=LIMITS)
+    second = RateLimiter(store=SQLStore(session_factory=TestingSessionLocal), limits=LIMITS)
+    first.hit("research", {"ip": "1.1.1.1"})
+    second.hit("research", {"ip": "1.1.1.1"})
+    with pytest.raises(RateLimitExceeded):
+        first.check("research", {"ip": "1.1.1.1"})
+
+def test_concurrent_hits_cannot_both_take_the_last_slot(clock, sql_store):
+    # Every worker passed the read-only check at 1 of 2; only one may be counted
+    limiter = RateLimiter(store=sql_store, limits=LIMITS)
+    limiter.hit("research", {"ip": "1.1.1.1"})
+    limiter.check("research", {"ip": "1.1.1.1"})
+    outcomes = []
+    barrier = threading.Barrier(4)
+
+    def worker():
+        worker_limiter = RateLimiter(store=SQLStore(session_factory=TestingSessionLocal), limits=LIMITS)
+        barrier.wait()
+        try:
+            worker_limiter.hit("research", {"ip": "1.1.1.1"})
+            outcomes.append("counted")
+        except RateLimitExceeded:
+            outcomes.append("rejected")
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(outcomes) == ["counted", "rejected", "rejected", "rejected"]
+    # Rejected hits were taken back, so the counter holds exactly the limit
+    assert sql_store.get_many(["research:ip:1.1.1.1:16667"]) == {"research:ip:1.1.1.1:16667": 2}
+
+def test_signed_in_users_still_count_against_their_ip(clock, monkeypatch):
+    from backend import main
+    from fastapi import HTTPException
+    limiter = RateLimiter(store=MemoryStore(), limits={"research": {"ip": (2, 60), "user": (5, 60)}})
+    monkeypatch.setattr(main, "rate_limiter", limiter)
+    # Two accounts behind one address share its IP quota
+    main.record_research_request("1.1.1.1", SimpleNamespace(id=1))
+    main.record_research_request("1.1.1.1", SimpleNamespace(id=2))
+    with pytest.raises(HTTPException) as exceeded:
+        main.record_research_request("1.1.1.1", SimpleNamespace(id=3))
+    assert exceeded.value.status_code == 429
+    assert exceeded.value.headers["Retry-After"] == "40"
+    assert main.rate_limit_identities("1.1.1.1", SimpleNamespace(id=3)) == {"global": "all", "ip": "1.1.1.1", "user": "3"}
+
+def test_store_errors_fail_open(clock):
+    class BrokenStore:
+        def get_many(self, keys):
+            raise ConnectionError("down")
+        def incr(self, key, ttl):
+            raise ConnectionError("down")
+
+    limiter = RateLimiter(store=BrokenStore(), limits=LIMITS)
+    for _ in range(5):
+        limiter.hit("research", {"ip": "1.1.1.1"})
+        limiter.check("research", {"ip": "1.1.1.1"})
+    assert limiter.stats()["store_errors"] == 10
+
+def test_limits_can_be_overridden_per_route_and_tier(monkeypatch):
+    monkeypatch.setenv("RATE_LIMITS", '{"research": {"user": "30/60"}, "research_jobs": {"ip": "3/300"}}')
+    limits = load_limits()
+    assert limits["research"]["user"] == (30, 60)
+    assert limits["research"]["ip"] == (10, 60)
+    assert limits["research_jobs"]["ip"] == (3, 300)
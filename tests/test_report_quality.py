@@ -0,0 +1,36 @@
+from backend.report_quality import REPORT_SECTIONS, check_report, extract_headings
+
+def make_report(sections=None, words_per_section=260, numbers_per_section=6, heading="## {i}. {title}"):
+    sections = sections if sections is not None else [title for title, _, _ in REPORT_SECTIONS]
+    parts = []
+    for i, title in enumerate(sections, start=1):
+        figures = " ".join(f"capacity reached {40 + n}.5 GW in {2015 + n}" for n in range(numbers_per_section // 2))
+        filler = " ".join(["energy"] * (words_per_section - len(figures.split())))
+        parts.append(heading.format(i=i, title=title) + "\n\n" + figures + " " + filler)
+    return "\n\n".join(parts)
+
+def test_complete_dense_report_passes_without_llm():
+    result = check_report(make_report())
+    assert result["verdict"] == "PASS"
+    assert result["missing_sections"] == []
+
+def test_missing_sections_fail_with_precise_feedback():
+    sections = [title for title, _, _ in REPORT_SECTIONS if title not in ("Strategic SWOT Analysis", "Case Studies & Real-world Implementations")]
+    result = check_report(make_report(sections, words_per_section=300))
+    assert result["verdict"] == "FAIL"
+    assert "Strategic SWOT Analysis" in result["feedback"]
+    assert "Case Studies & Real-world Implementations" in result["feedback"]
+
+def test_short_report_fails():
+    result = check_report(make_report(words_per_section=60))
+    assert result["verdict"] == "FAIL"
+    assert "words" in result["feedback"]
+
+def test_borderline_report_goes_to_llm_reviewer():
+    result = check_report(make_report(words_per_section=180, numbers_per_section=2))
+    assert result["verdict"] == "REVIEW"
+
+def test_bold_numbered_headings_are_recognised():
+    report = make_report(heading="{i}. **{title}**")
+    assert len(extract_headings(report)) == len(REPORT_SECTIONS)
+    assert check_report(report)["missing_sections"] == []
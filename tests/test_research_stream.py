@@ -0,0 +1,341 @@
+import os
+import asyncio
+import importlib
+import itertools
+import json
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+import backend.main as main
+from backend.database import Base, get_db
+from backend.search_cache import SearchCache
+from backend.semantic_cache import SemanticQueryIndex
+from backend.rate_limiter import RateLimiter, MemoryStore
+from backend.domain_classifier import DomainClassifier
+from backend.llm_cache import LLMResponseCache
+
+TEST_DATABASE_URL = "sqlite:///./test_stream.db"
+
+engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+class FakeSearch:
+    max_results = 10
+
+    def run(self, query):
+        return {"results": [{"url": "https://example.com", "content": "Solar capacity grew 30% in 2025."}]}
+
+    invoke = run
+
+@pytest.fixture(autouse=True)
+def fake_backends(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", os.getenv("GROQ_API_KEY", "gsk_test"))
+    monkeypatch.setenv("TAVILY_API_KEY", os.getenv("TAVILY_API_KEY", "tvly-test"))
+    research_chain = importlib.import_module("backend.research_chain")
+
+    if os.path.exists("./test_stream.db"):
+        os.remove("./test_stream.db")
+    Base.metadata.create_all(bind=engine)
+
+    fake_reply = AIMessage(content="YES PASS solar report")
+    monkeypatch.setattr(research_chain, "get_chat_model", lambda key=None, **kwargs: GenericFakeChatModel(messages=itertools.repeat(fake_reply)))
+    monkeypatch.setattr(research_chain, "search_tool", FakeSearch())
+    monkeypatch.setattr(research_chain, "search_cache", SearchCache(session_factory=TestingSessionLocal))
+    monkeypatch.setattr(research_chain, "REVIEW_GATE_MODE", "off")
+    monkeypatch.setattr(research_chain.memory, "session_factory", TestingSessionLocal)
+    monkeypatch.setattr(research_chain.memory, "_tables_ready", False)
+    research_chain.memory.hot.clear()
+    monkeypatch.setattr(research_chain, "domain_classifier", DomainClassifier(session_factory=TestingSessionLocal))
+    monkeypatch.setattr(research_chain, "llm_cache", LLMResponseCache())
+    monkeypatch.setattr(main, "save_result_to_file", lambda query, result: "test")
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter(store=MemoryStore()))
+    monkeypatch.setattr(main, "semantic_index", SemanticQueryIndex())
+
+    previous = main.app.dependency_overrides.get(get_db)
+    main.app.dependency_overrides[get_db] = override_get_db
+    yield
+    if previous:
+        main.app.dependency_overrides[get_db] = previous
+    else:
+        main.app.dependency_overrides.pop(get_db, None)
+    engine.dispose()
+    if os.path.exists("./test_stream.db"):
+        os.remove("./test_stream.db")
+
+def read_events(response):
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_stream_emits_progress_tokens_and_result():
+    client = TestClient(main.app)
+    response = client.post("/research/stream", json={"query": "Solar outlook", "thread_id": "stream-test"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = read_events(response)
+    started = [data["node"] for event, data in events if event == "progress" and data["status"] == "started"]
+    assert started[1:] == ["gatekeeper", "researcher", "analyst", "writer", "reviewer", "suggester"]
+    tokens = "".join(data["text"] for event, data in events if event == "token")
+    assert tokens == "YES PASS solar report"
+    assert events[-1][0] == "result"
+    assert events[-1][1]["result"] == "YES PASS solar report"
+
+def test_stream_serves_cache_hits_without_running_graph(monkeypatch):
+    client = TestClient(main.app)
+    client.post("/research/stream", json={"query": "Solar outlook", "thread_id": "stream-test"})
+
+    research_chain = importlib.import_module("backend.research_chain")
+    calls = []
+    monkeypatch.setattr(research_chain, "get_chat_model", lambda key=None, **kwargs: calls.append(key))
+
+    response = client.post("/research/stream", json={"query": "outlook solar"})
+    events = read_events(response)
+    assert [event for event, _ in events] == ["progress", "result"]
+    assert events[-1][1]["file_path"] == "cache"
+    # Suggestions are stored with the cached report, so a hit makes no LLM calls
+    assert events[-1][1]["suggestions"] == ["YES PASS solar report"]
+    assert calls == []
+
+def test_stream_serves_near_duplicate_queries_from_cache():
+    client = TestClient(main.app)
+    client.post("/research/stream", json={"query": "Solar LCOE in India 2024"})
+
+    response = client.post("/research/stream", json={"query": "India's solar levelized cost 2024"})
+    events = read_events(response)
+    assert events[-1][1]["file_path"] == "cache"
+
+def test_concurrent_identical_queries_share_one_run(monkeypatch):
+    research_chain = importlib.import_module("backend.research_chain")
+    runs = []
+
+    async def slow_run(query, thread_id=None):
+        runs.append(query)
+        await asyncio.sleep(0.3)
+        return {"report": "Shared wind report", "suggestions": [], "is_relevant": True}
+
+    monkeypatch.setattr(research_chain, "run_full_research", slow_run)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/research", json={"query": query})
+                for query in ["Wind power in Europe", "wind power in europe", "In Europe, wind power?"]
+            ))
+
+    responses = asyncio.run(scenario())
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert {r.json()["result"] for r in responses} == {"Shared wind report"}
+    assert len(runs) == 1
+
+def test_a_stream_leader_disconnecting_does_not_fail_its_followers(monkeypatch):
+    research_chain = importlib.import_module("backend.research_chain")
+
+    async def slow_stream(query, thread_id=None):
+        yield "progress", {"node": "gatekeeper", "status": "started"}
+        await asyncio.sleep(0.2)
+        yield "result", {"report": "Shared tidal report", "suggestions": [], "is_relevant": True}
+
+    monkeypatch.setattr(research_chain, "stream_full_research", slow_stream)
+
+    async def scenario():
+        db = TestingSessionLocal()
+        try:
+            leader = main.stream_research_once(main.ResearchRequest(query="Tidal power in Korea"), db)
+            assert (await leader.__anext__())[0] == "progress"
+            follower = asyncio.create_task(main.run_research_once(main.ResearchRequest(query="tidal power in korea"), db))
+            streaming_follower = main.stream_research_once(main.ResearchRequest(query="Tidal power in Korea?"), db)
+            assert (await streaming_follower.__anext__())[1]["node"] == "queue"
+
+            # The client that started the run goes away mid-stream
+            await leader.aclose()
+            streamed = [event async for event in streaming_follower]
+            return await follower, streamed
+        finally:
+            db.close()
+
+    output, streamed = asyncio.run(scenario())
+    assert output["report"] == "Shared tidal report"
+    assert streamed[-1] == ("result", output)
+
+def test_research_is_rejected_early_when_llm_queue_is_full(monkeypatch):
+    from backend.admission import AdmissionScheduler
+    full = AdmissionScheduler(max_queue_depth=0)
+    monkeypatch.setattr(main, "admission", full)
+
+    client = TestClient(main.app)
+    for path in ("/research", "/research/stream"):
+        response = client.post(path, json={"query": "Geothermal heat pumps"})
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) > 0
+    assert full.rejected == 2
+
+def test_each_node_asks_for_its_configured_model(monkeypatch):
+    research_chain = importlib.import_module("backend.research_chain")
+    nodes = []
+
+    def recording_model(key=None, node=None):
+        nodes.append(node)
+        return GenericFakeChatModel(messages=itertools.repeat(AIMessage(content="YES PASS solar report")))
+
+    monkeypatch.setattr(research_chain, "get_chat_model", recording_model)
+    monkeypatch.setattr(research_chain.domain_classifier, "mode", "off")
+    client = TestClient(main.app)
+    assert client.post("/research", json={"query": "Battery recycling economics"}).status_code == 200
+    assert {"gatekeeper", "researcher", "analyst", "writer", "suggester"} <= set(nodes)
+
+    assert research_chain.model_config("gatekeeper")["model"] == research_chain.FAST_MODEL
+    assert research_chain.model_config("gatekeeper")["max_tokens"] < 100
+    assert research_chain.model_config("writer")["model"] == research_chain.LARGE_MODEL
+    assert research_chain.model_config("unknown") == research_chain.DEFAULT_MODEL_CONFIG
+
+def test_repeated_llm_calls_are_served_from_the_response_cache(monkeypatch):
+    research_chain = importlib.import_module("backend.research_chain")
+    nodes = []
+
+    def recording_model(key=None, node=None):
+        nodes.append(node)
+        return GenericFakeChatModel(messages=itertools.repeat(AIMessage(content="YES PASS solar report")))
+
+    monkeypatch.setattr(research_chain, "get_chat_model", recording_model)
+    for _ in range(2):
+        output = asyncio.run(research_chain.run_full_research("Tidal power in Korea"))
+        assert output["report"]
+
+    # Second run: only the writer (opted out) goes back to the LLM
+    assert nodes.count("writer") == 2
+    assert nodes.count("analyst") == 1
+    assert research_chain.llm_cache.stats()["nodes"]["analyst"]["hits"] == 1
+
+def test_search_starts_alongside_the_gatekeeper_and_is_dropped_on_no(monkeypatch):
+    research_chain = importlib.import_module("backend.research_chain")
+    monkeypatch.setattr(research_chain.domain_classifier, "mode", "off")
+    monkeypatch.setattr(research_chain, "SPECULATIVE_MODE", "search")
+    monkeypatch.setattr(research_chain, "speculation_stats", {"started": 0, "used": 0, "wasted": 0})
+    searches = []
+    real_search = research_chain.search_web
+
+    async def counting_search(query):
+        searches.append(query)
+        return await real_search(query)
+
+    monkeypatch.setattr(research_chain, "search_web", counting_search)
+    output = asyncio.run(research_chain.run_full_research("Tidal power in Korea"))
+    assert output["is_relevant"]
+    # One fan-out, run once, from the speculative task
+    assert len(searches) == len(research_chain.SEARCH_FANOUT_ANGLES)
+    assert "Tidal power in Korea" in searches
+    assert research_chain.speculation_stats == {"started": 1, "used": 1, "wasted": 0}
+
+    refusing = GenericFakeChatModel(messages=itertools.repeat(AIMessage(content="NO")))
+    monkeypatch.setattr(research_chain, "get_chat_model", lambda key=None, **kwargs: refusing)
+    output = asyncio.run(research_chain.run_full_research("Cricket world cup schedule"))
+    assert not output["is_relevant"]
+    assert research_chain.speculation_stats == {"started": 2, "used": 1, "wasted": 1}
+    assert research_chain.speculative_runs == {}
+
+def test_rate_limited_research_gets_retry_after(monkeypatch):
+    limiter = RateLimiter(store=MemoryStore(), limits={"research": {"ip": (1, 60)}})
+    monkeypatch.setattr(main, "rate_limiter", limiter)
+
+    client = TestClient(main.app)
+    assert client.post("/research", json={"query": "Offshore wind capacity factors"}).status_code == 200
+    response = client.post("/research/stream", json={"query": "Hydrogen storage costs"})
+    assert response.status_code == 429
+    assert 0 < int(response.headers["Retry-After"]) <= 60
+
+def test_research_job_is_queued_then_run_by_a_worker(monkeypatch):
+    from backend import job_worker
+    monkeypatch.setattr(job_worker, "SessionLocal", TestingSessionLocal)
+
+    client = TestClient(main.app)
+    created = client.post("/research/jobs", json={"query": "Offshore wind in Japan"})
+    assert created.status_code == 202
+    job = created.json()
+    assert job["status"] == "queued"
+    assert job["queue_position"] == 1
+
+    job_id = job_worker.claim_next_job("test-worker")
+    assert job_id == job["job_id"]
+    assert job_worker.claim_next_job("other-worker") is None
+    asyncio.run(job_worker.run_job(job_id, "test-worker"))
+
+    finished = client.get(f"/research/jobs/{job_id}").json()
+    assert finished["status"] == "done"
+    assert finished["result"]["result"] == "YES PASS solar report"
+    assert any(event["node"] == "writer" for event in finished["progress"])
+
+    # The report is now cached, so the same question finishes without queueing
+    cached = client.post("/research/jobs", json={"query": "offshore wind in japan"}).json()
+    assert cached["status"] == "done"
+    assert cached["result"]["file_path"] == "cache"
+    assert client.get("/research/jobs/missing").status_code == 404
+
+def test_queued_jobs_hold_their_share_of_the_daily_limit(monkeypatch):
+    from backend.database import User
+    db = TestingSessionLocal()
+    user = User(username="queuer", email="queuer@example.com", hashed_password="x", chats_count=0)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_optional_user, lambda: user)
+    monkeypatch.setattr(main, "DAILY_RESEARCH_LIMIT", 2)
+
+    client = TestClient(main.app)
+    # No job finishes in between, so chats_count stays 0 throughout
+    assert client.post("/research/jobs", json={"query": "Tidal power"}).status_code == 202
+    assert client.post("/research/jobs", json={"query": "Wave power"}).status_code == 202
+    response = client.post("/research/jobs", json={"query": "Geothermal power"})
+    assert response.status_code == 429
+    # Only a reservation: the user is not locked out for the day
+    db.refresh(user)
+    assert user.limit_reached_at is None
+    db.close()
+
+def test_stale_running_jobs_are_requeued(monkeypatch):
+    from datetime import datetime, timedelta
+    from backend import job_worker
+    from backend.database import ResearchJob
+    monkeypatch.setattr(job_worker, "SessionLocal", TestingSessionLocal)
+
+    db = TestingSessionLocal()
+    long_ago = datetime.utcnow() - timedelta(hours=1)
+    db.add(ResearchJob(id="crashed", query="Tidal power", status="running", attempts=1, heartbeat_at=long_ago, created_at=long_ago))
+    db.add(ResearchJob(id="hopeless", query="Wave power", status="running", attempts=job_worker.JOB_MAX_ATTEMPTS, heartbeat_at=long_ago, created_at=long_ago))
+    db.commit()
+
+    job_worker.requeue_stale_jobs()
+    db.expire_all()
+    assert db.query(ResearchJob).filter(ResearchJob.id == "crashed").first().status == "queued"
+    assert db.query(ResearchJob).filter(ResearchJob.id == "hopeless").first().status == "failed"
+    db.close()
+
+def test_metrics_endpoint_reports_nodes_llm_calls_and_cache():
+    client = TestClient(main.app)
+    client.post("/research/stream", json={"query": "Battery storage economics"})
+    client.post("/research/stream", json={"query": "battery storage economics"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    for node in ("gatekeeper", "researcher", "analyst", "writer", "reviewer", "suggester"):
+        assert f'energymind_node_duration_seconds_count{{node="{node}"}}' in body
+    assert 'energymind_llm_calls_total{node="writer",outcome="ok"}' in body
+    assert 'energymind_knowledge_base_lookups_total{result="exact_hit"}' in body
+    assert "energymind_report_revisions_count" in body
@@ -0,0 +1,91 @@
+import asyncio
+import httpx
+import groq
+import pytest
+
+from backend.retry_policy import RetryPolicy, classify_error, retry_after
+
+def api_error(cls, status, message="error", headers=None):
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return cls(message, response=response, body=None)
+
+def test_errors_are_classified():
+    assert classify_error(api_error(groq.RateLimitError, 429)) == ("rate_limited", "rate_limited")
+    assert classify_error(api_error(groq.InternalServerError, 503)) == ("retryable", "server_error")
+    assert classify_error(api_error(groq.BadRequestError, 400, "Please reduce the length of the messages or completion. context_length_exceeded")) == ("fatal", "context_length")
+    assert classify_error(api_error(groq.AuthenticationError, 401)) == ("fatal", "auth")
+    assert classify_error(api_error(groq.BadRequestError, 400, "invalid model")) == ("fatal", "bad_request")
+    request = httpx.Request("POST", "https://api.groq.com")
+    assert classify_error(groq.APITimeoutError(request=request)) == ("retryable", "timeout")
+    assert classify_error(groq.APIConnectionError(request=request)) == ("retryable", "connection")
+    assert classify_error(KeyError("missing prompt variable")) == ("fatal", "invalid_request")
+    assert retry_after(api_error(groq.RateLimitError, 429, headers={"retry-after": "7"})) == 7.0
+
+class Flaky:
+    """Fails with the given errors in turn, then returns "ok"."""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.attempts = 0
+
+    async def __call__(self):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+def test_permanent_errors_fail_on_the_first_attempt():
+    policy = RetryPolicy(backoff_min=0)
+    call = Flaky(*[api_error(groq.BadRequestError, 400, "context_length_exceeded")] * 5)
+    with pytest.raises(groq.BadRequestError):
+        asyncio.run(policy.call(call, node="writer"))
+    assert call.attempts == 1
+    assert policy.stats()["reasons"]["context_length"]["gave_up"] == 1
+
+def test_transient_errors_are_retried_with_telemetry():
+    failures = []
+    policy = RetryPolicy(backoff_min=0.01, backoff_max=0.01)
+    policy.on_failure = lambda *event: failures.append(event[:3])
+    call = Flaky(api_error(groq.InternalServerError, 503), api_error(groq.InternalServerError, 502))
+    assert asyncio.run(policy.call(call, node="analyst")) == "ok"
+    assert call.attempts == 3
+    assert failures == [("analyst", "server_error", "retried")] * 2
+    assert policy.stats()["reasons"]["server_error"]["retried"] == 2
+
+def test_rate_limits_wait_for_retry_after():
+    slept = []
+    policy = RetryPolicy(backoff_min=5)
+
+    async def run():
+        real_sleep = asyncio.sleep
+
+        async def fake_sleep(seconds):
+            slept.append(seconds)
+            await real_sleep(0)
+
+        asyncio.sleep = fake_sleep
+        try:
+            call = Flaky(api_error(groq.RateLimitError, 429, headers={"retry-after": "1.5"}))
+            assert await policy.call(call) == "ok"
+            # With a key manager, its cooldown view decides instead (0: another key is free)
+            call = Flaky(api_error(groq.RateLimitError, 429, headers={"retry-after": "30"}))
+            assert await policy.call(call, rate_limit_wait=lambda: 0.0) == "ok"
+        finally:
+            asyncio.sleep = real_sleep
+
+    asyncio.run(run())
+    assert slept == [1.5, 0.0]
+
+def test_time_budget_stops_retries():
+    policy = RetryPolicy(budget=0.2, backoff_min=1)
+    call = Flaky(*[api_error(groq.InternalServerError, 500)] * 5)
+    with pytest.raises(groq.InternalServerError):
+        asyncio.run(policy.call(call))
+    assert call.attempts == 1
+    assert policy.stats()["reasons"]["server_error"]["gave_up"] == 1
+
+    async def hangs():
+        await asyncio.sleep(10)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(RetryPolicy(budget=0.05).call(hangs))
@@ -0,0 +1,133 @@
+import os
+import time
+import asyncio
+import importlib
+import pytest
+
+class SlowSearch:
+    max_results = 10
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def run(self, query):
+        time.sleep(self.delay)
+        return {"query": query, "results": [{"url": "https://example.com", "content": "ok"}]}
+
+    invoke = run
+
+class NoCache:
+    def get(self, query, **params):
+        return None
+
+    def set(self, query, results, **params):
+        pass
+
+@pytest.fixture
+def research_chain(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", os.getenv("GROQ_API_KEY", "gsk_test"))
+    monkeypatch.setenv("TAVILY_API_KEY", os.getenv("TAVILY_API_KEY", "tvly-test"))
+    module = importlib.import_module("backend.research_chain")
+    monkeypatch.setattr(module, "search_cache", NoCache())
+    return module
+
+def test_event_loop_keeps_running_during_search(research_chain, monkeypatch):
+    monkeypatch.setattr(research_chain, "search_tool", SlowSearch(delay=0.6))
+
+    async def scenario():
+        ticks = []
+
+        async def other_request():
+            # Stands in for /health or a cached /research hit on the same worker
+            for _ in range(5):
+                await asyncio.sleep(0.05)
+                ticks.append(time.monotonic())
+
+        start = time.monotonic()
+        search = asyncio.create_task(research_chain.search_web("solar"))
+        await other_request()
+        assert not search.done()
+        results = await search
+        return start, ticks, results
+
+    start, ticks, results = asyncio.run(scenario())
+    assert len(ticks) == 5
+    assert ticks[-1] - start < 0.5
+    assert results["results"][0]["content"] == "ok"
+
+def test_concurrent_searches_overlap(research_chain, monkeypatch):
+    monkeypatch.setattr(research_chain, "search_tool", SlowSearch(delay=0.3))
+
+    async def scenario():
+        start = time.monotonic()
+        await asyncio.gather(*(research_chain.search_web(f"query {i}") for i in range(3)))
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) < 0.8
+
+def test_search_timeout_returns_empty_results(research_chain, monkeypatch):
+    monkeypatch.setattr(research_chain, "search_tool", SlowSearch(delay=0.5))
+    monkeypatch.setattr(research_chain, "SEARCH_TIMEOUT", 0.1)
+
+    results = asyncio.run(research_chain.search_web("wind"))
+    assert results["results"] == []
+
+class AngleSearch:
+    """Each sub-query returns its own page plus one page every query shares."""
+    max_results = 10
+
+    def __init__(self, delay, slow_words=(), slow_delay=0.0, failing_words=()):
+        self.delay = delay
+        self.slow_words = slow_words
+        self.slow_delay = slow_delay
+        self.failing_words = failing_words
+
+    def run(self, query):
+        if any(word in query for word in self.failing_words):
+            raise RuntimeError(f"Tavily error for {query}")
+        slow = any(word in query for word in self.slow_words)
+        time.sleep(self.slow_delay if slow else self.delay)
+        return {"query": query, "results": [
+            {"url": f"https://example.com/{abs(hash(query))}", "content": f"Findings for {query}."},
+            {"url": "https://www.iea.org/report/", "content": "Shared IEA outlook."},
+            {"url": "https://mirror.example.org/iea", "content": "Shared   IEA outlook."},
+        ]}
+
+    invoke = run
+
+def test_fan_out_merges_angles_in_about_one_search_time(research_chain, monkeypatch):
+    monkeypatch.setattr(research_chain, "search_tool", AngleSearch(delay=0.3))
+
+    start = time.monotonic()
+    merged = asyncio.run(research_chain.search_angles("Solar in Chile"))
+    elapsed = time.monotonic() - start
+
+    angles = research_chain.SEARCH_FANOUT_ANGLES
+    assert elapsed < 0.3 * 2
+    # One page per angle, plus the shared page once (same URL and same content are both dropped)
+    assert len(merged["results"]) == len(angles) + 1
+    assert [doc["angle"] for doc in merged["results"][:len(angles)]] == angles
+
+def test_slow_sub_searches_are_dropped(research_chain, monkeypatch):
+    monkeypatch.setattr(research_chain, "search_tool", AngleSearch(delay=0.05, slow_words=("LCOE",), slow_delay=0.6))
+    monkeypatch.setattr(research_chain, "SEARCH_FANOUT_SECONDS", 0.2)
+
+    start = time.monotonic()
+    merged = asyncio.run(research_chain.search_angles("Wind in Texas"))
+    assert time.monotonic() - start < 0.5
+    assert "financial" not in {doc["angle"] for doc in merged["results"]}
+    assert "overview" in {doc["angle"] for doc in merged["results"]}
+
+def test_a_failing_sub_search_is_dropped(research_chain, monkeypatch):
+    monkeypatch.setattr(research_chain, "SEARCH_FANOUT_ANGLES", list(research_chain.SEARCH_ANGLES))
+    monkeypatch.setattr(research_chain, "search_tool", AngleSearch(delay=0.05, failing_words=("policy",)))
+
+    merged = asyncio.run(research_chain.search_angles("Hydrogen in Japan"))
+    angles = {doc["angle"] for doc in merged["results"]}
+    assert "policy" not in angles
+    assert angles == set(research_chain.SEARCH_ANGLES) - {"policy"}
+
+def test_search_fails_only_when_every_angle_fails(research_chain, monkeypatch):
+    monkeypatch.setattr(research_chain, "search_tool", AngleSearch(delay=0.05, failing_words=("Hydrogen",)))
+    with pytest.raises(RuntimeError, match="Tavily error"):
+        asyncio.run(research_chain.search_angles("Hydrogen in Japan"))
@@ -0,0 +1,118 @@
+import os
+import importlib
+import pytest
+from datetime import timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import backend.main as main
+from backend import cache as cache_module
+from backend import search_cache as search_cache_module
+from backend.database import Base, SearchCacheEntry
+from backend.search_cache import SearchCache
+
+TEST_DATABASE_URL = "sqlite:///./test_search_cache.db"
+
+engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+RESULTS = {"results": [{"url": "https://example.com/solar", "content": "Solar grew 30% in 2025."}]}
+
+@pytest.fixture
+def search_db():
+    Base.metadata.create_all(bind=engine)
+    yield
+    engine.dispose()
+    if os.path.exists("./test_search_cache.db"):
+        os.remove("./test_search_cache.db")
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+def age_rows(seconds: int):
+    db = TestingSessionLocal()
+    try:
+        for entry in db.query(SearchCacheEntry).all():
+            entry.created_at -= timedelta(seconds=seconds)
+        db.commit()
+    finally:
+        db.close()
+
+def row_count() -> int:
+    db = TestingSessionLocal()
+    try:
+        return db.query(SearchCacheEntry).count()
+    finally:
+        db.close()
+
+def test_entries_expire_after_the_ttl(search_db, clock):
+    cache = SearchCache(ttl=60, session_factory=TestingSessionLocal)
+    cache.set("Solar in India", RESULTS, max_results=10)
+    assert cache.get("solar in india", max_results=10) == RESULTS
+    # Different search params are a different entry
+    assert cache.get("solar in india", max_results=5) is None
+
+    clock[0] += 61
+    age_rows(61)
+    assert cache.get("solar in india", max_results=10) is None
+    assert (cache.memory_hits, cache.db_hits, cache.misses) == (1, 0, 2)
+
+def test_database_hits_repopulate_the_memory_tier(search_db, clock):
+    writer = SearchCache(ttl=60, session_factory=TestingSessionLocal)
+    writer.set("Wind in Texas", RESULTS, max_results=10)
+    age_rows(40)
+
+    # Another worker: empty memory tier, same table
+    reader = SearchCache(ttl=60, session_factory=TestingSessionLocal)
+    assert reader.get("wind in texas", max_results=10) == RESULTS
+    assert reader.get("wind in texas", max_results=10) == RESULTS
+    assert (reader.memory_hits, reader.db_hits, reader.misses) == (1, 1, 0)
+
+    # The copy only lives as long as the row had left (20s), not a full TTL
+    clock[0] += 21
+    assert reader.memory.get(reader.make_key("wind in texas", {"max_results": 10})) is None
+
+def test_memory_tier_evicts_and_database_tier_is_pruned(search_db, clock, monkeypatch):
+    monkeypatch.setattr(search_cache_module, "PRUNE_EVERY", 5)
+    cache = SearchCache(ttl=60, memory_entries=2, db_rows=3, session_factory=TestingSessionLocal)
+    for i in range(4):
+        cache.set(f"query {i}", RESULTS)
+    assert len(cache.memory) == 2
+    assert cache.memory.stats()["evictions"] == 2
+    assert row_count() == 4
+
+    # Rows past the TTL go first, then the oldest beyond db_rows
+    age_rows(120)
+    for i in range(4, 8):
+        cache.set(f"query {i}", RESULTS)
+    assert row_count() == 4  # expired rows dropped at the 5th write, three more written since
+
+    cache.set("query 8", RESULTS)
+    cache.set("query 9", RESULTS)  # 10th write: only the newest db_rows rows are kept
+    db = TestingSessionLocal()
+    try:
+        assert {e.query for e in db.query(SearchCacheEntry).all()} == {"query 7", "query 8", "query 9"}
+    finally:
+        db.close()
+
+def test_hits_and_misses_are_reported_in_stats(search_db, monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", os.getenv("GROQ_API_KEY", "gsk_test"))
+    monkeypatch.setenv("TAVILY_API_KEY", os.getenv("TAVILY_API_KEY", "tvly-test"))
+    importlib.import_module("backend.research_chain")
+    cache = SearchCache(ttl=60, session_factory=TestingSessionLocal)
+    monkeypatch.setattr(search_cache_module, "search_cache", cache)
+
+    cache.get("Hydrogen costs")
+    cache.set("Hydrogen costs", RESULTS)
+    cache.get("hydrogen costs")
+    cache.memory.clear()
+    cache.get("hydrogen costs")
+
+    stats = TestClient(main.app).get("/stats").json()["search_cache"]
+    assert (stats["memory_hits"], stats["db_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_rate"] == pytest.approx(0.667)
+    assert stats["ttl_seconds"] == 60
@@ -0,0 +1,59 @@
+from backend.search_compaction import (
+    compact_search_results,
+    count_tokens,
+    dedupe_documents,
+    extract_documents,
+    bm25_scores,
+    split_passages,
+)
+
+def filler(topic: str, sentences: int) -> str:
+    return " ".join(f"Sentence {i} talks about {topic} in some general way for padding." for i in range(sentences))
+
+def test_duplicate_results_collapse():
+    article = "Solar capacity in India grew 30 percent in 2025 as new parks in Rajasthan came online ahead of schedule."
+    results = {"results": [
+        {"url": "https://www.example.com/solar/", "title": "A", "content": article},
+        {"url": "https://example.com/solar", "title": "Same page", "content": "Different text, same URL."},
+        {"url": "https://mirror.org/copy", "title": "Copy", "content": article + " Shared by a mirror."},
+        {"url": "https://other.org/wind", "title": "Wind", "content": "Offshore wind auctions in Europe cleared record volumes."},
+    ]}
+    docs = dedupe_documents(extract_documents(results))
+    assert [doc["title"] for doc in docs] == ["A", "Wind"]
+
+    digest = compact_search_results("solar india", results)
+    assert digest.count("Solar capacity in India grew 30 percent") == 1
+
+def test_compacted_context_stays_within_the_token_budget():
+    # Distinct wording per source so none of them is dropped as a near copy
+    results = [{"url": f"https://site{i}.com", "title": f"Site {i}",
+                "content": " ".join(f"Grid topic note{i}x{j} covers region{j} and market{i * j}." for j in range(120))}
+               for i in range(10)]
+    assert len(dedupe_documents(extract_documents(results))) == 10
+    for budget in (150, 400, 1000):
+        digest = compact_search_results("topic", results, budget=budget)
+        passages = [line[2:] for line in digest.splitlines() if line.startswith("- ")]
+        assert passages
+        assert sum(count_tokens(p) + 2 for p in passages) <= budget
+
+def test_most_relevant_passages_are_kept():
+    relevant = "Battery storage costs fell to 150 dollars per kilowatt hour, making grid batteries cheaper than gas peakers."
+    results = [
+        {"url": "https://noise.com", "title": "Noise", "content": filler("football transfers", 20)},
+        {"url": "https://batteries.com", "title": "Batteries", "content": relevant},
+    ]
+    budget = count_tokens(relevant) + 10
+    digest = compact_search_results("battery storage costs", results, budget=budget)
+    assert relevant in digest
+    assert "football" not in digest
+
+    scores = bm25_scores("battery storage costs", [filler("football", 2), relevant])
+    assert scores[1] > scores[0] == 0
+
+def test_short_inputs_come_back_unchanged():
+    content = "Hydrogen electrolyser orders doubled in 2025. Most of them went to China."
+    digest = compact_search_results("hydrogen", [{"url": "https://h2.com", "title": "H2", "content": content}])
+    assert digest == f"[1] H2 (https://h2.com)\n- {content}"
+    assert split_passages(content) == [content]
+    assert compact_search_results("hydrogen", "plain text answer") == "[1] Web result\n- plain text answer"
+    assert compact_search_results("hydrogen", []) == "No web results available."
@@ -0,0 +1,63 @@
+import os
+import asyncio
+import importlib
+import pytest
+
+@pytest.fixture
+def research_chain(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", os.getenv("GROQ_API_KEY", "gsk_test"))
+    monkeypatch.setenv("TAVILY_API_KEY", os.getenv("TAVILY_API_KEY", "tvly-test"))
+    return importlib.import_module("backend.research_chain")
+
+class FakeSectionChain:
+    """Stands in for invoke_chain_with_retry: later sections finish first, chosen ones fail."""
+    def __init__(self, sections: int, failures: dict = None):
+        self.sections = sections
+        self.failures = dict(failures or {})  # section number -> failures left
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+
+    async def __call__(self, prompt, inputs, tags=None, node=None):
+        number = inputs["number"]
+        self.calls.append(number)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.01 * (self.sections - number))
+            if self.failures.get(number, 0) > 0:
+                self.failures[number] -= 1
+                raise RuntimeError(f"section {number} failed")
+            return f"## {number}. {inputs['title']}\n"
+        finally:
+            self.running -= 1
+
+def test_sections_are_written_concurrently_and_assembled_in_outline_order(research_chain, monkeypatch):
+    count = len(research_chain.REPORT_SECTIONS)
+    fake = FakeSectionChain(count)
+    monkeypatch.setattr(research_chain, "invoke_chain_with_retry", fake)
+
+    report = asyncio.run(research_chain.write_report_by_sections("analysis", ""))
+
+    assert fake.peak == count
+    assert report == "\n\n".join(f"## {i}. {title}" for i, (title, _, _) in enumerate(research_chain.REPORT_SECTIONS, start=1))
+
+def test_only_the_failed_section_is_retried(research_chain, monkeypatch):
+    count = len(research_chain.REPORT_SECTIONS)
+    fake = FakeSectionChain(count, failures={2: 1})
+    monkeypatch.setattr(research_chain, "invoke_chain_with_retry", fake)
+    monkeypatch.setattr(research_chain, "SECTION_RETRIES", 1)
+
+    report = asyncio.run(research_chain.write_report_by_sections("analysis", ""))
+
+    assert sorted(fake.calls) == sorted(list(range(1, count + 1)) + [2])
+    assert report.split("\n\n")[1].startswith("## 2.")
+
+def test_a_section_that_keeps_failing_fails_the_report(research_chain, monkeypatch):
+    fake = FakeSectionChain(len(research_chain.REPORT_SECTIONS), failures={3: 5})
+    monkeypatch.setattr(research_chain, "invoke_chain_with_retry", fake)
+    monkeypatch.setattr(research_chain, "SECTION_RETRIES", 2)
+
+    with pytest.raises(RuntimeError, match="section 3 failed"):
+        asyncio.run(research_chain.write_report_by_sections("analysis", ""))
+    assert fake.calls.count(3) == 3
@@ -0,0 +1,33 @@
+from backend.semantic_cache import SemanticQueryIndex
+
+def build_index():
+    index = SemanticQueryIndex(threshold=0.8)
+    for entry_id, query in enumerate([
+        "solar LCOE in India 2024",
+        "what is energy in india",
+        "Green hydrogen outlook 2026",
+        "Optimize power usage in data centers.",
+    ], start=1):
+        index.add(entry_id, query)
+    return index
+
+def test_paraphrase_hits_cached_query():
+    index = build_index()
+    match = index.lookup("India's solar levelized cost 2024")
+    assert match is not None and match[0] == 1
+
+def test_reordered_query_hits_cached_query():
+    index = build_index()
+    assert index.lookup("what's the 2026 outlook for green hydrogen?")[0] == 3
+
+def test_different_topic_or_year_misses():
+    index = build_index()
+    assert index.lookup("wind LCOE in India 2024") is None
+    assert index.lookup("solar LCOE in India 2025") is None
+    assert index.lookup("what is solar energy in india") is None
+
+def test_entries_added_incrementally():
+    index = build_index()
+    assert index.lookup("battery storage costs in Europe") is None
+    index.add(5, "Battery storage costs in Europe")
+    assert index.lookup("europe battery storage cost")[0] == 5
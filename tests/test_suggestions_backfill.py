@@ -0,0 +1,85 @@
+import os
+import json
+import asyncio
+import importlib
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import backend.main as main
+from backend import suggestions_backfill
+from backend.database import Base, KnowledgeBase
+from backend.single_flight import DatabaseLock
+
+TEST_DATABASE_URL = "sqlite:///./test_backfill.db"
+
+engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def generated(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", os.getenv("GROQ_API_KEY", "gsk_test"))
+    monkeypatch.setenv("TAVILY_API_KEY", os.getenv("TAVILY_API_KEY", "tvly-test"))
+    research_chain = importlib.import_module("backend.research_chain")
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(suggestions_backfill, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(suggestions_backfill, "sync_to_local", lambda obj: None)
+    monkeypatch.setattr(suggestions_backfill, "backfill_claims", DatabaseLock(session_factory=TestingSessionLocal))
+    calls = []
+
+    async def fake_generate(report_text, node="suggester"):
+        calls.append(report_text)
+        return ["What next?"]
+
+    monkeypatch.setattr(research_chain, "generate_suggestions", fake_generate)
+    yield calls
+    engine.dispose()
+    if os.path.exists("./test_backfill.db"):
+        os.remove("./test_backfill.db")
+
+def add_entry(suggestions=None) -> int:
+    db = TestingSessionLocal()
+    try:
+        entry = KnowledgeBase(query="Tidal power", slug="tidal-power", content="report", suggestions=suggestions)
+        db.add(entry)
+        db.commit()
+        return entry.id
+    finally:
+        db.close()
+
+def stored_suggestions(entry_id):
+    db = TestingSessionLocal()
+    try:
+        return db.query(KnowledgeBase).filter(KnowledgeBase.id == entry_id).first().suggestions
+    finally:
+        db.close()
+
+def test_an_entry_claimed_by_another_worker_is_skipped(generated):
+    entry_id = add_entry()
+    other_worker = DatabaseLock(session_factory=TestingSessionLocal)
+    assert other_worker.acquire(f"suggestions:{entry_id}")
+
+    asyncio.run(suggestions_backfill.backfill_entry(entry_id))
+    assert generated == []
+
+    other_worker.release(f"suggestions:{entry_id}")
+    asyncio.run(suggestions_backfill.backfill_entry(entry_id))
+    asyncio.run(suggestions_backfill.backfill_entry(entry_id))
+    assert generated == ["report"]
+    assert json.loads(stored_suggestions(entry_id)) == ["What next?"]
+
+def test_generated_but_empty_suggestions_are_not_backfilled_again(generated, monkeypatch):
+    monkeypatch.setattr(main, "sync_to_local", lambda obj: None)
+    db = TestingSessionLocal()
+    try:
+        main.save_to_knowledge_base("Wave energy", "report", db, suggestions=[])
+        main.save_to_knowledge_base("Geothermal", "report", db, suggestions=None)
+        entries = {e.query: e for e in db.query(KnowledgeBase).all()}
+        assert entries["Wave energy"].suggestions == "[]"
+        assert entries["Geothermal"].suggestions is None
+        wave_id = entries["Wave energy"].id
+    finally:
+        db.close()
+
+    asyncio.run(suggestions_backfill.backfill_entry(wave_id))
+    assert generated == []